@@ -0,0 +1,201 @@
+"""
+按实测选择性调整规则条件组的求值顺序
+
+每条规则是若干条件组的"或": 任一条件组成立即触发, 其余条件组不必再算。编译后的默认
+求值函数先算出联赛用到的全部条件位再逐条判断; 若某个几乎总是成立、计算又便宜的条件组
+(例如美职联 hg_wl_diff < 0.5) 排在前面, 其余条件组用到的查找就可以全部跳过。
+
+RuleOrder 在样本比赛上统计每个条件组的成立比例, 并测量每个条件位来源 (一个特征的区间表
+二分、一组等值查找或一次特征比较) 的耗时, 每条规则按 期望开销 / 成立比例 从小到大排列
+条件组 (前面规则必然计算的来源视为免费), 生成按需计算条件位的短路求值函数
+(CompiledLeague.ordered_evaluate)。只有在样本上实测比默认函数更快的联赛才会换用新顺序,
+两者结果完全相同。
+
+学到的顺序可以保存为 JSON, 下次启动时载入 (规则表变化后自动失效)。
+"""
+
+import json
+import os
+import time
+
+MIN_SAMPLES = 200
+# 短路求值至少快这么多才换用, 避免计时误差导致来回切换
+MIN_SPEEDUP = 0.05
+# 计时重复的轮数 (取最快一次)
+TIMING_ROUNDS = 5
+
+
+def _best_time(func, samples, rounds=TIMING_ROUNDS):
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for f in samples:
+            func(f)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(samples)
+
+
+class LeagueOrder:
+    """
+    单个联赛学到的顺序
+    mode: ordered 使用短路求值 / default 保持默认求值
+    order: {规则编号: 条件组下标列表}
+    clauses: {规则编号: [(成立比例, 期望开销纳秒), ...]} (按规则表中的条件组顺序)
+    """
+
+    def __init__(self, mode, order, samples=0, clauses=None, timings=None):
+        self.mode = mode
+        self.order = order
+        self.samples = samples
+        self.clauses = clauses or {}
+        self.timings = timings or {}
+
+    def to_dict(self):
+        return {"mode": self.mode, "samples": self.samples, "order": self.order,
+                "clauses": self.clauses, "timings": self.timings}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["mode"], {rule_id: list(order) for rule_id, order in data["order"].items()},
+                   data.get("samples", 0), data.get("clauses"), data.get("timings"))
+
+
+def learn_league(league, samples):
+    """
+    在样本特征 (列表) 上学习一个联赛的条件组顺序, 返回 LeagueOrder
+    样本少于 MIN_SAMPLES 时保持默认顺序
+    """
+    if len(samples) < MIN_SAMPLES:
+        return LeagueOrder("default", {}, len(samples))
+    # 条件组成立次数
+    fires = {rule.rule_id: [0] * len(rule.clauses) for rule in league.rules}
+    masks = [(rule.rule_id, rule.clause_masks) for rule in league.rules]
+    for f in samples:
+        bits = league.atom_bits(f)
+        for rule_id, clause_masks in masks:
+            counts = fires[rule_id]
+            for c, mask in enumerate(clause_masks):
+                if bits & mask == mask:
+                    counts[c] += 1
+
+    sources = league.source_functions()
+    costs = [_best_time(func, samples) for func, _ in sources]
+
+    order = {}
+    clauses = {}
+    computed = set()
+    n = len(samples)
+    for rule in league.rules:
+        stats = []
+        for c, mask in enumerate(rule.clause_masks):
+            needed = {k for k, (_, source_mask) in enumerate(sources) if source_mask & mask}
+            cost = sum(costs[k] for k in needed - computed)
+            # 平滑, 避免样本中从未成立的条件组概率为 0
+            rate = (fires[rule.rule_id][c] + 1) / (n + 2)
+            stats.append((rate, cost, needed))
+        ranked = sorted(range(len(stats)), key=lambda c: (stats[c][1] / stats[c][0], c))
+        order[rule.rule_id] = ranked
+        clauses[rule.rule_id] = [(fires[rule.rule_id][c] / n, stats[c][1] * 1e9) for c in range(len(stats))]
+        if ranked:
+            # 每条规则的第一个条件组一定会计算
+            computed |= stats[ranked[0]][2]
+
+    ordered = league.ordered_evaluate(order)
+    default = league.default_evaluate
+    for f in samples:
+        if ordered(f) != default(f):
+            raise AssertionError(f"联赛 {league.code} 的短路求值结果与默认求值不一致")
+    # 两个函数交替计时, 减少机器负载变化的影响
+    default_time = ordered_time = float("inf")
+    for _ in range(TIMING_ROUNDS):
+        default_time = min(default_time, _best_time(default, samples, 1))
+        ordered_time = min(ordered_time, _best_time(ordered, samples, 1))
+    mode = "ordered" if ordered_time < default_time * (1 - MIN_SPEEDUP) else "default"
+    return LeagueOrder(mode, order, n, clauses, {"default_ns": default_time * 1e9, "ordered_ns": ordered_time * 1e9})
+
+
+class RuleOrder:
+    """
+    整张规则表的条件组顺序
+    rules: 编译后的规则表 (rule_engine.CompiledRules)
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.leagues = {}
+        # 换用了短路求值的联赛
+        self._applied = set()
+
+    def learn(self, samples):
+        """
+        samples: 可迭代的 (联赛代码, 特征字典)
+        返回学到顺序的联赛数
+        """
+        by_league = {}
+        for league_code, features in samples:
+            by_league.setdefault(league_code, []).append(features)
+        for league_code, features in by_league.items():
+            league = self.rules.leagues[league_code]
+            self.restore(league_code)
+            self.leagues[league_code] = learn_league(league, features)
+        return len(by_league)
+
+    def apply(self):
+        """对选择了短路求值的联赛换用新的求值函数, 返回换用的联赛数"""
+        applied = 0
+        for league_code, learned in self.leagues.items():
+            self.restore(league_code)
+            if learned.mode != "ordered":
+                continue
+            # 只替换基础求值函数, 计数等包装 (instrument) 保留在外层
+            league = self.rules.leagues[league_code]
+            league.set_evaluator(league.ordered_evaluate(learned.order))
+            self._applied.add(league_code)
+            applied += 1
+        return applied
+
+    def restore(self, league_code=None):
+        """恢复默认求值函数"""
+        codes = [league_code] if league_code is not None else list(self._applied)
+        for code in codes:
+            if code in self._applied:
+                self._applied.discard(code)
+                self.rules.leagues[code].set_evaluator(None)
+
+    def summary(self):
+        ordered = [code for code, learned in self.leagues.items() if learned.mode == "ordered"]
+        return f"已学习 {len(self.leagues)} 个联赛的条件顺序, {len(ordered)} 个联赛使用短路求值"
+
+    def save(self, path):
+        data = {
+            "fingerprint": self.rules.fingerprint,
+            "leagues": {code: learned.to_dict() for code, learned in self.leagues.items()},
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        """
+        载入保存的顺序; 文件不存在或规则表已变化时不载入
+        返回载入的联赛数
+        """
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return 0
+        if data.get("fingerprint") != self.rules.fingerprint:
+            return 0
+        for code, learned in data["leagues"].items():
+            league = self.rules.leagues.get(code)
+            if league is None:
+                continue
+            learned = LeagueOrder.from_dict(learned)
+            rules = {rule.rule_id: len(rule.clauses) for rule in league.rules}
+            if all(sorted(order) == list(range(rules.get(rule_id, -1)))
+                   for rule_id, order in learned.order.items()):
+                self.leagues[code] = learned
+        return len(self.leagues)
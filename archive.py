@@ -0,0 +1,304 @@
+"""
+赔率归档文件 (内存映射)
+
+把比赛数据写成定长二进制记录, 打开时直接 mmap, 不把记录转换成 Python 对象, 打开
+数百万场比赛的归档只需要读两个文件头。多个进程打开同一归档时共享操作系统的页缓存。
+
+归档文件 (.fpa):
+    32 字节文件头: b"FPOA", 版本 (u16), 保留 (u16), 记录长度 (u32), 记录数 (u64), 填充
+    每条记录 104 字节: 联赛代码 (i1), 是否有立博赔率 (i1), 填充 6 字节,
+                       12 个 float64 赔率 (AM/WL/HG/LB 各 [胜, 平, 负])
+
+编号索引文件 (.fpa.idx):
+    32 字节文件头: b"FPOI", 版本 (u16), 保留 (u16), 保留 (u32), 记录数 (u64), 编号总字节数 (u64)
+    keys    u64[N]   比赛编号的 64 位哈希, 升序
+    rows    u32[N]   与 keys 对应的行号 (补齐到 8 字节)
+    offsets u64[N+1] 按行号排列的编号起止位置
+    blob             UTF-8 编码的比赛编号
+
+按编号查找时在 keys 上二分, 再用 blob 中的原始编号核对, 不需要在内存中建立字典。
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from ingest import chunked
+from match_store import BOOKMAKERS
+from validate import validate_records
+
+MAGIC = b"FPOA"
+INDEX_MAGIC = b"FPOI"
+VERSION = 1
+HEADER_SIZE = 32
+
+RECORD_DTYPE = np.dtype([
+    ("code", "i1"),
+    ("has_lb", "i1"),
+    ("_pad", "V6"),
+    ("odds", "<f8", (len(BOOKMAKERS), 3)),
+])
+
+_HEADER = struct.Struct("<4sHHIQ")
+_INDEX_HEADER = struct.Struct("<4sHHIQQ")
+
+
+def id_key(match_id):
+    """比赛编号的稳定 64 位哈希 (不受 PYTHONHASHSEED 影响)"""
+    digest = hashlib.blake2b(str(match_id).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def _aligned(size):
+    return (size + 7) & ~7
+
+
+def index_path(path):
+    return path + ".idx"
+
+
+class ArchiveWriter:
+    """
+    逐块写入归档
+    with ArchiveWriter(path) as writer:
+        writer.write(match_ids, codes, am, wl, hg, lb)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self.match_ids = []
+        self._tmp = path + ".tmp"
+        self._file = open(self._tmp, "wb")
+        self._file.write(bytes(HEADER_SIZE))
+
+    def write(self, match_ids, codes, am, wl, hg, lb=None):
+        """追加一块记录; 各数组长度须一致, lb 中缺失的行用 NaN 表示"""
+        n = len(codes)
+        records = np.zeros(n, dtype=RECORD_DTYPE)
+        records["code"] = codes
+        records["odds"][:, 0] = am
+        records["odds"][:, 1] = wl
+        records["odds"][:, 2] = hg
+        if lb is None:
+            records["odds"][:, 3] = np.nan
+        else:
+            records["odds"][:, 3] = lb
+            records["has_lb"] = ~np.isnan(records["odds"][:, 3]).any(axis=1)
+        self._file.write(records.tobytes())
+        self.match_ids.extend(str(match_id) for match_id in match_ids)
+        self.count += n
+
+    def close(self):
+        if self._file is None:
+            return
+        self._file.seek(0)
+        self._file.write(_HEADER.pack(MAGIC, VERSION, 0, RECORD_DTYPE.itemsize, self.count))
+        self._file.close()
+        self._file = None
+        try:
+            _write_index(index_path(self.path), self.match_ids)
+        except BaseException:
+            # 编号重复等错误时不留下写了一半的临时文件
+            os.remove(self._tmp)
+            raise
+        os.replace(self._tmp, self.path)
+
+    def abort(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            os.remove(self._tmp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def _write_index(path, match_ids):
+    encoded = [match_id.encode("utf-8") for match_id in match_ids]
+    if len(set(encoded)) != len(encoded):
+        raise ValueError("归档中的比赛编号重复")
+    keys = np.fromiter((id_key(match_id) for match_id in match_ids), dtype=np.uint64, count=len(match_ids))
+    order = np.argsort(keys, kind="stable")
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    blob = b"".join(encoded)
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_INDEX_HEADER.pack(INDEX_MAGIC, VERSION, 0, 0, len(encoded), len(blob)).ljust(HEADER_SIZE, b"\0"))
+        f.write(keys[order].tobytes())
+        rows = order.astype(np.uint32).tobytes()
+        f.write(rows.ljust(_aligned(len(rows)), b"\0"))
+        f.write(offsets.tobytes())
+        f.write(blob)
+    os.replace(tmp_path, path)
+
+
+def write_archive(path, match_ids, codes, am, wl, hg, lb=None):
+    """一次性写入归档"""
+    with ArchiveWriter(path) as writer:
+        writer.write(match_ids, codes, am, wl, hg, lb)
+
+
+def write_store(path, store):
+    """把 MatchStore 写成归档"""
+    arrays = store.as_arrays()
+    write_archive(path, list(store), arrays["codes"], arrays["am"], arrays["wl"], arrays["hg"], arrays["lb"])
+
+
+def build_archive(records, path, leagues, chunk_size=100000, on_reject=None):
+    """
+    从记录流 (ingest.read_records) 逐块构建归档, 内存占用只与块大小有关
+    编号重复的记录只保留第一条, 其余的与不合格的记录一样交给 on_reject
+    返回写入的记录数
+    """
+    seen = set()
+    with ArchiveWriter(path) as writer:
+        for chunk in chunked(records, chunk_size):
+            parsed, odds, rejected = validate_records(chunk, leagues)
+            failed = {id(record) for record, _ in rejected}
+            accepted = [record for record in chunk if id(record) not in failed]
+            keep = []
+            for i, (row, record) in enumerate(zip(parsed, accepted)):
+                if row[0] in seen:
+                    rejected.append((record, f"比赛编号重复: {row[0]}"))
+                else:
+                    seen.add(row[0])
+                    keep.append(i)
+            if len(keep) < len(parsed):
+                parsed = [parsed[i] for i in keep]
+                odds = tuple(values[keep] for values in odds[:4])
+            if on_reject is not None:
+                for record, reason in rejected:
+                    on_reject(record, reason)
+            if not parsed:
+                continue
+            # 归档只保存胜平负赔率, 盘口 (odds[4]) 不写入
+            writer.write([row[0] for row in parsed], np.array([int(row[1]) for row in parsed], dtype=np.int8),
+                         *odds[:4])
+        return writer.count
+
+
+def _map(path):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError(f"归档文件为空: {path}")
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class OddsArchive:
+    """
+    只读的内存映射归档, 读取接口与 MatchStore 相同
+    (row / league / odds / record / as_arrays, 以及 in / len / [match_id])
+    """
+
+    def __init__(self, path, leagues):
+        self.path = path
+        self.leagues = leagues
+        self._mm = _map(path)
+        magic, version, _, record_size, count = _HEADER.unpack_from(self._mm)
+        if magic != MAGIC or version != VERSION or record_size != RECORD_DTYPE.itemsize:
+            self._mm.close()
+            raise ValueError(f"不是有效的赔率归档: {path}")
+        self.records = np.frombuffer(self._mm, dtype=RECORD_DTYPE, count=count, offset=HEADER_SIZE)
+        self.codes = self.records["code"]
+        self.has_lb = self.records["has_lb"]
+        self._odds = self.records["odds"]
+
+        self._idx = _map(index_path(path))
+        magic, version, _, _, n, _ = _INDEX_HEADER.unpack_from(self._idx)
+        if magic != INDEX_MAGIC or n != count:
+            self.close()
+            raise ValueError(f"编号索引与归档不一致: {index_path(path)}")
+        offset = HEADER_SIZE
+        self._keys = np.frombuffer(self._idx, dtype=np.uint64, count=n, offset=offset)
+        offset += 8 * n
+        self._rows = np.frombuffer(self._idx, dtype=np.uint32, count=n, offset=offset)
+        offset += _aligned(4 * n)
+        self._offsets = np.frombuffer(self._idx, dtype=np.uint64, count=n + 1, offset=offset)
+        self._blob_start = offset + 8 * (n + 1)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, match_id):
+        return self.row(match_id) is not None
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self.match_id(row)
+
+    def __getitem__(self, match_id):
+        row = self.row(match_id)
+        if row is None:
+            raise KeyError(match_id)
+        return self.record(row)
+
+    def match_id(self, row):
+        """行号 -> 比赛编号"""
+        start = self._blob_start + int(self._offsets[row])
+        end = self._blob_start + int(self._offsets[row + 1])
+        return self._idx[start:end].decode("utf-8")
+
+    def row(self, match_id):
+        """比赛编号 -> 行号 (不存在时返回 None)"""
+        key = np.uint64(id_key(match_id))
+        i = int(np.searchsorted(self._keys, key))
+        match_id = str(match_id)
+        while i < len(self._keys) and self._keys[i] == key:
+            row = int(self._rows[i])
+            if self.match_id(row) == match_id:
+                return row
+            i += 1
+        return None
+
+    def league(self, row):
+        return str(self.codes[row])
+
+    def odds(self, row, bookmaker):
+        if bookmaker == "lb" and not self.has_lb[row]:
+            return None
+        return self._odds[row, BOOKMAKERS.index(bookmaker)].tolist()
+
+    def record(self, row):
+        league_code = self.league(row)
+        data = {"league": league_code, "league_name": self.leagues[league_code]}
+        for bookmaker in BOOKMAKERS:
+            data[bookmaker] = self.odds(row, bookmaker)
+        return data
+
+    def as_arrays(self):
+        """返回只读的 numpy 视图 (直接指向映射内存, 不复制)"""
+        result = {bookmaker: self._odds[:, i] for i, bookmaker in enumerate(BOOKMAKERS)}
+        result["codes"] = self.codes
+        return result
+
+    def close(self):
+        """关闭映射; 调用前须释放 as_arrays() 返回的视图"""
+        for name in ("records", "codes", "has_lb", "_odds", "_keys", "_rows", "_offsets"):
+            self.__dict__.pop(name, None)
+        for name in ("_mm", "_idx"):
+            mm = self.__dict__.pop(name, None)
+            if mm is not None:
+                mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def open_archive(path, leagues):
+    """打开归档 (只映射文件, 不读取记录)"""
+    return OddsArchive(path, leagues)
@@ -0,0 +1,183 @@
+"""
+历史回测
+
+载入历史赔率和赛果, 用列式内存存储 (每个字段一个numpy数组) 一次性向量化计算全部规则,
+按规则、联赛和综合判断统计命中率 (precision)、覆盖率 (coverage) 和投注回报率 (ROI)。
+
+命中与结算口径 (以威廉希尔赔率确定强弱方):
+- 上盘 (upper): 低赔率方获胜算命中, 按其胜赔结算
+- 下盘 (lower): 低赔率方未获胜算命中, 按 平+高赔率方 的双选赔率结算
+- 平局 (draw): 打平算命中, 按平局赔率结算
+没有方向的规则只统计覆盖率。
+
+CSV 在流式导入格式的基础上增加赛果字段 home_goals,away_goals (或 result 为 H/D/A)。
+"""
+
+import csv
+import json
+
+import numpy as np
+
+from batch import VERDICTS, as_odds, compute_features, compute_verdicts, evaluate_rules, to_league_codes, vector_rules
+from ingest import BOOKMAKERS, OUTCOMES
+from rule_engine import default_rules
+
+# 赛果代码
+HOME, DRAW, AWAY = 0, 1, 2
+_RESULT_CODES = {"H": HOME, "D": DRAW, "A": AWAY}
+
+DIRECTION_NAMES = ("upper", "lower", "draw")
+
+
+class HistoryStore:
+    """列式历史数据: am/wl/hg 为 (N, 3) 数组, codes 为联赛代码, results 为赛果代码"""
+
+    def __init__(self, am, wl, hg, codes, results, match_ids=None):
+        self.am = as_odds(am, "澳门")
+        self.wl = as_odds(wl, "威廉希尔")
+        self.hg = as_odds(hg, "皇冠")
+        self.codes = np.asarray(codes, dtype=np.int8)
+        self.results = np.asarray(results, dtype=np.int8)
+        self.match_ids = match_ids
+        if not (len(self.am) == len(self.wl) == len(self.hg) == len(self.codes) == len(self.results)):
+            raise ValueError("历史数据各列长度不一致")
+
+    def __len__(self):
+        return len(self.codes)
+
+    @classmethod
+    def from_csv(cls, path, rules=None):
+        """读取历史 CSV"""
+        odds = {b: [] for b in BOOKMAKERS}
+        leagues, results, match_ids = [], [], []
+        with open(path, encoding="utf-8", newline="") as f:
+            reader = csv.reader(f)
+            position = {name.strip(): i for i, name in enumerate(next(reader))}
+            cols = {b: [position[f"{b}_{o}"] for o in OUTCOMES] for b in BOOKMAKERS}
+            by_goals = "home_goals" in position
+            for row in reader:
+                if not row:
+                    continue
+                match_ids.append(row[position["match_id"]])
+                leagues.append(row[position["league"]])
+                for b in BOOKMAKERS:
+                    odds[b].append([float(row[c]) for c in cols[b]])
+                if by_goals:
+                    home, away = int(row[position["home_goals"]]), int(row[position["away_goals"]])
+                    results.append(HOME if home > away else DRAW if home == away else AWAY)
+                else:
+                    results.append(_RESULT_CODES[row[position["result"]].strip().upper()])
+        codes = to_league_codes(leagues, vector_rules(rules).leagues)
+        return cls(odds["am"], odds["wl"], odds["hg"], codes, results, match_ids)
+
+
+def _outcomes(wl, results):
+    """
+    每场比赛在三个方向上的命中情况和单位注收益
+    返回 hits (N, 3) 布尔, profit (N, 3)
+    """
+    rows = np.arange(len(results))
+    fav_side = np.where(wl[:, 0] <= wl[:, 2], HOME, AWAY)
+    dog_side = 2 - fav_side
+    fav_odds = wl[rows, fav_side]
+    draw_odds = wl[:, 1]
+    cover_odds = 1.0 / (1.0 / draw_odds + 1.0 / wl[rows, dog_side])
+
+    hits = np.empty((len(results), 3), dtype=bool)
+    hits[:, 0] = results == fav_side
+    hits[:, 1] = ~hits[:, 0]
+    hits[:, 2] = results == DRAW
+    payout = np.stack([fav_odds, cover_odds, draw_odds], axis=1)
+    profit = np.where(hits, payout - 1.0, -1.0)
+    return hits, profit
+
+
+def _stat_rows(scope, keys, directions, fired, hits, profit, codes, league_codes):
+    """按 联赛 x 键 汇总; fired 为 (N, K), hits/profit 为 (N, 3) 按方向取列"""
+    size = int(max(league_codes)) + 1
+    matches = np.bincount(codes, minlength=size)
+    fires = np.zeros((len(keys), size))
+    hit_counts = np.zeros((len(keys), size))
+    profits = np.zeros((len(keys), size))
+    for k, direction in enumerate(directions):
+        rows = np.flatnonzero(fired[:, k])
+        fired_codes = codes[rows]
+        fires[k] = np.bincount(fired_codes, minlength=size)
+        if direction is not None:
+            column = DIRECTION_NAMES.index(direction)
+            hit_counts[k] = np.bincount(fired_codes, weights=hits[rows, column], minlength=size)
+            profits[k] = np.bincount(fired_codes, weights=profit[rows, column], minlength=size)
+
+    result = []
+    scopes = [("all", int(matches.sum()), fires.sum(axis=1), hit_counts.sum(axis=1), profits.sum(axis=1))]
+    scopes += [(str(code), int(matches[code]), fires[:, code], hit_counts[:, code], profits[:, code])
+               for code in league_codes if matches[code]]
+    for league, n_matches, n_fires, n_hits, n_profit in scopes:
+        for k, key in enumerate(keys):
+            if not n_fires[k] and league != "all":
+                continue
+            scored = directions[k] is not None and n_fires[k] > 0
+            result.append({
+                "scope": scope,
+                "key": key,
+                "direction": directions[k],
+                "league": league,
+                "matches": n_matches,
+                "fires": int(n_fires[k]),
+                "coverage": float(n_fires[k] / n_matches) if n_matches else 0.0,
+                "hits": int(n_hits[k]) if scored else None,
+                "precision": float(n_hits[k] / n_fires[k]) if scored else None,
+                "roi": float(n_profit[k] / n_fires[k]) if scored else None,
+            })
+    return result
+
+
+class BacktestReport:
+    """回测报告: rows 为统计行列表"""
+
+    def __init__(self, rows, n_matches):
+        self.rows = rows
+        self.n_matches = n_matches
+
+    def select(self, scope=None, league=None, key=None):
+        return [row for row in self.rows
+                if (scope is None or row["scope"] == scope)
+                and (league is None or row["league"] == league)
+                and (key is None or row["key"] == key)]
+
+    def to_json(self):
+        return json.dumps({"matches": self.n_matches, "rows": self.rows}, ensure_ascii=False, indent=2)
+
+    def to_text(self):
+        def pct(value):
+            return "-" if value is None else f"{value * 100:6.1f}%"
+
+        lines = [f"=== 回测结果 ({self.n_matches} 场比赛) ==="]
+        for scope, title in (("rule", "按规则"), ("verdict", "按综合判断")):
+            lines.append("")
+            lines.append(f"--- {title} ---")
+            lines.append(f"{'联赛':<6}{'项目':<26}{'触发':>8}{'覆盖率':>9}{'命中率':>9}{'ROI':>9}")
+            for row in self.select(scope):
+                lines.append(f"{row['league']:<8}{row['key']:<28}{row['fires']:>8}{pct(row['coverage']):>9}"
+                             f"{pct(row['precision']):>9}{pct(row['roi']):>9}")
+        return "\n".join(lines)
+
+
+def run_backtest(store, rules=None):
+    """对历史数据运行全部规则并统计"""
+    rules = rules or default_rules()
+    vector = vector_rules(rules)
+    fired = evaluate_rules(compute_features(store.am, store.wl, store.hg), store.codes, rules)
+    verdicts = compute_verdicts(fired, rules)
+    hits, profit = _outcomes(store.wl, store.results)
+
+    codes = store.codes.astype(np.intp)
+    league_codes = sorted(vector.leagues)
+
+    rule_dirs = [rules.directions[rule_id] for rule_id in vector.rule_ids]
+    rows = _stat_rows("rule", vector.rule_ids, rule_dirs, fired, hits, profit, codes, league_codes)
+
+    verdict_fired = verdicts[:, None] == np.arange(len(VERDICTS))[None, :]
+    verdict_dirs = [v if v in DIRECTION_NAMES else None for v in VERDICTS]
+    rows += _stat_rows("verdict", VERDICTS, verdict_dirs, verdict_fired, hits, profit, codes, league_codes)
+    return BacktestReport(rows, len(store))
@@ -0,0 +1,264 @@
+"""
+批量分析引擎
+
+把 AM/WL/HG 初盘赔率作为 (N, 3) 数组整体处理, 每个联赛的规则都以布尔掩码的形式
+一次性计算, 结果与 FootballPredictionSystem.analyze_match 的逐场判断保持一致。
+规则来自 rule_engine 编译好的规则表, 区间条件和等值条件都用 searchsorted 查表。
+亚盘/大小球盘口 (markets.py) 作为可选的 (N, 3) 数组传入, 只为规则用到盘口特征的联赛计算。
+"""
+
+import weakref
+
+import numpy as np
+
+from features import compute_feature_matrix
+from markets import MARKET_COLUMNS, market_feature_arrays
+from result import VERDICT_LABELS, Verdict
+from rule_engine import FEATURES, default_rules
+
+# 综合判断结果, 代码与 result.Verdict 一致
+VERDICTS = VERDICT_LABELS
+VERDICT_NONE, VERDICT_UPPER, VERDICT_LOWER, VERDICT_DRAW, VERDICT_MIXED = (int(v) for v in Verdict)
+
+_COMPARE_UFUNCS = {
+    "<": np.less,
+    "<=": np.less_equal,
+    ">": np.greater,
+    ">=": np.greater_equal,
+}
+
+# 与 rule_engine 中的等值查找保持一致
+_EQ_SLACK = 1e-9
+
+
+def compute_features(am, wl, hg):
+    """计算规则所需的全部特征列 (features.FeatureMatrix, 只含规则特征)"""
+    return compute_feature_matrix(am, wl, hg, columns=FEATURES)
+
+
+def _atom_table(atom_lists, n_atoms):
+    table = np.zeros((len(atom_lists), n_atoms), dtype=bool)
+    for row, atoms in enumerate(atom_lists):
+        table[row, list(atoms)] = True
+    return table
+
+
+class VectorLeague:
+    """单个联赛的向量化求值器, 由 rule_engine 编译结果转换而来"""
+
+    def __init__(self, league, rule_index):
+        n = league.n_atoms
+        self.n_atoms = n
+        self.market_features = league.market_features
+        self.range_tables = [
+            (feature, np.array(ends, dtype=np.float64), _atom_table(segments, n), feature in league.market_features)
+            for feature, ends, segments in league.range_index
+        ]
+        self.eq_tables = []
+        for feature, tol, values, value_atoms in league.eq_index:
+            values = np.array(values, dtype=np.float64)
+            # 任一查找窗口内最多包含的取值个数
+            reach = np.searchsorted(values, values + 2 * tol + 2 * _EQ_SLACK, side="right")
+            window = int((reach - np.arange(len(values))).max())
+            self.eq_tables.append((feature, tol, values, _atom_table(value_atoms, n), window))
+        self.compare_atoms = [(a, _COMPARE_UFUNCS[op], b, atom) for a, op, b, atom in league.compare_atoms]
+        self.rules = [
+            (rule_index[rule.rule_id], [np.array(clause, dtype=np.intp) for clause in rule.clauses])
+            for rule in league.rules
+        ]
+
+    def atom_matrix(self, f):
+        """计算 (N, 条件数) 的条件结果矩阵"""
+        size = len(next(iter(f.values())))
+        atoms = np.zeros((size, self.n_atoms), dtype=bool)
+        for feature, ends, seg_atoms, market in self.range_tables:
+            x = f[feature]
+            i = np.searchsorted(ends, x, side="left")
+            on_end = ends[np.minimum(i, len(ends) - 1)] == x
+            segment = seg_atoms[2 * i + (on_end & (i < len(ends)))]
+            if market:
+                # 没有盘口 (NaN) 的行区间条件不成立
+                segment &= ~np.isnan(x)[:, None]
+            atoms |= segment
+        for feature, tol, values, value_atoms, window in self.eq_tables:
+            x = f[feature]
+            lo = np.searchsorted(values, x - tol - _EQ_SLACK, side="left")
+            for j in range(window):
+                idx = lo + j
+                valid = idx < len(values)
+                idx = np.minimum(idx, len(values) - 1)
+                hit = valid & (np.abs(x - values[idx]) < tol)
+                atoms |= hit[:, None] & value_atoms[idx]
+        for a, compare, b, atom in self.compare_atoms:
+            atoms[:, atom] = compare(f[a], f[b])
+        return atoms
+
+    def evaluate(self, f, fired, rows):
+        """把各规则结果写入 fired[rows]"""
+        atoms = self.atom_matrix(f)
+        for column, clauses in self.rules:
+            mask = np.zeros(len(atoms), dtype=bool)
+            for clause in clauses:
+                mask |= atoms[:, clause].all(axis=1)
+            fired[rows, column] = mask
+
+
+class VectorRules:
+    """整张规则表的向量化求值器"""
+
+    def __init__(self, rules):
+        self.rule_ids = rules.rule_ids
+        self.rule_index = {rule_id: i for i, rule_id in enumerate(self.rule_ids)}
+        directions = [rules.directions[rule_id] for rule_id in self.rule_ids]
+        self.upper = np.array([d == "upper" for d in directions], dtype=np.int32)
+        self.lower = np.array([d == "lower" for d in directions], dtype=np.int32)
+        self.draw = np.array([d == "draw" for d in directions], dtype=np.int32)
+        self.leagues = {int(code): VectorLeague(league, self.rule_index)
+                        for code, league in rules.leagues.items()}
+
+
+_vector_rules = weakref.WeakKeyDictionary()
+
+
+def vector_rules(rules=None):
+    """取得 (并缓存) 规则表对应的向量化求值器"""
+    rules = rules or default_rules()
+    compiled = _vector_rules.get(rules)
+    if compiled is None:
+        compiled = _vector_rules[rules] = VectorRules(rules)
+    return compiled
+
+
+def to_league_codes(leagues, valid_codes=None):
+    """把联赛代码 ("7" / 7) 统一转为 int8 数组; 先按原值检查, 超出 int8 范围的代码不会回绕成有效代码"""
+    leagues = np.asarray(leagues)
+    if valid_codes is None:
+        valid_codes = vector_rules().leagues
+    valid = np.fromiter(valid_codes, dtype=np.int64)
+    if leagues.dtype.kind in "iu":
+        invalid = ~np.isin(leagues, valid)
+        if invalid.any():
+            raise ValueError(f"无效的联赛代码: {leagues[np.argmax(invalid)]}")
+        return leagues.astype(np.int8)
+    labels, inverse = np.unique(leagues.astype(str), return_inverse=True)
+    try:
+        values = [int(label) for label in labels]
+    except ValueError as e:
+        raise ValueError(f"无效的联赛代码: {e}") from None
+    allowed = set(valid.tolist())
+    for label, value in zip(labels, values):
+        if value not in allowed:
+            raise ValueError(f"无效的联赛代码: {label}")
+    return np.array(values, dtype=np.int8)[inverse.reshape(leagues.shape)]
+
+
+def as_odds(odds, name):
+    """转换为 (N, 3) 的 float64 赔率数组"""
+    odds = np.asarray(odds, dtype=np.float64)
+    if odds.ndim != 2 or odds.shape[1] != 3:
+        raise ValueError(f"{name} 赔率必须为 (N, 3) 数组, 实际为 {odds.shape}")
+    return odds
+
+
+def compute_verdicts(fired, rules=None):
+    """按 format_result 的计数规则得出综合判断"""
+    vector = vector_rules(rules)
+    counts = fired.astype(np.int32)
+    upper = counts @ vector.upper
+    lower = counts @ vector.lower
+    draw = counts @ vector.draw
+    verdicts = np.full(len(fired), VERDICT_MIXED, dtype=np.int8)
+    verdicts[(draw > 0) & (draw >= upper) & (draw >= lower)] = VERDICT_DRAW
+    verdicts[(lower > upper) & (lower > draw)] = VERDICT_LOWER
+    verdicts[(upper > lower) & (upper > draw)] = VERDICT_UPPER
+    verdicts[~fired.any(axis=1)] = VERDICT_NONE
+    return verdicts
+
+
+class BatchResult:
+    """批量分析结果: fired 为 (N, 规则数) 布尔矩阵, verdicts 为判断代码"""
+
+    def __init__(self, fired, verdicts, rule_ids):
+        self.fired = fired
+        self.verdicts = verdicts
+        self.rule_ids = rule_ids
+        self._rule_lists = None
+
+    def __len__(self):
+        return len(self.verdicts)
+
+    def __getitem__(self, i):
+        return {"rules": self.rules(i), "verdict": VERDICTS[self.verdicts[i]]}
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def rules(self, i):
+        """第 i 场比赛触发的规则编号"""
+        return [self.rule_ids[j] for j in np.flatnonzero(self.fired[i])]
+
+    def rule_lists(self):
+        """全部比赛触发的规则编号列表 (一次性展开, 结果缓存)"""
+        if self._rule_lists is None:
+            rows, cols = np.nonzero(self.fired)
+            names = np.array(self.rule_ids, dtype=object)[cols].tolist()
+            ends = np.cumsum(np.bincount(rows, minlength=len(self.verdicts))).tolist()
+            starts = [0] + ends[:-1]
+            self._rule_lists = [names[a:b] for a, b in zip(starts, ends)]
+        return self._rule_lists
+
+    def verdict_labels(self):
+        """全部比赛的判断标签"""
+        return np.array(VERDICTS, dtype=object)[self.verdicts]
+
+
+def as_markets(markets, n):
+    """检查盘口数组: {盘口: (N, 3) 数组}, 没有盘口时返回 None"""
+    if not markets:
+        return None
+    checked = {}
+    for column, values in markets.items():
+        if column not in MARKET_COLUMNS:
+            raise ValueError(f"未知的盘口: {column}")
+        values = checked[column] = as_odds(values, column)
+        if len(values) != n:
+            raise ValueError("盘口数组与赔率数组长度不一致")
+    return checked
+
+
+def evaluate_rules(features, codes, rules=None, markets=None):
+    """
+    按联赛分组求值, 返回 (N, 规则数) 的触发矩阵
+    markets: {盘口: (N, 3) 数组}, 只在联赛规则用到盘口特征时读取
+    """
+    vector = vector_rules(rules)
+    fired = np.zeros((len(codes), len(vector.rule_ids)), dtype=bool)
+    for code in np.unique(codes):
+        rows = np.flatnonzero(codes == code)
+        league = vector.leagues[int(code)]
+        subset = {name: column[rows] for name, column in features.items()}
+        if league.market_features:
+            subset.update(market_feature_arrays(markets, league.market_features, rows, len(rows)))
+        league.evaluate(subset, fired, rows)
+    return fired
+
+
+def analyze_batch(am_odds, wl_odds, hg_odds, leagues, rules=None, markets=None):
+    """
+    批量分析
+    am_odds / wl_odds / hg_odds: (N, 3) 赔率数组 [胜, 平, 负]
+    leagues: 长度为 N 的联赛代码数组
+    rules: 编译后的规则表 (默认使用 rules.json)
+    markets: 盘口 {"wl_ah": (N, 3) 数组, ...} (见 markets.py), 缺少的盘口为 NaN
+    """
+    vector = vector_rules(rules)
+    am = as_odds(am_odds, "澳门")
+    wl = as_odds(wl_odds, "威廉希尔")
+    hg = as_odds(hg_odds, "皇冠")
+    codes = to_league_codes(leagues, vector.leagues)
+    if not (len(am) == len(wl) == len(hg) == len(codes)):
+        raise ValueError("赔率数组与联赛代码长度不一致")
+
+    fired = evaluate_rules(compute_features(am, wl, hg), codes, rules, as_markets(markets, len(codes)))
+    return BatchResult(fired, compute_verdicts(fired, rules), vector.rule_ids)
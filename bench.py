@@ -0,0 +1,301 @@
+"""
+性能基准
+
+用固定随机种子生成模拟赔率 (各联赛主场优势、平局倾向不同, 各公司抽水不同, 报价保留
+两位小数), 分别计时:
+
+- rules.<联赛代码>   单个联赛规则表逐场求值 (不含特征计算)
+- analyze_match      完整单场分析, 含特征计算和报告文本 (不使用缓存)
+- analyze_match.cached  同上, 使用分析缓存
+- format_result      报告文本生成
+- batch.vector / batch.lut  批量引擎
+- parallel           多进程批量分析
+- ingest             CSV 流式导入 (解析 + 校验 + 批量分析 + JSONL 输出)
+
+结果写成 JSON (每项包含 场/秒、纳秒/场 和进程峰值内存), 可与保存的基线比较,
+纳秒/场 超出基线容差的项目视为性能回退:
+
+    python bench.py -n 50000 -o bench.json --baseline bench_baseline.json
+    python bench.py --only batch --save-baseline bench_baseline.json
+"""
+
+import argparse
+import csv
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from main import FootballPredictionSystem
+from rule_engine import match_features
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_MATCHES = 50000
+DEFAULT_SEED = 42
+DEFAULT_REPEAT = 3
+DEFAULT_TOLERANCE = 0.10
+
+# 各公司抽水 (返还率的倒数) 的典型值
+MARGINS = {"am": 1.12, "wl": 1.07, "hg": 1.05, "lb": 1.065}
+BOOKMAKER_NOISE = 0.03
+
+
+def peak_rss():
+    """进程峰值内存 (字节), 不支持的平台返回 None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位, macOS 以字节为单位
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class SyntheticOdds:
+    """
+    模拟赔率
+    codes: 联赛代码 (str), am/wl/hg/lb: (N, 3) 赔率数组, match_ids: 比赛编号
+    """
+
+    def __init__(self, n, leagues, seed=DEFAULT_SEED):
+        rng = np.random.default_rng(seed)
+        codes = sorted(leagues, key=int)
+        # 每个联赛的主场优势、平局倾向和实力差距分布
+        home_adv = rng.uniform(0.0, 0.4, len(codes))
+        draw_base = rng.uniform(0.24, 0.31, len(codes))
+        spread = rng.uniform(0.6, 1.1, len(codes))
+        league = rng.integers(0, len(codes), n)
+
+        strength = rng.normal(home_adv[league], spread[league])
+        draw = draw_base[league] * (1 - 0.45 * np.abs(np.tanh(strength)))
+        home = (1 - draw) / (1 + np.exp(-strength))
+        probs = np.column_stack([home, draw, 1 - draw - home])
+
+        self.n = n
+        self.codes = np.array(codes)[league]
+        self.match_ids = [f"SIM-{i:07d}" for i in range(n)]
+        for bookmaker, margin in MARGINS.items():
+            quoted = probs * rng.lognormal(0.0, BOOKMAKER_NOISE, probs.shape)
+            quoted /= quoted.sum(axis=1, keepdims=True)
+            odds = np.round(1 / (quoted * rng.normal(margin, 0.01, (n, 1))), 2)
+            setattr(self, bookmaker, np.clip(odds, 1.01, 50.0))
+
+    def records(self):
+        """逐场 (match_id, league_code, am, wl, hg, lb) 列表形式"""
+        am, wl, hg, lb = (getattr(self, b).tolist() for b in ("am", "wl", "hg", "lb"))
+        codes = self.codes.tolist()
+        return [(self.match_ids[i], codes[i], am[i], wl[i], hg[i], lb[i]) for i in range(self.n)]
+
+    def write_csv(self, path):
+        """写成 ingest 的 CSV 格式"""
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["match_id", "league"] + [f"{b}_{o}" for b in MARGINS for o in ("home", "draw", "away")])
+            for match_id, code, am, wl, hg, lb in self.records():
+                writer.writerow([match_id, code, *am, *wl, *hg, *lb])
+
+
+def _time(func, repeat):
+    """最好的一次耗时 (秒) 和函数返回的处理场数"""
+    best, count = None, 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, count
+
+
+def _entry(seconds, count):
+    return {
+        "matches": count,
+        "seconds": seconds,
+        "matches_per_sec": count / seconds if seconds else None,
+        "ns_per_match": seconds * 1e9 / count if count else None,
+        "peak_rss": peak_rss(),
+    }
+
+
+def _bench_rules(system, data):
+    by_league = {}
+    for _, code, am, wl, hg, _ in data.records():
+        by_league.setdefault(code, []).append(match_features(am, wl, hg))
+    for code in sorted(by_league, key=int):
+        evaluate = system.rules.leagues[code].evaluate
+        features = by_league[code]
+
+        def run(evaluate=evaluate, features=features):
+            for f in features:
+                evaluate(f)
+            return len(features)
+
+        yield f"rules.{code}", run
+
+
+def _loaded_system(data, cache_size):
+    system = FootballPredictionSystem(cache_size=cache_size)
+    for match_id, code, am, wl, hg, lb in data.records():
+        system.add_match(match_id, code, am, wl, hg, lb)
+    return system
+
+
+def _bench_analyze(data, cache_size):
+    system = _loaded_system(data, cache_size)
+    match_ids = data.match_ids
+
+    def run():
+        analyze = system.analyze_match
+        for match_id in match_ids:
+            analyze(match_id)
+        return len(match_ids)
+
+    return run
+
+
+def _bench_format(data):
+    system = _loaded_system(data, 0)
+    results = [system.analyze_match_result(match_id) for match_id in data.match_ids]
+
+    def run():
+        for result in results:
+            # 清除缓存的文本, 每次重新生成
+            result._text = None
+            result.render()
+        return len(results)
+
+    return run
+
+
+def _bench_lut(system, data):
+    # 查找表在计时前生成或载入
+    system.lut_engine()
+    return lambda: len(system.analyze_batch(data.am, data.wl, data.hg, data.codes, engine="lut"))
+
+
+def _bench_ingest(system, data, workdir):
+    import ingest
+
+    path = os.path.join(workdir, "bench.csv")
+    data.write_csv(path)
+
+    def run():
+        with open(os.devnull, "w", encoding="utf-8") as out:
+            return ingest.ingest(system, path, out).rows
+
+    return run
+
+
+def benchmarks(data, workdir):
+    """
+    (名称, 准备函数) 序列
+    准备函数完成计时前的准备工作并返回计时函数, 计时函数返回处理的场数
+    """
+    system = FootballPredictionSystem(cache_size=0)
+    for name, run in _bench_rules(system, data):
+        yield name, lambda run=run: run
+    yield "analyze_match", lambda: _bench_analyze(data, 0)
+    yield "analyze_match.cached", lambda: _bench_analyze(data, max(data.n, 1))
+    yield "format_result", lambda: _bench_format(data)
+    yield "batch.vector", lambda: lambda: len(system.analyze_batch(data.am, data.wl, data.hg, data.codes))
+    yield "batch.lut", lambda: _bench_lut(system, data)
+    yield "parallel", lambda: lambda: len(system.analyze_parallel(data.am, data.wl, data.hg, data.codes))
+    yield "ingest", lambda: _bench_ingest(system, data, workdir)
+
+
+def run_benchmarks(n=DEFAULT_MATCHES, seed=DEFAULT_SEED, repeat=DEFAULT_REPEAT, only=None, log=None):
+    """
+    运行基准, 返回报告字典 {"meta": ..., "results": {名称: {...}}}
+    only: 名称前缀列表, 只运行匹配的项目
+    """
+    system = FootballPredictionSystem(cache_size=0)
+    data = SyntheticOdds(n, system.leagues, seed)
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, setup in benchmarks(data, workdir):
+            if only and not any(name.startswith(prefix) for prefix in only):
+                continue
+            results[name] = _entry(*_time(setup(), repeat))
+            if log is not None:
+                entry = results[name]
+                log(f"{name:<22} {entry['matches_per_sec']:>14,.0f} 场/秒 {entry['ns_per_match']:>12,.0f} ns/场")
+    return {
+        "meta": {
+            "matches": n,
+            "seed": seed,
+            "repeat": repeat,
+            "rules_fingerprint": system.rules.fingerprint,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def compare(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    与基线比较 纳秒/场, 返回每个共同项目的 {name, baseline, current, change, regression}
+    change 为相对变化 (正数表示变慢)
+    """
+    rows = []
+    for name, entry in report["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base or not base.get("ns_per_match") or not entry.get("ns_per_match"):
+            continue
+        change = entry["ns_per_match"] / base["ns_per_match"] - 1
+        rows.append({
+            "name": name,
+            "baseline": base["ns_per_match"],
+            "current": entry["ns_per_match"],
+            "change": change,
+            "regression": change > tolerance,
+        })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="规则引擎与端到端性能基准")
+    parser.add_argument("-n", "--matches", type=int, default=DEFAULT_MATCHES, help="模拟比赛数")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="随机种子")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="每项重复次数 (取最快一次)")
+    parser.add_argument("--only", action="append", metavar="PREFIX", help="只运行名称以此开头的项目 (可重复)")
+    parser.add_argument("--output", "-o", default="-", help="JSON 结果文件 (默认标准输出)")
+    parser.add_argument("--baseline", metavar="PATH", help="与基线 JSON 比较, 有回退时返回码为 1")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="允许的相对变慢比例")
+    parser.add_argument("--save-baseline", metavar="PATH", help="把本次结果保存为基线")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.matches, args.seed, args.repeat, args.only,
+                            log=lambda line: print(line, file=sys.stderr))
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        report["baseline"] = compare(report, baseline, args.tolerance)
+        regressions = [row for row in report["baseline"] if row["regression"]]
+        for row in report["baseline"]:
+            flag = "  回退" if row["regression"] else ""
+            print(f"{row['name']:<22} {row['change']:+8.1%}{flag}", file=sys.stderr)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
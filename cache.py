@@ -0,0 +1,125 @@
+"""
+分析结果缓存
+
+规则结果只取决于联赛代码和 AM/WL/HG 三家初盘赔率, 同一联赛中相同赔率组合重复出现时
+直接复用上次触发的规则, 不再重新求值。
+
+赔率按 0.01 报价, 同一报价解析得到的浮点数完全相同, 因此键直接使用
+(联赛代码, 9 个赔率) 元组: 这与量化到 0.01 等价, 同时不会把实际不同的赔率合并,
+命中时的结果与重新计算完全一致。规则用到盘口 (markets.py) 的联赛, 键末尾再加上
+该联赛用到的各盘口三元组 (没有该盘口时为 None)。
+
+缓存按 LRU 淘汰, 可以保存到文件并在下次启动时载入 (规则表变化后自动失效)。
+"""
+
+import json
+import os
+from collections import OrderedDict
+
+from result import Verdict
+
+DEFAULT_CACHE_SIZE = 65536
+
+
+class AnalysisCache:
+    """
+    LRU 分析缓存
+    maxsize: 最多保存的赔率组合数
+    值为 (触发的规则元组, 综合判断)
+    """
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        if maxsize <= 0:
+            raise ValueError("缓存大小必须为正数")
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def key(league_code, am_odds, wl_odds, hg_odds):
+        return (league_code, *am_odds, *wl_odds, *hg_odds)
+
+    def get(self, key):
+        """命中时返回 (规则元组, 综合判断) 并计数, 未命中返回 None"""
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, fired, verdict):
+        self.entries[key] = (tuple(fired), verdict)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        return {
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hit_rate,
+        }
+
+    def save(self, path, rules):
+        """
+        保存到 JSON 文件 (按最近使用顺序), rules 为生成这些结果的规则表
+        每个条目为 [联赛代码, 9 个赔率, 规则编号, 综合判断], 键中有盘口时再加一项盘口三元组列表
+        """
+        entries = []
+        for key, (fired, verdict) in self.entries.items():
+            entry = [key[0], list(key[1:10]), [rule.rule_id for rule in fired], int(verdict)]
+            if len(key) > 10:
+                entry.append([None if triple is None else list(triple) for triple in key[10:]])
+            entries.append(entry)
+        data = {"fingerprint": rules.fingerprint, "entries": entries}
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    def load(self, path, rules):
+        """
+        从文件载入; 文件不存在或规则表已变化时不载入
+        返回载入的条目数
+        """
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return 0
+        if data.get("fingerprint") != rules.fingerprint:
+            return 0
+        by_league = {code: {rule.rule_id: rule for rule in league.rules} for code, league in rules.leagues.items()}
+        loaded = 0
+        for league_code, odds, rule_ids, verdict, *markets in data["entries"][-self.maxsize:]:
+            league_rules = by_league.get(league_code)
+            if league_rules is None or len(odds) != 9:
+                continue
+            triples = ()
+            if markets:
+                # 盘口个数须与该联赛规则用到的盘口一致
+                if len(markets[0]) != len(rules.leagues[league_code].market_columns):
+                    continue
+                triples = tuple(None if triple is None else tuple(triple) for triple in markets[0])
+            self.put((league_code, *odds, *triples), [league_rules[rule_id] for rule_id in rule_ids],
+                     Verdict(verdict))
+            loaded += 1
+        return loaded
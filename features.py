@@ -0,0 +1,164 @@
+"""
+批量特征计算
+
+对 N 场比赛一次性计算特征矩阵, 每一列都是一块连续内存 (整个矩阵只分配一次),
+计算按块进行, 中间结果只占用块大小的临时内存, 适合上百万行的数据:
+
+- 规则特征: rule_engine.FEATURES (am_min、hg_wl_diff 等), 与逐场计算的结果逐位相同,
+  批量引擎 (batch / lut / parallel / backtest) 都从这里读取
+- 隐含概率: {公司}_p_home / _p_draw / _p_away, 按各公司抽水归一化 (1/赔率 除以三项之和)
+- 抽水: {公司}_overround, 三项 1/赔率 之和 (1.05 表示 5% 的抽水)
+- 共识: cons_p_home / _draw / _away 为各公司归一化概率的平均, cons_home / _draw / _away 为
+  对应的公平赔率 (1/概率), cons_books 为参与平均的公司数
+- 分歧: div_{a}_{b} 为两家公司概率分布的总变差距离 (0.5 * Σ|p_a - p_b|)
+
+公司为 am 澳门 / wl 威廉希尔 / hg 皇冠 / lb 立博; 立博赔率可选, 缺失 (NaN) 时其概率、
+抽水和相关的分歧为 NaN, 共识只用其余三家计算。
+"""
+
+from itertools import combinations
+
+import numpy as np
+
+from rule_engine import FEATURES
+
+IMPLIED_BOOKMAKERS = ("am", "wl", "hg", "lb")
+OUTCOMES = ("home", "draw", "away")
+
+PROBABILITY_COLUMNS = tuple(f"{b}_p_{o}" for b in IMPLIED_BOOKMAKERS for o in OUTCOMES)
+OVERROUND_COLUMNS = tuple(f"{b}_overround" for b in IMPLIED_BOOKMAKERS)
+CONSENSUS_COLUMNS = (tuple(f"cons_p_{o}" for o in OUTCOMES) + tuple(f"cons_{o}" for o in OUTCOMES)
+                     + ("cons_books",))
+DIVERGENCE_COLUMNS = tuple(f"div_{a}_{b}" for a, b in combinations(IMPLIED_BOOKMAKERS, 2))
+IMPLIED_COLUMNS = PROBABILITY_COLUMNS + OVERROUND_COLUMNS + CONSENSUS_COLUMNS + DIVERGENCE_COLUMNS
+
+COLUMNS = FEATURES + IMPLIED_COLUMNS
+
+# 每块处理的行数
+DEFAULT_BLOCK = 65536
+
+
+class FeatureMatrix:
+    """
+    特征矩阵: data 为 (列数, N) 的 float64 数组, matrix[name] 返回该列的视图 (连续内存)
+    可以像字典一样使用 (keys / items / in), 批量引擎直接把它当作特征字典
+    """
+
+    def __init__(self, n, columns=COLUMNS):
+        self.columns = tuple(columns)
+        self.index = {name: i for i, name in enumerate(self.columns)}
+        self.data = np.empty((len(self.columns), n), dtype=np.float64)
+
+    def __len__(self):
+        return self.data.shape[1]
+
+    def __getitem__(self, name):
+        return self.data[self.index[name]]
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def keys(self):
+        return self.columns
+
+    def values(self):
+        return [self.data[i] for i in range(len(self.columns))]
+
+    def items(self):
+        return [(name, self.data[i]) for i, name in enumerate(self.columns)]
+
+    def take(self, rows):
+        """按行选取, 返回 {列名: 数组}"""
+        return {name: self.data[i][rows] for i, name in enumerate(self.columns)}
+
+    def to_dict(self, row):
+        """单场比赛的全部特征"""
+        return {name: float(self.data[i, row]) for i, name in enumerate(self.columns)}
+
+
+def _rule_block(m, am, wl, hg, s):
+    am_min = m["am_min"][s]
+    wl_min = m["wl_min"][s]
+    hg_min = m["hg_min"][s]
+    # 按列两两取小比 min(axis=1) 快, 结果相同
+    for odds, column in ((am, am_min), (wl, wl_min), (hg, hg_min)):
+        np.minimum(odds[:, 0], odds[:, 1], out=column)
+        np.minimum(column, odds[:, 2], out=column)
+    m["wl_draw"][s] = wl[:, 1]
+    m["hg_draw"][s] = hg[:, 1]
+    m["wl_0"][s] = wl[:, 0]
+    m["wl_2"][s] = wl[:, 2]
+    np.subtract(hg_min, wl_min, out=m["hg_wl_diff"][s])
+    np.subtract(wl_min, hg_min, out=m["wl_hg_diff"][s])
+    np.subtract(am_min, wl_min, out=m["am_wl_diff"][s])
+    np.abs(m["am_wl_diff"][s], out=m["am_wl_gap"][s])
+    np.subtract(hg[:, 1], wl[:, 1], out=m["hgd_wld_diff"][s])
+
+
+def _market_block(m, odds, s):
+    probs = {}
+    for bookmaker, values in odds.items():
+        if values is None:
+            continue
+        columns = [m[f"{bookmaker}_p_{o}"][s] for o in OUTCOMES]
+        overround = m[f"{bookmaker}_overround"][s]
+        for k, column in enumerate(columns):
+            np.divide(1.0, values[:, k], out=column)
+        np.add(columns[0], columns[1], out=overround)
+        overround += columns[2]
+        for column in columns:
+            column /= overround
+        probs[bookmaker] = columns
+
+    books = m["cons_books"][s]
+    if odds["lb"] is None:
+        for o in OUTCOMES:
+            m[f"lb_p_{o}"][s] = np.nan
+        m["lb_overround"][s] = np.nan
+        books.fill(3.0)
+    else:
+        np.add(3.0, ~np.isnan(probs["lb"][0]), out=books)
+    for k, outcome in enumerate(OUTCOMES):
+        consensus = m[f"cons_p_{outcome}"][s]
+        np.add(probs["am"][k], probs["wl"][k], out=consensus)
+        consensus += probs["hg"][k]
+        if "lb" in probs:
+            consensus += np.nan_to_num(probs["lb"][k], nan=0.0)
+        consensus /= books
+        np.divide(1.0, consensus, out=m[f"cons_{outcome}"][s])
+
+    for a, b in combinations(IMPLIED_BOOKMAKERS, 2):
+        column = m[f"div_{a}_{b}"][s]
+        if a not in probs or b not in probs:
+            column.fill(np.nan)
+            continue
+        column.fill(0.0)
+        for k in range(len(OUTCOMES)):
+            column += np.abs(probs[a][k] - probs[b][k])
+        column *= 0.5
+
+
+def compute_feature_matrix(am, wl, hg, lb=None, columns=COLUMNS, block=DEFAULT_BLOCK):
+    """
+    计算特征矩阵
+    am / wl / hg: (N, 3) 赔率数组; lb: (N, 3) 立博赔率, 可为 None 或含 NaN 的行
+    columns: 需要的列 (默认全部); 只要规则特征时传 FEATURES, 不计算隐含概率特征
+    """
+    n = len(am)
+    matrix = FeatureMatrix(n, columns)
+    want_rules = any(name in matrix for name in FEATURES)
+    want_implied = any(name in matrix for name in IMPLIED_COLUMNS)
+    if want_implied and not set(IMPLIED_COLUMNS) <= set(matrix.columns):
+        raise ValueError("隐含概率特征需要整组计算, columns 须包含全部 IMPLIED_COLUMNS")
+    if want_rules and not set(FEATURES) <= set(matrix.columns):
+        raise ValueError("规则特征需要整组计算, columns 须包含全部 FEATURES")
+    for start in range(0, n, block):
+        s = slice(start, min(start + block, n))
+        if want_rules:
+            _rule_block(matrix, am[s], wl[s], hg[s], s)
+        if want_implied:
+            _market_block(matrix, {"am": am[s], "wl": wl[s], "hg": hg[s], "lb": None if lb is None else lb[s]}, s)
+    return matrix
@@ -0,0 +1,258 @@
+"""
+流式导入与分析
+
+从 CSV / JSONL 文件 (或标准输入) 逐行读取赔率, 按块校验、批量分析并立即输出结果,
+不在内存中保留已处理的比赛, 峰值内存只与块大小有关。
+
+CSV 表头:
+    match_id,league,am_home,am_draw,am_away,wl_home,wl_draw,wl_away,hg_home,hg_draw,hg_away[,lb_home,lb_draw,lb_away][,kickoff]
+    可选的盘口列 (markets.py): {公司}_ah_line,{公司}_ah_home,{公司}_ah_away / {公司}_ou_line,{公司}_ou_over,{公司}_ou_under
+JSONL 每行:
+    {"match_id": "J1-001", "league": "9", "am": [1.93, 3.23, 3.62], "wl": [...], "hg": [...], "lb": [...],
+     "kickoff": "2024-05-03 19:00", "markets": {"wl_ah": [-0.5, 0.92, 0.96], "wl_ou": [2.5, 0.90, 0.98]}}
+"""
+
+import csv
+import io
+import json
+import sys
+import time
+from itertools import islice
+
+from markets import MARKET_COLUMNS, csv_fields
+from validate import check_markets, check_odds, parse_kickoff
+
+BOOKMAKERS = ("am", "wl", "hg")
+OUTCOMES = ("home", "draw", "away")
+CSV_FIELDS = ["match_id", "league"] + [f"{b}_{o}" for b in BOOKMAKERS + ("lb",) for o in OUTCOMES]
+
+DEFAULT_CHUNK_SIZE = 10000
+
+
+def _open_source(source):
+    if source == "-":
+        return sys.stdin
+    return open(source, encoding="utf-8", newline="")
+
+
+def detect_format(source, stream):
+    """根据扩展名 (标准输入时根据首字符) 判断 csv / jsonl"""
+    if source != "-":
+        return "jsonl" if source.endswith((".jsonl", ".json", ".ndjson")) else "csv"
+    head = stream.buffer.peek(1)[:1] if hasattr(stream, "buffer") and hasattr(stream.buffer, "peek") else b""
+    return "jsonl" if head == b"{" else "csv"
+
+
+def _csv_records(stream):
+    reader = csv.reader(stream)
+    header = next(reader, None)
+    if header is None:
+        return
+    position = {name.strip(): i for i, name in enumerate(header)}
+    missing = [name for name in CSV_FIELDS[:11] if name not in position]
+    if missing:
+        raise ValueError(f"CSV缺少字段: {', '.join(missing)}")
+    id_col, league_col = position["match_id"], position["league"]
+    odds_cols = [(b, [position[f"{b}_{o}"] for o in OUTCOMES]) for b in BOOKMAKERS]
+    lb_cols = [position[f"lb_{o}"] for o in OUTCOMES] if f"lb_{OUTCOMES[0]}" in position else None
+    kickoff_col = position.get("kickoff")
+    market_cols = [(column, [position[name] for name in csv_fields(column)]) for column in MARKET_COLUMNS
+                   if all(name in position for name in csv_fields(column))]
+    width = len(header)
+    for row in reader:
+        if len(row) < width:
+            yield {"_error": f"字段数不足: {len(row)}"}
+            continue
+        record = {"match_id": row[id_col], "league": row[league_col]}
+        for bookmaker, cols in odds_cols:
+            record[bookmaker] = [row[c] for c in cols]
+        if lb_cols is not None and row[lb_cols[0]] != "":
+            record["lb"] = [row[c] for c in lb_cols]
+        if kickoff_col is not None:
+            record["kickoff"] = row[kickoff_col]
+        if market_cols:
+            markets = {column: [row[c] for c in cols] for column, cols in market_cols if row[cols[0]] != ""}
+            if markets:
+                record["markets"] = markets
+        yield record
+
+
+def _jsonl_records(stream):
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield {"_error": f"JSON格式错误: {e}"}
+
+
+def read_records(source, fmt=None):
+    """逐行读取原始记录 (生成器)"""
+    stream = _open_source(source)
+    try:
+        fmt = fmt or detect_format(source, stream)
+        if fmt == "csv":
+            yield from _csv_records(stream)
+        elif fmt == "jsonl":
+            yield from _jsonl_records(stream)
+        else:
+            raise ValueError(f"不支持的格式: {fmt}")
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def _parse_odds(values):
+    odds = [float(v) for v in values]
+    if len(odds) != 3:
+        raise ValueError(f"赔率必须为胜平负三项, 实际为 {len(odds)} 项")
+    return odds
+
+
+def parse_markets(markets):
+    """
+    记录中的盘口 {盘口: [盘口线, 水位, 水位]} 转为数字; 值为 null 的盘口保留为 None, 视为没有该盘口
+    (与 validate_records 按列检查相同); 没有盘口时返回 None
+    """
+    if not markets:
+        return None
+    if not isinstance(markets, dict):
+        raise ValueError("盘口须为 {盘口: [盘口线, 水位, 水位]}")
+    return {column: [float(v) for v in values] if values is not None else None for column, values in markets.items()}
+
+
+def parse_record(record, leagues):
+    """
+    按 add_match 的要求校验一条记录 (赔率检查见 validate.check_odds, 盘口见 validate.check_markets)
+    返回 (match_id, league_code, am, wl, hg, lb, kickoff); 不合法时抛出 ValueError
+    开赛时间统一为 'YYYY-MM-DD HH:MM' (validate.parse_kickoff)
+    盘口只做检查, 不在返回值中 (批量路径由 validate.validate_records 按列取出)
+    """
+    if not isinstance(record, dict):
+        raise ValueError("不是 JSON 对象")
+    if "_error" in record:
+        raise ValueError(record["_error"])
+    match_id = record.get("match_id")
+    if match_id in (None, ""):
+        raise ValueError("缺少比赛编号")
+    league_code = str(record.get("league", "")).strip()
+    if league_code not in leagues:
+        raise ValueError("无效的联赛代码")
+    odds = []
+    for bookmaker in BOOKMAKERS:
+        if record.get(bookmaker) is None:
+            raise ValueError(f"缺少 {bookmaker} 赔率")
+        odds.append(_parse_odds(record[bookmaker]))
+    lb = record.get("lb")
+    lb = _parse_odds(lb) if lb is not None else None
+    check_odds(odds[0], odds[1], odds[2], lb)
+    markets = parse_markets(record.get("markets"))
+    if markets:
+        check_markets(markets)
+    kickoff = parse_kickoff(record.get("kickoff") or None)
+    return (str(match_id), league_code, odds[0], odds[1], odds[2], lb, kickoff)
+
+
+def chunked(iterable, size):
+    """按块切分 (生成器)"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class IngestStats:
+    """导入统计"""
+
+    def __init__(self):
+        self.rows = 0
+        self.rejected = 0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        return (f"已分析 {self.rows} 场比赛, 跳过 {self.rejected} 行, "
+                f"耗时 {self.elapsed:.2f}s, {self.rows_per_sec:,.0f} 行/秒")
+
+
+def analyze_chunks(system, records, chunk_size=DEFAULT_CHUNK_SIZE, stats=None, on_reject=None, engine="vector"):
+    """
+    按块分析记录流, 每块产出 (parse_record 结果列表, BatchResult)
+    engine: 批量引擎, 见 FootballPredictionSystem.analyze_batch
+    不合法的行 (见 validate.validate_records) 交给 on_reject(原始记录, 原因) 处理
+    """
+    from validate import validate_records
+
+    stats = stats or IngestStats()
+    for chunk in chunked(records, chunk_size):
+        parsed, odds, rejected = validate_records(chunk, system.leagues)
+        stats.rejected += len(rejected)
+        if on_reject is not None:
+            for record, reason in rejected:
+                on_reject(record, reason)
+        if not parsed:
+            continue
+        result = system.analyze_batch(odds[0], odds[1], odds[2], [row[1] for row in parsed], engine=engine,
+                                      markets=odds[4])
+        stats.rows += len(parsed)
+        yield parsed, result
+    stats.elapsed = time.perf_counter() - stats.started
+
+
+def analyze_stream(system, records, chunk_size=DEFAULT_CHUNK_SIZE, stats=None, on_reject=None, on_chunk=None,
+                   engine="vector"):
+    """
+    按块分析记录流, 逐场产出 (match_id, league_code, 规则编号列表, 综合判断)
+    engine: 批量引擎, 见 FootballPredictionSystem.analyze_batch
+    不合法的行交给 on_reject(原始记录, 原因) 处理
+    每块分析完成后调用 on_chunk(parse_record 结果列表, BatchResult), 例如写入数据库
+    """
+    for parsed, result in analyze_chunks(system, records, chunk_size, stats, on_reject, engine):
+        if on_chunk is not None:
+            on_chunk(parsed, result)
+        labels = result.verdict_labels()
+        rule_lists = result.rule_lists()
+        for i, row in enumerate(parsed):
+            yield row[0], row[1], rule_lists[i], labels[i]
+
+
+def print_reject(record, reason):
+    """默认的 on_reject: 把原因打印到标准错误"""
+    print(f"跳过无效数据: {reason}", file=sys.stderr)
+
+
+def ingest(system, source, output=None, fmt=None, chunk_size=DEFAULT_CHUNK_SIZE, repository=None, engine="vector",
+           on_reject=print_reject):
+    """
+    导入文件并把分析结果以 JSONL 写到 output (默认标准输出)
+    repository: repository.MatchRepository, 给出时同时保存比赛和分析结果
+    on_reject: 不合格记录的回调 (原始记录, 原因), 例如 validate.RejectFile
+    返回 IngestStats
+    """
+    out = output or sys.stdout
+    stats = IngestStats()
+
+    write = out.write
+    for match_id, league_code, rules, verdict in analyze_stream(
+            system, read_records(source, fmt), chunk_size, stats, on_reject,
+            repository.save_batch if repository is not None else None, engine):
+        write(json.dumps({"match_id": match_id, "league": league_code, "rules": rules, "verdict": verdict},
+                         ensure_ascii=False))
+        write("\n")
+    out.flush()
+    return stats
+
+
+def open_output(path):
+    """打开输出文件 ('-' 为标准输出)"""
+    if path in (None, "-"):
+        return sys.stdout
+    return io.open(path, "w", encoding="utf-8", buffering=1 << 20)
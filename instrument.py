@@ -0,0 +1,252 @@
+"""
+规则计数与性能剖析
+
+Instrumentation 统计每个联赛、每条规则的调用次数、触发次数和累计耗时, 用于找出哪条规则
+变慢或触发过于频繁。默认不启用: 启用时在规则表各联赛的求值函数外加一层计数包装
+(CompiledLeague.add_wrapper, 与 adaptive 换用的短路求值函数互不影响), 并把批量引擎中对应的
+VectorLeague.evaluate 换成计数版本; 停用时去掉, 因此不启用时没有任何额外开销。
+包装装在传入的规则表上; FootballPredictionSystem.instrument 先换用本实例专用的规则表副本,
+进程内共享的 default_rules() 和其他实例不受影响。
+
+- 逐场路径 (analyze_match 等): 结果和联赛耗时来自内层求值函数; 每条规则另用单独编译的求值函数
+  计时 (不计入联赛耗时)
+- 批量路径 (batch.vector): 按联赛计时, 规则只统计触发次数
+- 命中分析缓存的比赛不经过规则求值, 不计数; 查表引擎和多进程分析不计数
+
+profile_call 用 cProfile 剖析一次运行, 也可以输出火焰图工具使用的折叠调用栈
+(每行 "调用栈 微秒数", 调用栈以 ; 分隔)。
+"""
+
+import json
+import os
+import sys
+import time
+
+# 以这些扩展名结尾时输出折叠调用栈, 否则输出 cProfile 统计文件
+FOLDED_SUFFIXES = (".folded", ".collapsed", ".txt")
+
+
+class Counter:
+    """单条规则或单个联赛的计数"""
+
+    __slots__ = ("calls", "fires", "seconds")
+
+    def __init__(self):
+        self.calls = 0
+        self.fires = 0
+        self.seconds = 0.0
+
+    def to_dict(self):
+        return {"calls": self.calls, "fires": self.fires, "seconds": self.seconds}
+
+
+class Instrumentation:
+    """
+    规则表计数
+    rules: 编译后的规则表 (rule_engine.CompiledRules)
+    联赛的 fires 为至少触发一条规则的比赛数
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.leagues = {code: Counter() for code in rules.leagues}
+        self.rule_counters = {code: {rule.rule_id: Counter() for rule in league.rules}
+                              for code, league in rules.leagues.items()}
+        self.enabled = False
+        self._vector_originals = {}
+
+    def enable(self):
+        """换入计数版本的求值函数"""
+        if self.enabled:
+            return self
+        for league in self.rules.leagues.values():
+            league.add_wrapper(self, self._scalar(league))
+        try:
+            from batch import vector_rules
+        except ImportError:
+            # 没有 numpy 时只统计逐场路径
+            vector_rules = None
+        if vector_rules is not None:
+            for code, vector in vector_rules(self.rules).leagues.items():
+                code = str(code)
+                self._vector_originals[code] = vector
+                vector.evaluate = self._vector(code, vector)
+        self.enabled = True
+        return self
+
+    def disable(self):
+        """去掉计数包装"""
+        for league in self.rules.leagues.values():
+            league.remove_wrapper(self)
+        for vector in self._vector_originals.values():
+            # 删除实例属性后恢复为类方法
+            del vector.evaluate
+        self._vector_originals.clear()
+        self.enabled = False
+        return self
+
+    def reset(self):
+        for counter in self.leagues.values():
+            counter.__init__()
+        for counters in self.rule_counters.values():
+            for counter in counters.values():
+                counter.__init__()
+
+    def _scalar(self, league):
+        """计数包装: wrap(内层求值函数) -> 求值函数"""
+        league_counter = self.leagues[league.code]
+        counters = self.rule_counters[league.code]
+        checks = [(counters[rule.rule_id], league.subset([rule.rule_id]).evaluate) for rule in league.rules]
+        clock = time.perf_counter
+
+        def wrap(inner):
+            def evaluate(f):
+                started = clock()
+                fired = inner(f)
+                league_counter.seconds += clock() - started
+                league_counter.calls += 1
+                league_counter.fires += bool(fired)
+                for counter, check in checks:
+                    t = clock()
+                    hit = check(f)
+                    counter.seconds += clock() - t
+                    counter.calls += 1
+                    if hit:
+                        counter.fires += 1
+                return fired
+
+            return evaluate
+
+        return wrap
+
+    def _vector(self, code, vector):
+        league_counter = self.leagues[code]
+        league_rules = self.rules.leagues[code].rules
+        counters = [self.rule_counters[code][rule.rule_id] for rule in league_rules]
+        columns = [column for column, _ in vector.rules]
+        original = type(vector).evaluate.__get__(vector)
+        clock = time.perf_counter
+
+        def evaluate(f, fired, rows):
+            started = clock()
+            original(f, fired, rows)
+            elapsed = clock() - started
+            hits = fired[rows][:, columns]
+            for counter, count in zip(counters, hits.sum(axis=0).tolist()):
+                counter.calls += len(hits)
+                counter.fires += count
+            league_counter.calls += len(hits)
+            league_counter.fires += int(hits.any(axis=1).sum())
+            league_counter.seconds += elapsed
+
+        return evaluate
+
+    def snapshot(self):
+        """
+        当前计数
+        {"leagues": {代码: {name, calls, fires, seconds}}, "rules": {代码: {规则编号: {calls, fires, seconds}}}}
+        """
+        return {
+            "leagues": {code: dict(counter.to_dict(), name=self.rules.leagues[code].name)
+                        for code, counter in self.leagues.items()},
+            "rules": {code: {rule_id: counter.to_dict() for rule_id, counter in counters.items()}
+                      for code, counters in self.rule_counters.items()},
+        }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self, prefix="football"):
+        """Prometheus 文本格式"""
+        lines = []
+        metrics = (("calls", "counter", "求值次数"), ("fires", "counter", "触发次数"),
+                   ("seconds", "counter", "累计耗时 (秒)"))
+        for scope, label in (("league", "联赛"), ("rule", "规则")):
+            for field, kind, text in metrics:
+                name = f"{prefix}_{scope}_{field}_total"
+                lines.append(f"# HELP {name} {label}{text}")
+                lines.append(f"# TYPE {name} {kind}")
+                if scope == "league":
+                    for code, counter in self.leagues.items():
+                        lines.append(f'{name}{{league="{code}"}} {getattr(counter, field)}')
+                else:
+                    for code, counters in self.rule_counters.items():
+                        for rule_id, counter in counters.items():
+                            lines.append(f'{name}{{league="{code}",rule="{rule_id}"}} {getattr(counter, field)}')
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        """写入文件: .prom 为 Prometheus 文本格式, 其他为 JSON"""
+        text = self.to_prometheus() if path.endswith(".prom") else self.to_json() + "\n"
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+class StackProfiler:
+    """
+    确定性调用栈剖析 (sys.setprofile), 按完整调用栈累计自身耗时
+    结果为 {"a;b;c": 秒}
+    """
+
+    def __init__(self):
+        self.stacks = {}
+        self._stack = []
+        self._last = 0.0
+
+    @staticmethod
+    def _label(frame, event, arg):
+        if event == "c_call":
+            module = getattr(arg, "__module__", None) or "builtins"
+            return f"{module}:{getattr(arg, '__qualname__', getattr(arg, '__name__', '?'))}"
+        code = frame.f_code
+        return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+    def _callback(self, frame, event, arg):
+        now = time.perf_counter()
+        stack = self._stack
+        if stack:
+            path = stack[-1]
+            self.stacks[path] = self.stacks.get(path, 0.0) + now - self._last
+        if event in ("call", "c_call"):
+            label = self._label(frame, event, arg)
+            stack.append(f"{stack[-1]};{label}" if stack else label)
+        elif stack:
+            stack.pop()
+        self._last = time.perf_counter()
+
+    def run(self, func, *args, **kwargs):
+        self._last = time.perf_counter()
+        sys.setprofile(self._callback)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            sys.setprofile(None)
+            self._stack.clear()
+
+    def write(self, path):
+        """折叠调用栈格式, 单位微秒"""
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, seconds in sorted(self.stacks.items()):
+                micros = int(seconds * 1e6)
+                if micros:
+                    f.write(f"{stack} {micros}\n")
+
+
+def profile_call(func, path):
+    """
+    剖析 func() 并写入 path
+    .folded / .collapsed / .txt 输出折叠调用栈 (flamegraph.pl、speedscope 等可直接读取),
+    其他扩展名输出 cProfile 统计文件 (python -m pstats 读取)
+    """
+    if path.endswith(FOLDED_SUFFIXES):
+        profiler = StackProfiler()
+        try:
+            return profiler.run(func)
+        finally:
+            profiler.write(path)
+    import cProfile
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func)
+    finally:
+        profiler.dump_stats(path)
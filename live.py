@@ -0,0 +1,211 @@
+"""
+实时赔率跟踪
+
+比赛开赛前各公司赔率会不断变化。OddsTracker 为每场比赛的每家公司保存有限长度的赔率
+快照序列, 收到更新后只重新判断输入特征发生变化的规则 (例如威廉希尔赔率变化只重新检查
+依赖威廉希尔特征的规则), 综合判断改变时产生 VerdictChange 事件, 不重新生成报告文本。
+
+每次更新的开销与历史长度无关: 快照存放在定长 deque 中, 特征只有十几个, 需要重新判断的
+规则各自使用单独编译的求值函数。
+"""
+
+import time
+from collections import deque
+
+from match_store import BOOKMAKERS
+from result import VERDICT_LABELS, Direction, decide_verdict
+from rule_engine import FEATURES, match_features, rule_features
+from validate import check_odds
+
+DEFAULT_HISTORY = 64
+
+# 参与规则计算的公司 (立博赔率只记录历史)
+TRACKED_BOOKMAKERS = ("am", "wl", "hg")
+
+
+class VerdictChange:
+    """综合判断变化事件"""
+
+    __slots__ = ("match_id", "timestamp", "old", "new", "added", "removed")
+
+    def __init__(self, match_id, timestamp, old, new, added, removed):
+        self.match_id = match_id
+        self.timestamp = timestamp
+        self.old = old
+        self.new = new
+        self.added = added
+        self.removed = removed
+
+    def to_dict(self):
+        return {
+            "match_id": self.match_id,
+            "timestamp": self.timestamp,
+            "old": VERDICT_LABELS[self.old],
+            "new": VERDICT_LABELS[self.new],
+            "added": list(self.added),
+            "removed": list(self.removed),
+        }
+
+    def __repr__(self):
+        return (f"VerdictChange({self.match_id!r}, {VERDICT_LABELS[self.old]} -> {VERDICT_LABELS[self.new]}, "
+                f"+{list(self.added)} -{list(self.removed)})")
+
+
+class _LeaguePlan:
+    """单个联赛的增量求值计划: 每条规则单独编译, 并按特征建立 特征 -> 规则 索引"""
+
+    def __init__(self, league):
+        self.league = league
+        self.rules = {rule.rule_id: rule for rule in league.rules}
+        self.evaluators = {rule.rule_id: league.subset([rule.rule_id]).evaluate for rule in league.rules}
+        self.by_feature = {}
+        for definition in league.definitions:
+            for feature in rule_features(definition):
+                self.by_feature.setdefault(feature, []).append(definition["id"])
+
+
+class _TrackedMatch:
+    __slots__ = ("league_code", "features", "fired", "verdict", "history")
+
+    def __init__(self, league_code, features, fired, verdict, history):
+        self.league_code = league_code
+        self.features = features
+        self.fired = fired
+        self.verdict = verdict
+        self.history = history
+
+
+class OddsTracker:
+    """
+    赔率变化跟踪
+    system: FootballPredictionSystem, 比赛须已通过 add_match 添加
+    history: 每家公司保留的快照数
+    """
+
+    def __init__(self, system, history=DEFAULT_HISTORY):
+        self.system = system
+        self.history_size = history
+        self.plans = {}
+        self.tracked = {}
+        self.listeners = []
+        self.updates = 0
+        self.rules_evaluated = 0
+
+    def subscribe(self, callback):
+        """注册事件回调 callback(VerdictChange)"""
+        self.listeners.append(callback)
+
+    def _plan(self, league_code):
+        plan = self.plans.get(league_code)
+        if plan is None:
+            plan = self.plans[league_code] = _LeaguePlan(self.system.rules.leagues[league_code])
+        return plan
+
+    def _verdict(self, plan, fired):
+        counts = [0, 0, 0, 0]
+        for rule_id in fired:
+            counts[plan.rules[rule_id].direction_code] += 1
+        return decide_verdict(len(fired), counts[Direction.UPPER], counts[Direction.LOWER], counts[Direction.DRAW])
+
+    def _start(self, match_id, row, timestamp):
+        store = self.system.matches
+        league_code = store.league(row)
+        plan = self._plan(league_code)
+        odds = {bookmaker: store.odds(row, bookmaker) for bookmaker in ("am", "wl", "hg", "lb")}
+        features = match_features(odds["am"], odds["wl"], odds["hg"])
+        if plan.league.market_features:
+            features.update(store.market_features(row, plan.league.market_features))
+        fired = {rule.rule_id for rule in plan.league.evaluate(features)}
+        history = {}
+        for bookmaker, values in odds.items():
+            history[bookmaker] = deque(maxlen=self.history_size)
+            if values is not None:
+                history[bookmaker].append((timestamp, tuple(values)))
+        state = self.tracked[match_id] = _TrackedMatch(league_code, features, fired,
+                                                       self._verdict(plan, fired), history)
+        return state
+
+    def update(self, match_id, bookmaker, odds, timestamp=None):
+        """
+        记录一次赔率更新
+        bookmaker: am / wl / hg / lb
+        odds: [胜, 平, 负]
+        返回 VerdictChange (综合判断改变时) 或 None
+        更新后的全部赔率须通过 validate.check_odds, 否则抛出 ValueError, 不修改任何状态
+        """
+        if bookmaker not in self.system.matches.columns:
+            raise ValueError(f"未知的公司: {bookmaker}")
+        store = self.system.matches
+        row = store.row(match_id)
+        if row is None:
+            raise ValueError("比赛数据不存在")
+        books = {name: store.odds(row, name) for name in BOOKMAKERS}
+        books[bookmaker] = odds
+        try:
+            check_odds(books["am"], books["wl"], books["hg"], books["lb"])
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"无效的赔率: {e}") from None
+        timestamp = time.time() if timestamp is None else timestamp
+        state = self.tracked.get(match_id) or self._start(match_id, row, timestamp)
+
+        odds = [float(v) for v in odds]
+        store.set_odds(row, bookmaker, odds)
+        state.history[bookmaker].append((timestamp, tuple(odds)))
+        self.updates += 1
+        if bookmaker not in TRACKED_BOOKMAKERS:
+            return None
+
+        features = match_features(store.odds(row, "am"), store.odds(row, "wl"), store.odds(row, "hg"))
+        old_features = state.features
+        plan = self._plan(state.league_code)
+        if plan.league.market_features:
+            # 盘口不随胜平负赔率更新变化, 沿用开始跟踪时读取的盘口特征
+            for feature in plan.league.market_features:
+                features[feature] = old_features[feature]
+        state.features = features
+        affected = set()
+        for feature in FEATURES:
+            if features[feature] != old_features[feature]:
+                affected.update(plan.by_feature.get(feature, ()))
+        if not affected:
+            return None
+
+        added, removed = [], []
+        fired = state.fired
+        for rule_id in affected:
+            now = bool(plan.evaluators[rule_id](features))
+            if now and rule_id not in fired:
+                fired.add(rule_id)
+                added.append(rule_id)
+            elif not now and rule_id in fired:
+                fired.discard(rule_id)
+                removed.append(rule_id)
+        self.rules_evaluated += len(affected)
+        if not added and not removed:
+            return None
+
+        verdict = self._verdict(plan, fired)
+        if verdict == state.verdict:
+            return None
+        event = VerdictChange(match_id, timestamp, state.verdict, verdict, tuple(added), tuple(removed))
+        state.verdict = verdict
+        for callback in self.listeners:
+            callback(event)
+        return event
+
+    def forget(self, match_id):
+        """停止跟踪 (比赛数据被重新添加时调用)"""
+        self.tracked.pop(match_id, None)
+
+    def history(self, match_id, bookmaker):
+        """某场比赛某家公司的赔率快照 [(时间, (胜, 平, 负)), ...], 从旧到新"""
+        state = self.tracked.get(match_id)
+        return list(state.history[bookmaker]) if state is not None else []
+
+    def fired(self, match_id):
+        """当前触发的规则编号 (按规则表顺序)"""
+        state = self.tracked[match_id]
+        return [rule.rule_id for rule in self._plan(state.league_code).league.rules if rule.rule_id in state.fired]
+
+    def verdict(self, match_id):
+        return self.tracked[match_id].verdict
@@ -0,0 +1,168 @@
+"""
+查表引擎
+
+赔率以 0.01 为步长报价, 只依赖 am_min 和 wl_min 的规则 (如英冠、德乙高低水、日职乙高指数
+以及通用的强弱队规则) 可以预先在 (am_min, wl_min) 网格上全部算好: 每个联赛一张表, 表项
+是这些规则的触发位图, 每场比赛的判断变成一次数组下标访问。
+
+- 网格: 1.01 至 10.00, 每 0.01 一格 (900 x 900); 表由 batch.VectorLeague 在网格点上求值生成,
+  网格点的浮点数与解析报价得到的浮点数完全相同, 查表结果与直接计算一致
+- 不在网格上 (非 0.01 整数倍或超出范围) 的比赛回退到完整的向量化求值
+- 依赖其他特征的规则仍用 batch 的向量化求值, 但只计算这些规则用到的条件
+- 生成的表按规则表摘要缓存在磁盘上 (.npz), 规则表不变时启动直接载入
+"""
+
+import os
+
+import numpy as np
+
+from batch import (BatchResult, VectorLeague, as_markets, as_odds, compute_features, compute_verdicts,
+                   to_league_codes, vector_rules)
+from markets import market_feature_arrays
+from rule_engine import FEATURES, RULES_PATH, default_rules, rule_inputs
+
+# 查表规则只能依赖的基础赔率值
+LUT_INPUTS = ("am_min", "wl_min")
+
+GRID_MIN = 101
+GRID_MAX = 1000
+GRID_SIZE = GRID_MAX - GRID_MIN + 1
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(RULES_PATH), ".lut_cache")
+
+
+def lut_rule_ids(league):
+    """联赛中可以查表的规则编号"""
+    return tuple(d["id"] for d in league.definitions if rule_inputs(d) <= set(LUT_INPUTS))
+
+
+def _bits_dtype(n):
+    for dtype in (np.uint8, np.uint16, np.uint32, np.uint64):
+        if n <= np.iinfo(dtype).bits:
+            return dtype
+    raise ValueError(f"查表规则过多: {n}")
+
+
+def build_table(league, rule_ids):
+    """在 (am_min, wl_min) 网格上计算 rule_ids 的触发位图, 返回长度 GRID_SIZE**2 的数组"""
+    if not rule_ids:
+        return np.zeros(0, dtype=np.uint8)
+    subset = league.subset(rule_ids)
+    columns = {rule_id: i for i, rule_id in enumerate(rule_ids)}
+    vector = VectorLeague(subset, columns)
+    grid = np.arange(GRID_MIN, GRID_MAX + 1) / 100
+    am_min = np.repeat(grid, GRID_SIZE)
+    wl_min = np.tile(grid, GRID_SIZE)
+    zeros = np.zeros_like(am_min)
+    # 查表规则用不到其他特征
+    features = dict.fromkeys(FEATURES, zeros)
+    features.update(am_min=am_min, wl_min=wl_min, am_wl_diff=am_min - wl_min, am_wl_gap=np.abs(am_min - wl_min))
+    fired = np.zeros((len(am_min), len(rule_ids)), dtype=bool)
+    vector.evaluate(features, fired, slice(None))
+    dtype = _bits_dtype(len(rule_ids))
+    weights = (np.ones(len(rule_ids), dtype=dtype) << np.arange(len(rule_ids), dtype=dtype)).astype(dtype)
+    return (fired.astype(dtype) * weights).sum(axis=1, dtype=dtype)
+
+
+def grid_index(am_min, wl_min):
+    """
+    网格下标; 不在网格上的行为 -1
+    """
+    q_am = np.rint(am_min * 100)
+    q_wl = np.rint(wl_min * 100)
+    on_grid = ((q_am / 100 == am_min) & (q_wl / 100 == wl_min)
+               & (q_am >= GRID_MIN) & (q_am <= GRID_MAX) & (q_wl >= GRID_MIN) & (q_wl <= GRID_MAX))
+    index = np.full(len(am_min), -1, dtype=np.intp)
+    index[on_grid] = (q_am[on_grid].astype(np.intp) - GRID_MIN) * GRID_SIZE + (q_wl[on_grid].astype(np.intp) - GRID_MIN)
+    return index
+
+
+class LutLeague:
+    """单个联赛的查表求值器"""
+
+    def __init__(self, league, table, lut_ids, rule_index):
+        self.table = table
+        self.lut_columns = np.array([rule_index[rule_id] for rule_id in lut_ids], dtype=np.intp)
+        self.shifts = np.arange(len(lut_ids), dtype=table.dtype)
+        rest = [rule.rule_id for rule in league.rules if rule.rule_id not in set(lut_ids)]
+        self.rest = VectorLeague(league.subset(rest), rule_index) if rest else None
+        self.full = VectorLeague(league, rule_index)
+        self.market_features = league.market_features
+
+    def evaluate(self, f, index, fired, rows):
+        on_grid = index >= 0
+        if len(self.lut_columns):
+            hit_rows = rows[on_grid]
+            bits = self.table[index[on_grid]]
+            fired[hit_rows[:, None], self.lut_columns] = ((bits[:, None] >> self.shifts) & 1).astype(bool)
+        if self.rest is not None:
+            self.rest.evaluate(f, fired, rows)
+        if not on_grid.all():
+            off = ~on_grid
+            self.full.evaluate({name: column[off] for name, column in f.items()}, fired, rows[off])
+
+
+class LutEngine:
+    """
+    查表引擎
+    rules: 编译后的规则表 (默认 rules.json)
+    cache_dir: 表缓存目录, None 表示不缓存到磁盘
+    """
+
+    def __init__(self, rules=None, cache_dir=DEFAULT_CACHE_DIR):
+        self.rules = rules or default_rules()
+        vector = vector_rules(self.rules)
+        self.rule_ids = vector.rule_ids
+        self.valid_codes = vector.leagues
+        tables = self._load_tables(cache_dir)
+        self.leagues = {}
+        for code, league in self.rules.leagues.items():
+            lut_ids = lut_rule_ids(league)
+            self.leagues[int(code)] = LutLeague(league, tables[lut_ids], lut_ids, vector.rule_index)
+
+    def _load_tables(self, cache_dir):
+        """各联赛查表规则组合对应的表, 相同组合共用一张"""
+        wanted = {}
+        for league in self.rules.leagues.values():
+            wanted.setdefault(lut_rule_ids(league), league)
+        path = None
+        if cache_dir and self.rules.fingerprint:
+            path = os.path.join(cache_dir, f"lut-{self.rules.fingerprint}-{GRID_MIN}-{GRID_MAX}.npz")
+            if os.path.exists(path):
+                with np.load(path) as data:
+                    names = list(data["names"])
+                    tables = {tuple(name.split("|")) if name else (): data[f"t{i}"] for i, name in enumerate(names)}
+                if all(ids in tables for ids in wanted):
+                    return tables
+        tables = {ids: build_table(league, ids) for ids, league in wanted.items()}
+        if path is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = path + ".tmp.npz"
+            arrays = {f"t{i}": table for i, table in enumerate(tables.values())}
+            np.savez(tmp_path, names=np.array(["|".join(ids) for ids in tables]), **arrays)
+            os.replace(tmp_path, path)
+        return tables
+
+    def evaluate(self, features, codes, markets=None):
+        """按联赛分组求值, 返回 (N, 规则数) 的触发矩阵"""
+        fired = np.zeros((len(codes), len(self.rule_ids)), dtype=bool)
+        index = grid_index(features["am_min"], features["wl_min"])
+        for code in np.unique(codes):
+            rows = np.flatnonzero(codes == code)
+            league = self.leagues[int(code)]
+            subset = {name: column[rows] for name, column in features.items()}
+            if league.market_features:
+                subset.update(market_feature_arrays(markets, league.market_features, rows, len(rows)))
+            league.evaluate(subset, index[rows], fired, rows)
+        return fired
+
+    def analyze(self, am_odds, wl_odds, hg_odds, leagues, markets=None):
+        """批量分析, 结果与 batch.analyze_batch 相同"""
+        am = as_odds(am_odds, "澳门")
+        wl = as_odds(wl_odds, "威廉希尔")
+        hg = as_odds(hg_odds, "皇冠")
+        codes = to_league_codes(leagues, self.valid_codes)
+        if not (len(am) == len(wl) == len(hg) == len(codes)):
+            raise ValueError("赔率数组与联赛代码长度不一致")
+        fired = self.evaluate(compute_features(am, wl, hg), codes, as_markets(markets, len(codes)))
+        return BatchResult(fired, compute_verdicts(fired, self.rules), self.rule_ids)
@@ -1,23 +1,37 @@
+import os
+import sys
+
+from markets import market_features
+from match_store import MatchStore
+from cache import DEFAULT_CACHE_SIZE, AnalysisCache
+from result import AnalysisResult, render_report, verdict_from_messages
+from rule_engine import compile_rule_table, default_rules, load_rules, make_features, match_features
+from validate import Rejection, check_markets, check_odds, parse_kickoff
+
+
 class FootballPredictionSystem:
-    def __init__(self):
-        self.matches = {}
-        self.leagues = {
-            "1": "英超 (Premier League)",
-            "2": "西甲 (La Liga)", 
-            "3": "德甲 (Bundesliga)",
-            "4": "意甲 (Serie A)",
-            "5": "法甲 (Ligue 1)",
-            "6": "英冠 (Championship)",
-            "7": "德乙 (2. Bundesliga)",
-            "8": "法乙 (Ligue 2)", 
-            "9": "日职联 (J1 League)",
-            "10": "日职乙 (J2 League)",
-            "11": "韩K联 (K League 1)",
-            "12": "巴甲 (Brasileirão)",
-            "13": "美职联 (MLS)"
-        }
+    def __init__(self, rules_path=None, cache_size=DEFAULT_CACHE_SIZE):
+        """
+        rules_path: 规则表文件 (默认使用 rules.json)
+        cache_size: 分析缓存大小 (相同联赛+赔率组合直接复用结果), 0 表示不使用缓存
+        """
+        self.rules_path = rules_path
+        self.rules = load_rules(rules_path) if rules_path else default_rules()
+        # default_rules() 在进程内共享, 计数或调整条件顺序之前换成本实例专用的副本
+        self._shared_rules = not rules_path
+        self.leagues = self.rules.league_names()
+        self.matches = MatchStore(self.leagues)
+        self.archive = None
+        self.repository = None
+        self.cache = AnalysisCache(cache_size) if cache_size else None
+        self._lut = None
+        self.tracker = None
+        self.instrumentation = None
+        self.rule_order = None
+        self.journal = None
+        self.router = None
     
-    def add_match(self, match_id, league_code, am_odds, wl_odds, hg_odds, lb_odds=None):
+    def add_match(self, match_id, league_code, am_odds, wl_odds, hg_odds, lb_odds=None, kickoff=None, markets=None):
         """
         添加比赛数据
         match_id: 比赛编号
@@ -26,18 +40,39 @@ class FootballPredictionSystem:
         wl_odds: 威廉希尔初盘赔率 [胜, 平, 负]
         hg_odds: 皇冠初盘赔率 [胜, 平, 负]
         lb_odds: 立博初盘赔率 [胜, 平, 负] (可选)
+        kickoff: 开赛时间 (可选, 打开数据库时一并保存)
+        markets: 亚盘/大小球盘口 (可选), 例如 {"wl_ah": [-0.5, 0.92, 0.96], "wl_ou": [2.5, 0.90, 0.98]},
+                 格式见 markets.py (数据库只保存胜平负赔率)
+        未通过检查时不做任何修改, 返回 validate.Rejection (原因)
         """
         if league_code not in self.leagues:
-            return "无效的联赛代码"
-        
-        self.matches[match_id] = {
-            'league': league_code,
-            'league_name': self.leagues[league_code],
-            'am': am_odds,
-            'wl': wl_odds,
-            'hg': hg_odds,
-            'lb': lb_odds
-        }
+            return Rejection("无效的联赛代码")
+        if self.journal is not None and not isinstance(match_id, str):
+            # 日志只能记录字符串编号, 先检查, 避免写入内存后日志缺失 (重启后丢失)
+            return Rejection(f"无效的比赛编号: 记录日志时编号须为字符串 ({match_id!r})")
+        try:
+            check_odds(am_odds, wl_odds, hg_odds, lb_odds)
+        except (ValueError, TypeError) as e:
+            return Rejection(f"无效的赔率: {e}")
+        if markets:
+            try:
+                check_markets(markets)
+            except (ValueError, TypeError) as e:
+                return Rejection(f"无效的盘口: {e}")
+        if kickoff is not None:
+            # 在写入任何数据之前解析, 内存、日志和数据库保持一致
+            try:
+                kickoff = parse_kickoff(kickoff)
+            except ValueError as e:
+                return Rejection(e)
+        
+        self.matches.add(match_id, league_code, am_odds, wl_odds, hg_odds, lb_odds, markets)
+        if self.journal is not None:
+            self.journal.add(match_id, league_code, am_odds, wl_odds, hg_odds, lb_odds, markets)
+        if self.tracker is not None:
+            self.tracker.forget(match_id)
+        if self.repository is not None:
+            self.repository.save_match(match_id, league_code, am_odds, wl_odds, hg_odds, lb_odds, kickoff)
         return f"比赛 {match_id} ({self.leagues[league_code]}) 数据已添加"
     
     def get_lowest_odds(self, odds):
@@ -50,660 +85,349 @@ class FootballPredictionSystem:
     
     def analyze_match(self, match_id):
         """分析比赛并给出判断结果"""
-        if match_id not in self.matches:
+        result = self.analyze_match_result(match_id)
+        if result is None:
             return "比赛数据不存在"
-        
-        match_data = self.matches[match_id]
-        league_code = match_data['league']
-        am_odds = match_data['am']
-        wl_odds = match_data['wl']
-        hg_odds = match_data['hg']
-        
+        return result.render()
+
+    def analyze_match_result(self, match_id):
+        """
+        分析比赛, 返回结构化结果 (result.AnalysisResult)
+        包含触发的规则编号、方向和综合判断, 报告文本在调用 render() 时才生成
+        比赛不存在时返回 None
+        """
+        store = self.matches
+        row = store.row(match_id)
+        if row is None and self.archive is not None:
+            store = self.archive
+            row = store.row(match_id)
+        if row is None and self.repository is not None:
+            # 数据库中的比赛按需载入内存
+            stored = self.repository.get(match_id)
+            if stored is not None:
+                store = self.matches
+                row = store.add(match_id, *stored[:5])
+        if row is None:
+            return None
+        
+        league_code = store.league(row)
+        # 只有规则用到盘口的联赛才读取盘口 (归档中没有盘口; 缺少的盘口特征按 NaN 求值)
+        columns = self.rules.leagues[league_code].market_columns
+        markets = None
+        if columns and store is self.matches and store.markets:
+            markets = {column: store.market(row, column) for column in columns}
+        result = self.analyze_odds(match_id, league_code, store.odds(row, 'am'), store.odds(row, 'wl'),
+                                   store.odds(row, 'hg'), markets)
+        
+        if self.repository is not None:
+            self.repository.save_result(result)
+        return result
+
+    def analyze_odds(self, match_id, league_code, am_odds, wl_odds, hg_odds, markets=None):
+        """
+        按给定赔率分析一场比赛 (不读写比赛数据), 返回 AnalysisResult
+        markets: {盘口: [盘口线, 水位, 水位]} (可选), 只在联赛规则用到时读取
+        与 analyze_match_result 共用分析缓存
+        """
+        league = self.rules.leagues[league_code]
+        odds = (am_odds, wl_odds, hg_odds)
+        triples = None
+        if league.market_columns and markets:
+            triples = {column: markets.get(column) for column in league.market_columns}
+        cache = self.cache
+        cached = None
+        if cache is not None:
+            key = cache.key(league_code, am_odds, wl_odds, hg_odds)
+            if triples is not None:
+                key += tuple(triple and tuple(triple) for triple in triples.values())
+            cached = cache.get(key)
+        if cached is not None:
+            return AnalysisResult(match_id, league, cached[0], odds, cached[1])
         # 计算各公司最低赔率
         am_min = self.get_lowest_odds(am_odds)
         wl_min = self.get_lowest_odds(wl_odds)
         hg_min = self.get_lowest_odds(hg_odds)
         
         # 计算平局赔率
-        am_draw = am_odds[1]
         wl_draw = wl_odds[1]
         hg_draw = hg_odds[1]
         
-        results = []
-        
-        # 根据联赛选择分析规则
-        if league_code == "7":  # 德乙专用规则
-            results.extend(self.analyze_bundesliga2_rules(wl_odds, hg_min, wl_min, hg_draw, wl_draw, am_min))
+        # 根据联赛规则表分析
+        features = make_features(wl_odds, hg_min, wl_min, hg_draw, wl_draw, am_min)
+        if triples is not None:
+            features.update(market_features(triples, league.market_features))
+        result = AnalysisResult(match_id, league, league.evaluate(features), odds)
+        if cache is not None:
+            cache.put(key, result.rules, result.verdict)
+        return result
+
+    def _own_rules(self):
+        """
+        换用本实例专用的规则表副本 (只换一次), 返回规则表
+        计数包装和短路求值函数装在规则表的联赛上, 不能装到其他实例共享的 default_rules() 上
+        """
+        if self._shared_rules:
+            self.rules = compile_rule_table(self.rules.table, registered=False)
+            self._shared_rules = False
+            self._lut = None
+            if self.tracker is not None:
+                # 增量求值计划引用原规则表的联赛, 按需重建
+                self.tracker.plans.clear()
+        return self.rules
+
+    def instrument(self, enabled=True):
+        """
+        启用/停用规则计数 (instrument.Instrumentation), 返回计数对象
+        统计每个联赛、每条规则的求值次数、触发次数和耗时; 停用后计数保留, 不再有额外开销
+        只统计本实例的分析 (见 _own_rules)
+        """
+        if self.instrumentation is None:
+            from instrument import Instrumentation
+            self.instrumentation = Instrumentation(self._own_rules())
+        if enabled:
+            self.instrumentation.enable()
         else:
-            # 其他联赛使用通用规则（包括日职联专用规则）
-            results.extend(self.analyze_general_rules(wl_odds, hg_min, wl_min, hg_draw, wl_draw, am_min, league_code))
-        
-        return self.format_result(match_id, match_data, results)
-    
+            self.instrumentation.disable()
+        return self.instrumentation
+
+    def learn_rule_order(self, records=None, path=None):
+        """
+        按实测的成立比例和开销调整各规则条件组的短路求值顺序 (adaptive.RuleOrder), 结果不变
+        records: 可迭代的 (联赛代码, 澳门赔率, 威廉希尔赔率, 皇冠赔率), 默认使用已添加的比赛
+        path: 给出时保存学到的顺序, 下次用 load_rule_order 载入
+        顺序只用于本实例 (见 _own_rules)
+        """
+        from adaptive import RuleOrder
+        if records is None:
+            store = self.matches
+            records = ((store.league(row), store.odds(row, 'am'), store.odds(row, 'wl'), store.odds(row, 'hg'))
+                       for row in store.index.values())
+        if self.rule_order is None:
+            self.rule_order = RuleOrder(self._own_rules())
+        self.rule_order.learn((code, match_features(am, wl, hg)) for code, am, wl, hg in records)
+        self.rule_order.apply()
+        if path:
+            self.rule_order.save(path)
+        return self.rule_order.summary()
+
+    def load_rule_order(self, path):
+        """载入保存的条件组顺序 (规则表变化后不载入)"""
+        from adaptive import RuleOrder
+        if self.rule_order is None:
+            self.rule_order = RuleOrder(self._own_rules())
+        if not self.rule_order.load(path):
+            return f"未载入条件顺序 ({path} 不存在或规则表已变化)"
+        self.rule_order.apply()
+        return self.rule_order.summary()
+
+    def update_odds(self, match_id, bookmaker, odds, timestamp=None):
+        """
+        实时赔率更新 (比赛须已添加)
+        bookmaker: am 澳门 / wl 威廉希尔 / hg 皇冠 / lb 立博
+        只重新判断输入特征变化的规则, 综合判断改变时返回 live.VerdictChange 事件, 否则返回 None
+        事件也可以通过 self.tracker.subscribe(callback) 接收
+        未知的公司、比赛不存在或更新后的赔率未通过 check_odds 时不做任何修改, 返回 validate.Rejection (原因)
+        """
+        if self.tracker is None:
+            from live import OddsTracker
+            self.tracker = OddsTracker(self)
+        try:
+            event = self.tracker.update(match_id, bookmaker, odds, timestamp)
+        except ValueError as e:
+            return Rejection(e)
+        if self.journal is not None:
+            self.journal.set_odds(match_id, bookmaker, [float(v) for v in odds])
+        return event
+
+    def save_snapshot(self, path):
+        """
+        把全部比赛写入快照文件 (snapshot.py), 之后添加的比赛和赔率更新追加到 path.journal
+        """
+        import snapshot
+        token = snapshot.save_snapshot(self.matches, path)
+        if self.journal is not None:
+            self.journal.close()
+        self.journal = snapshot.Journal(snapshot.journal_path(path), token, reset=True)
+        return f"已保存快照 {path}, 共 {len(self.matches)} 场比赛"
+
+    def load_snapshot(self, path):
+        """
+        载入快照并重放其后的日志, 取代当前的全部比赛; 之后的修改继续追加到同一日志
+        """
+        import snapshot
+        store, token = snapshot.load_snapshot(path, self.leagues)
+        replayed = snapshot.replay_journal(snapshot.journal_path(path), token, store)
+        self.matches = store
+        self.tracker = None
+        if self.journal is not None:
+            self.journal.close()
+        self.journal = snapshot.Journal(snapshot.journal_path(path), token)
+        return f"已载入快照 {path}, 共 {len(store)} 场比赛 (重放日志 {replayed} 条)"
+
+    def analyze_batch(self, am_odds, wl_odds, hg_odds, leagues, engine="vector", markets=None):
+        """
+        批量分析 (向量化)
+        am_odds / wl_odds / hg_odds: (N, 3) 赔率数组 [胜, 平, 负]
+        leagues: 长度为 N 的联赛代码数组
+        engine: vector 向量化求值 / lut 查表 (只依赖 am_min、wl_min 的规则预先在赔率网格上算好) /
+                shard 按联赛发送到工作节点 (须先 connect_shards)
+        markets: 亚盘/大小球盘口 {"wl_ah": (N, 3) 数组, ...} (可选, 见 markets.py), 只在规则用到时读取
+        返回 BatchResult, 每场比赛包含触发的规则编号和综合判断
+        """
+        # 批量引擎依赖numpy, 按需导入, 交互模式不受影响
+        if engine == "lut":
+            return self.lut_engine().analyze(am_odds, wl_odds, hg_odds, leagues, markets)
+        if engine == "shard":
+            if self.router is None:
+                raise ValueError("尚未连接工作节点")
+            if markets and any(league.market_features for league in self.rules.leagues.values()):
+                raise ValueError("分片引擎不传送盘口数据, 规则用到盘口时请使用 vector 引擎")
+            return self.router.analyze(am_odds, wl_odds, hg_odds, leagues)
+        if engine != "vector":
+            raise ValueError(f"未知的批量引擎: {engine}")
+        from batch import analyze_batch
+        return analyze_batch(am_odds, wl_odds, hg_odds, leagues, rules=self.rules, markets=markets)
+
+    def feature_matrix(self, am_odds=None, wl_odds=None, hg_odds=None, lb_odds=None):
+        """
+        批量计算特征矩阵 (features.FeatureMatrix): 规则特征、各公司隐含概率和抽水、共识赔率、公司间分歧
+        不给赔率时使用已添加的全部比赛 (按添加顺序, 含立博赔率, 缺失为 NaN)
+        """
+        from batch import as_odds
+        from features import compute_feature_matrix
+        if am_odds is None:
+            arrays = self.matches.as_arrays()
+            am_odds, wl_odds, hg_odds, lb_odds = arrays["am"], arrays["wl"], arrays["hg"], arrays["lb"]
+        return compute_feature_matrix(as_odds(am_odds, "澳门"), as_odds(wl_odds, "威廉希尔"), as_odds(hg_odds, "皇冠"),
+                                      None if lb_odds is None else as_odds(lb_odds, "立博"))
+
+    def lut_engine(self):
+        """查表引擎 (首次使用时生成或从磁盘缓存载入查找表)"""
+        if self._lut is None:
+            from lut import LutEngine
+            self._lut = LutEngine(self.rules)
+        return self._lut
+
+    def analyze_parallel(self, am_odds, wl_odds, hg_odds, leagues, workers=None, chunk_size=None, shard="rows",
+                         engine="vector", markets=None):
+        """
+        多进程批量分析, 适合大规模历史数据回测
+        workers: 进程数 (默认CPU核数)
+        chunk_size: 每块行数
+        shard: 切分方式, rows 按行区间 / league 按联赛
+        engine: 工作进程只支持 vector 引擎; markets: 盘口, 与 analyze_batch 相同
+        结果按输入顺序合并, 与 analyze_batch 相同
+        """
+        if engine != "vector":
+            raise ValueError(f"多进程分析只支持 vector 引擎: {engine}")
+        from parallel import DEFAULT_CHUNK_SIZE, analyze_parallel
+        return analyze_parallel(am_odds, wl_odds, hg_odds, leagues, workers=workers,
+                                chunk_size=chunk_size or DEFAULT_CHUNK_SIZE, shard=shard,
+                                rules=self.rules, markets=markets)
+
+    def connect_shards(self, endpoints, assignments=None):
+        """
+        连接按联赛分片的工作节点 (shard.py), 之后 analyze_batch(engine="shard") 按联赛发送到各节点
+        endpoints: ["host:port", ...]; assignments: {节点: 联赛代码列表}, 其余联赛按一致性哈希分配到没有显式分配的节点
+        """
+        from shard import ShardRouter
+        if self.router is not None:
+            self.router.close()
+        self.router = ShardRouter(endpoints, assignments, self.rules).connect()
+        routes = self.router.routes()
+        return "\n".join(f"{endpoint}: " + ", ".join(code for code, target in routes.items() if target == endpoint)
+                         for endpoint in self.router.endpoints)
+
+    def open_archive(self, path):
+        """
+        打开赔率归档 (archive.py), 文件以 mmap 映射, 不读取记录
+        之后 analyze_match 在 self.matches 中找不到的编号会到归档中查找
+        """
+        from archive import open_archive
+        if self.archive is not None:
+            self.archive.close()
+        self.archive = open_archive(path, self.leagues)
+        return f"已打开归档 {path}, 共 {len(self.archive)} 场比赛"
+
+    def open_repository(self, path):
+        """打开 (或创建) SQLite 比赛仓库, 之后添加的比赛和分析结果都会保存"""
+        from repository import MatchRepository
+        if self.repository is not None:
+            self.repository.close()
+        self.repository = MatchRepository(path)
+        return f"已打开数据库 {path}, 共 {len(self.repository)} 场比赛"
+
+    def find_matches(self, league_code=None, start=None, end=None):
+        """
+        按联赛和开赛时间 [start, end) 查询数据库中的比赛编号
+        例如本周的日职乙比赛: find_matches("10", *week_range())
+        """
+        if self.repository is None:
+            raise ValueError("尚未打开数据库")
+        return self.repository.find(league_code, start, end)
+
+    def analyze_archive(self, workers=None, chunk_size=None, shard="rows"):
+        """
+        分析已打开归档中的全部比赛, 返回按归档顺序排列的 BatchResult
+        workers 大于 1 时由各工作进程自行映射归档文件
+        """
+        if self.archive is None:
+            raise ValueError("尚未打开归档")
+        if workers is not None and workers > 1:
+            from parallel import DEFAULT_CHUNK_SIZE, analyze_archive_parallel
+            return analyze_archive_parallel(self.archive.path, workers=workers,
+                                            chunk_size=chunk_size or DEFAULT_CHUNK_SIZE, shard=shard,
+                                            rules=self.rules)
+        arrays = self.archive.as_arrays()
+        return self.analyze_batch(arrays["am"], arrays["wl"], arrays["hg"], arrays["codes"])
+
     def analyze_bundesliga2_rules(self, wl_odds, hg_min, wl_min, hg_draw, wl_draw, am_min):
         """德乙专用规则分析"""
-        results = []
-        
-        # 规则1: 上盘规则
-        if self.check_upper_rules(wl_odds, hg_min, wl_min, hg_draw, wl_draw):
-            results.append("德乙上盘规则触发 -> 上盘/低赔率方")
-        
-        # 规则2: 下盘规则  
-        if self.check_lower_rules(wl_odds, hg_min, wl_min, hg_draw, wl_draw, am_min):
-            results.append("德乙下盘规则触发 -> 下盘/高赔率方")
-        
-        # 规则3: 低水规则
-        if self.check_low_water_rules(am_min):
-            results.append("德乙低水规则触发 -> 低水方(低赔率方)")
-        
-        # 规则4: 高水不败规则
-        if self.check_high_water_rules(am_min, wl_min):
-            results.append("德乙高水不败规则触发 -> 高水不败(高赔率方不败)")
-        
-        # 规则5: 威廉希尔特定组合
-        if self.check_wl_specific_combinations(wl_odds, wl_draw):
-            results.append("德乙威廉希尔特定组合触发 -> 相应方向")
-        
-        return results
+        return self.analyze_general_rules(wl_odds, hg_min, wl_min, hg_draw, wl_draw, am_min, "7")
     
     def analyze_general_rules(self, wl_odds, hg_min, wl_min, hg_draw, wl_draw, am_min, league_code):
-        """通用规则分析 (适用于其他联赛)"""
-        results = []
-        league_name = self.leagues[league_code]
-        
-        # 日职联专用规则
-        if league_code == "9":  # 日职联
-            results.extend(self.analyze_j1_league_rules(wl_odds, hg_min, wl_min, hg_draw, wl_draw, am_min))
-            return results
-        
-        # 日职乙专用规则
-        if league_code == "10":  # 日职乙
-            results.extend(self.analyze_j2_league_rules(wl_odds, hg_min, wl_min, hg_draw, wl_draw, am_min))
-            return results
-        
-        # 英冠专用规则
-        if league_code == "6":  # 英冠
-            results.extend(self.analyze_championship_rules(wl_odds, hg_min, wl_min, hg_draw, wl_draw, am_min))
-            return results
-        
-        # 法乙专用规则
-        if league_code == "8":  # 法乙
-            results.extend(self.analyze_ligue2_rules(wl_odds, hg_min, wl_min, hg_draw, wl_draw, am_min))
-            return results
-        
-        # 美职联专用规则
-        if league_code == "13":  # 美职联
-            results.extend(self.analyze_mls_rules(wl_odds, hg_min, wl_min, hg_draw, wl_draw, am_min))
-            return results
-        
-        # 基础赔率分析
-        if am_min < 1.80:
-            results.append(f"{league_name} 强队主导 -> 建议支持低赔率方")
-        elif am_min > 2.50:
-            results.append(f"{league_name} 弱队有机会 -> 建议关注高赔率方")
-        
-        # 赔率差异分析
-        am_wl_diff = abs(am_min - wl_min)
-        if am_wl_diff > 0.10:
-            results.append(f"{league_name} 赔率差异较大 -> 存在分歧，谨慎判断")
-        
-        # 平局赔率分析
-        if wl_draw < 3.00:
-            results.append(f"{league_name} 平局概率较高 -> 考虑平局选项")
-        elif wl_draw > 3.80:
-            results.append(f"{league_name} 分胜负概率高 -> 避开平局")
-        
-        # 五大联赛特殊规则
-        if league_code in ["1", "2", "3", "4", "5"]:
-            if 1.30 <= am_min <= 1.60:
-                results.append(f"{league_name} 超级强队 -> 强烈建议支持低赔率方")
-        
-        # 亚洲联赛特殊规则  
-        if league_code in ["9", "10", "11"]:
-            if 1.70 <= am_min <= 2.20:
-                results.append(f"{league_name} 均势对决 -> 建议分析主客场因素")
-        
-        # 巴甲特殊规则
-        if league_code == "12":
-            if wl_draw > 3.50:
-                results.append(f"{league_name} 巴甲攻击性强 -> 大比分概率高")
-        
-        return results
-    
-    def analyze_j1_league_rules(self, wl_odds, hg_min, wl_min, hg_draw, wl_draw, am_min):
-        """日职联专用规则分析"""
-        results = []
-        
-        # 上盘规则（支持低赔率方）
-        if self.check_j1_upper_rules(wl_odds, hg_min, wl_min, hg_draw, wl_draw):
-            results.append("日职联上盘规则触发 -> 上盘/低赔率方")
-        
-        # 下盘规则（支持高赔率方）
-        if self.check_j1_lower_rules(wl_odds, hg_min, wl_min, hg_draw, wl_draw, am_min):
-            results.append("日职联下盘规则触发 -> 下盘/高赔率方")
-        
-        # 低水方规则
-        if self.check_j1_low_water_rules(am_min, wl_min):
-            results.append("日职联低水方规则触发 -> 低水方(低赔率方)")
-        
-        return results
-    
-    def check_j1_upper_rules(self, wl_odds, hg_min, wl_min, hg_draw, wl_draw):
-        """检查日职联上盘规则"""
-        hg_wl_diff = hg_min - wl_min
-        
-        # HG-WL差值规则组
-        # HG-WL ≥ 0.2
-        if hg_wl_diff >= 0.2:
-            return True
-        
-        # 0.2 > HG-WL ≥ 0.1，且 WLD ≤ HGD
-        if 0.1 <= hg_wl_diff < 0.2 and wl_draw <= hg_draw:
-            return True
-        
-        # HG-WL = 0.09, 0.02, -0.05, -0.06
-        j1_specific_diffs = [0.09, 0.02, -0.05, -0.06]
-        for diff in j1_specific_diffs:
-            if abs(hg_wl_diff - diff) < 0.01:
-                return True
-        
-        # 威廉希尔特定赔率: WL = 1.40, 1.44, 1.57, 1.88
-        j1_wl_specific = [1.40, 1.44, 1.57, 1.88]
-        for odds in j1_wl_specific:
-            if abs(wl_min - odds) < 0.02:
-                return True
-        
-        return False
-    
-    def check_j1_lower_rules(self, wl_odds, hg_min, wl_min, hg_draw, wl_draw, am_min):
-        """检查日职联下盘规则"""
-        wl_hg_diff = wl_min - hg_min
-        hg_wl_diff = hg_min - wl_min
-        
-        # WL-HG差值规则组
-        # WL-HG ≥ 0.10，且 WLD < HGD
-        if wl_hg_diff >= 0.10 and wl_draw < hg_draw:
-            return True
-        
-        # HG-WL = 0.07, 0.05, 0.04, 0.03, 0.01, -0.02, -0.03, -0.08
-        j1_hg_wl_diffs = [0.07, 0.05, 0.04, 0.03, 0.01, -0.02, -0.03, -0.08]
-        for diff in j1_hg_wl_diffs:
-            if abs(hg_wl_diff - diff) < 0.01:
-                return True
-        
-        # 威廉希尔特定赔率: WL = 2.62
-        if abs(wl_min - 2.62) < 0.02:
-            return True
-        
-        # 高水方规则组
-        # 2.10 < AM < 2.19，AM > 2.40，AM > WL
-        if (2.10 < am_min < 2.19) or (am_min > 2.40 and am_min > wl_min):
-            return True
-        
-        # AM > 2.00，AM-WL = 0.02
-        am_wl_diff = am_min - wl_min
-        if am_min > 2.00 and abs(am_wl_diff - 0.02) < 0.01:
-            return True
-        
-        return False
-    
-    def check_j1_low_water_rules(self, am_min, wl_min):
-        """检查日职联低水方规则"""
-        am_wl_diff = am_min - wl_min
-        
-        # AM > 2.00，AM-WL = 0.03
-        if am_min > 2.00 and abs(am_wl_diff - 0.03) < 0.01:
-            return True
-        
-        return False
-    
-    def analyze_j2_league_rules(self, wl_odds, hg_min, wl_min, hg_draw, wl_draw, am_min):
-        """日职乙专用规则分析"""
-        results = []
-        
-        # 上盘规则（支持低赔率方）
-        if self.check_j2_upper_rules(wl_odds, hg_min, wl_min, hg_draw, wl_draw):
-            results.append("日职乙上盘规则触发 -> 上盘/低赔率方")
-        
-        # 下盘规则（支持高赔率方）
-        if self.check_j2_lower_rules(wl_odds, hg_min, wl_min, hg_draw, wl_draw):
-            results.append("日职乙下盘规则触发 -> 下盘/高赔率方")
-        
-        # 高指方规则（支持高赔率方）
-        if self.check_j2_high_pointer_rules(am_min, wl_min):
-            results.append("日职乙高指方规则触发 -> 高指方(高赔率方)")
-        
-        return results
-    
-    def check_j2_upper_rules(self, wl_odds, hg_min, wl_min, hg_draw, wl_draw):
-        """检查日职乙上盘规则"""
-        hg_wl_diff = hg_min - wl_min
-        
-        # HG-WL差值规则
-        # HG-WL = 0.01 (当WL D >= HGD), 0.05
-        if abs(hg_wl_diff - 0.01) < 0.005 and wl_draw >= hg_draw:
-            return True
-        if abs(hg_wl_diff - 0.05) < 0.005:
-            return True
-        
-        # 威廉希尔特定赔率: WL = 1.44, 1.57, 1.60, 1.61, 1.65, 1.73
-        j2_wl_specific = [1.44, 1.57, 1.60, 1.61, 1.65, 1.73]
-        for odds in j2_wl_specific:
-            if abs(wl_min - odds) < 0.02:
-                return True
-        
-        return False
-    
-    def check_j2_lower_rules(self, wl_odds, hg_min, wl_min, hg_draw, wl_draw):
-        """检查日职乙下盘规则"""
-        hg_wl_diff = hg_min - wl_min
-        wl_hg_diff = wl_min - hg_min
-        
-        # HG-WL差值规则组
-        # 0.1 < HG-WL < 0.2
-        if 0.1 < hg_wl_diff < 0.2:
-            return True
-        
-        # 平路 WL-HG >= 0.3
-        if wl_hg_diff >= 0.3:
-            return True
-        
-        # HG-WL = 0.08, 0.04, 0.03, 0.02, -0.01, -0.03, -0.09
-        j2_hg_wl_diffs = [0.08, 0.04, 0.03, 0.02, -0.01, -0.03, -0.09]
-        for diff in j2_hg_wl_diffs:
-            if abs(hg_wl_diff - diff) < 0.005:
-                return True
-        
-        # 威廉希尔特定赔率: WL = 1.95, 2.35, 2.55
-        j2_wl_single = [1.95, 2.35, 2.55]
-        for odds in j2_wl_single:
-            if abs(wl_min - odds) < 0.02:
-                return True
-        
-        # 威廉希尔特定组合: 2.15+3.20, 2.20+3.10, 2.45+3.00, 2.60+3.10
-        j2_wl_combinations = [
-            [2.15, 3.20], [2.20, 3.10], [2.45, 3.00], [2.60, 3.10]
-        ]
-        
-        for combo in j2_wl_combinations:
-            # 检查最低赔率是否匹配第一个值，平局赔率是否匹配第二个值
-            if abs(wl_min - combo[0]) < 0.02 and abs(wl_odds[1] - combo[1]) < 0.05:
-                return True
-        
-        return False
-    
-    def check_j2_high_pointer_rules(self, am_min, wl_min):
-        """检查日职乙高指方规则"""
-        am_wl_diff = am_min - wl_min
-        
-        # 澳门赔率区间: 2.10 < AM < 2.19 (且 AM > WL)
-        if 2.10 < am_min < 2.19 and am_min > wl_min:
-            return True
-        
-        # AM-WL差值规则: AM > 2.00, AM-WL = 0.01~0.03; 0.07~0.08
-        if am_min > 2.00:
-            if 0.01 <= am_wl_diff <= 0.03:
-                return True
-            if 0.07 <= am_wl_diff <= 0.08:
-                return True
-        
-        return False
-    
-    def analyze_ligue2_rules(self, wl_odds, hg_min, wl_min, hg_draw, wl_draw, am_min):
-        """法乙专用规则分析"""
-        results = []
-        
-        # 上盘规则（支持低赔率方）
-        if self.check_ligue2_upper_rules(wl_odds, am_min):
-            results.append("法乙上盘规则触发 -> 上盘/低赔率方")
-        
-        # 下盘规则（支持高赔率方）
-        if self.check_ligue2_lower_rules(wl_odds, am_min, wl_min):
-            results.append("法乙下盘规则触发 -> 下盘/高赔率方")
-        
-        return results
-    
-    def check_ligue2_upper_rules(self, wl_odds, am_min):
-        """检查法乙上盘规则"""
-        wl_min = min(wl_odds)
-        
-        # 威廉希尔单一赔率: WL = 1.44, 1.60
-        ligue2_wl_single = [1.44, 1.60]
-        for odds in ligue2_wl_single:
-            if abs(wl_min - odds) < 0.02:
-                return True
-        
-        # 威廉希尔赔率组合: WL = 2.05+3.00, 2.45+3.20, 2.50+2.90
-        ligue2_wl_combinations = [
-            [2.05, 3.00], [2.45, 3.20], [2.50, 2.90]
-        ]
-        
-        for combo in ligue2_wl_combinations:
-            # 检查最低赔率是否匹配第一个值，平局赔率是否匹配第二个值
-            if abs(wl_min - combo[0]) < 0.03 and abs(wl_odds[1] - combo[1]) < 0.05:
-                return True
-        
-        # 澳门低赔率: AM < 1.70
-        if am_min < 1.70:
-            return True
-        
-        return False
-    
-    def check_ligue2_lower_rules(self, wl_odds, am_min, wl_min):
-        """检查法乙下盘规则"""
-        am_wl_diff = am_min - wl_min
-        
-        # 威廉希尔单一赔率: WL = 2.60, 2.62, 2.40, 2.70
-        ligue2_wl_single = [2.60, 2.62, 2.40, 2.70]
-        for odds in ligue2_wl_single:
-            if abs(wl_min - odds) < 0.02:
-                return True
-        
-        # 威廉希尔赔率组合: WL = 2.30+3.10, 2.45+2.90
-        ligue2_wl_combinations = [
-            [2.30, 3.10], [2.45, 2.90]
-        ]
-        
-        for combo in ligue2_wl_combinations:
-            # 检查最低赔率是否匹配第一个值，平局赔率是否匹配第二个值
-            if abs(wl_min - combo[0]) < 0.03 and abs(wl_odds[1] - combo[1]) < 0.05:
-                return True
-        
-        # 澳门赔率区间: 2.20 < AM < 2.49
-        if 2.20 < am_min < 2.49:
-            return True
-        
-        # AM-WL差值规则: AM > 2.00, AM-WL = 0.05
-        if am_min > 2.00 and abs(am_wl_diff - 0.05) < 0.01:
-            return True
-        
-        # AM-WL差值规则: AM > 2.00, AM-WL = 0.1~0.19
-        if am_min > 2.00 and 0.1 <= am_wl_diff <= 0.19:
-            return True
-        
-        return False
-    
-    def analyze_championship_rules(self, wl_odds, hg_min, wl_min, hg_draw, wl_draw, am_min):
-        """英冠专用规则分析"""
-        results = []
-        
-        # 上盘规则（支持低赔率方）
-        if self.check_championship_upper_rules(wl_odds, hg_min, wl_min, hg_draw, wl_draw, am_min):
-            results.append("英冠上盘规则触发 -> 上盘/低赔率方")
-        
-        # 下盘规则（支持高赔率方）
-        if self.check_championship_lower_rules(wl_odds, hg_min, wl_min, am_min):
-            results.append("英冠下盘规则触发 -> 下盘/高赔率方")
-        
-        return results
-    
-    def check_championship_upper_rules(self, wl_odds, hg_min, wl_min, hg_draw, wl_draw, am_min):
-        """检查英冠上盘规则"""
-        wl_min_odds = min(wl_odds)
-        
-        # 澳门低赔率: AM < 1.70
-        if am_min < 1.70:
-            return True
-        
-        # 威廉希尔特定赔率: WL = 1.50, 1.44, 1.73, 1.88
-        championship_wl_specific = [1.50, 1.44, 1.73, 1.88]
-        for odds in championship_wl_specific:
-            if abs(wl_min_odds - odds) < 0.02:
-                return True
-        
-        return False
-    
-    def check_championship_lower_rules(self, wl_odds, hg_min, wl_min, am_min):
-        """检查英冠下盘规则"""
-        am_wl_diff = am_min - wl_min
-        
-        # 澳门高赔率: AM > 2.40
-        if am_min > 2.40:
-            return True
-        
-        # AM-WL差值规则: AM > 2.00, AM-WL = 0.1
-        if am_min > 2.00 and abs(am_wl_diff - 0.1) < 0.01:
-            return True
-        
-        # AM-WL差值规则: AM > 2.00, AM-WL = 0.01~0.02
-        if am_min > 2.00 and 0.01 <= am_wl_diff <= 0.02:
-            return True
-        
-        return False
-    
-    def analyze_mls_rules(self, wl_odds, hg_min, wl_min, hg_draw, wl_draw, am_min):
-        """美职联专用规则分析"""
-        results = []
-        
-        # 上盘规则（支持低赔率方）
-        if self.check_mls_upper_rules(wl_odds, hg_min, wl_min, hg_draw, wl_draw):
-            results.append("美职联上盘规则触发 -> 上盘/低赔率方")
-        
-        # 下盘规则（支持高赔率方）
-        if self.check_mls_lower_rules(wl_odds, hg_min, wl_min):
-            results.append("美职联下盘规则触发 -> 下盘/高赔率方")
-        
-        return results
-    
-    def check_mls_upper_rules(self, wl_odds, hg_min, wl_min, hg_draw, wl_draw):
-        """检查美职联上盘规则"""
-        wl_min_odds = min(wl_odds)
-        hg_wl_diff = hg_min - wl_min
-        hgd_wld_diff = hg_draw - wl_draw
-        
-        # 威廉希尔特定赔率: WL = 1.33, 1.57, 1.70, 1.78, 1.95
-        mls_wl_specific = [1.33, 1.57, 1.70, 1.78, 1.95]
-        for odds in mls_wl_specific:
-            if abs(wl_min_odds - odds) < 0.02:
-                return True
-        
-        # HG-WL差值规则: HG-WL ≥ 0.20
-        if hg_wl_diff >= 0.20:
-            return True
-        
-        # HGD-WLD差值规则: HGD-WLD = 0.45, 0.20
-        if abs(hgd_wld_diff - 0.45) < 0.05 or abs(hgd_wld_diff - 0.20) < 0.05:
-            return True
-        
-        # 其他HG-WL规则: HG-WL = 0.04, 0.02, -0.02, -0.08
-        mls_hg_wl_diffs = [0.04, 0.02, -0.02, -0.08]
-        for diff in mls_hg_wl_diffs:
-            if abs(hg_wl_diff - diff) < 0.01:
-                return True
-        
-        # HG-WL < 0.5
-        if hg_wl_diff < 0.5:
-            return True
-        
-        return False
-    
-    def check_mls_lower_rules(self, wl_odds, hg_min, wl_min):
-        """检查美职联下盘规则"""
-        wl_min_odds = min(wl_odds)
-        hg_wl_diff = hg_min - wl_min
-        
-        # 威廉希尔特定赔率: WL = 2.60, 2.40
-        mls_wl_lower = [2.60, 2.40]
-        for odds in mls_wl_lower:
-            if abs(wl_min_odds - odds) < 0.02:
-                return True
-        
-        # HG-WL差值规则: HG-WL = 0.09, 0.08, 0.07, 0.06, 0.01
-        mls_hg_wl_diffs = [0.09, 0.08, 0.07, 0.06, 0.01]
-        for diff in mls_hg_wl_diffs:
-            if abs(hg_wl_diff - diff) < 0.005:
-                return True
-        
-        # HG-WL > 0.5
-        if hg_wl_diff > 0.5:
-            return True
-        
-        return False
-    
-    def check_upper_rules(self, wl_odds, hg_min, wl_min, hg_draw, wl_draw):
-        """检查上盘规则"""
-        # 规则: WL=1.70, 2.37+3.30 (近似匹配)
-        if abs(wl_min - 1.70) < 0.05:
-            if wl_odds[1] > 2.30 and wl_odds[2] > 3.20:
-                return True
-        
-        # 规则: HG-WL=0.08
-        if abs((hg_min - wl_min) - 0.08) < 0.01:
-            return True
-        
-        # 规则: WL=2.00 + D +3.40/3.60
-        if abs(wl_min - 2.00) < 0.05:
-            if wl_odds[1] > 3.30 and (wl_odds[2] > 3.35 or wl_odds[2] > 3.55):
-                return True
-        
-        # 规则: WL=2.10+3.30
-        if abs(wl_min - 2.10) < 0.05 and abs(wl_odds[1] - 3.30) < 0.05:
-            return True
-        
-        return False
-    
-    def check_lower_rules(self, wl_odds, hg_min, wl_min, hg_draw, wl_draw, am_min):
-        """检查下盘规则"""
-        # 威廉希尔特定组合规则
-        wl_combinations = [
-            [2.60, 2.50, 3.10], [2.25, 3.20, 0], [2.15, 3.10, 0],
-            [2.00, 3.40, 0], [2.15, 3.30, 0], [2.45, 3.20, 0],
-            [2.45, 3.25, 0], [2.50, 3.00, 0]
-        ]
-        
-        for combo in wl_combinations:
-            if (abs(wl_odds[0] - combo[0]) < 0.05 or abs(wl_odds[1] - combo[0]) < 0.05 or abs(wl_odds[2] - combo[0]) < 0.05):
-                if combo[1] > 0 and (abs(wl_odds[1] - combo[1]) < 0.05 or abs(wl_odds[2] - combo[1]) < 0.05):
-                    return True
-        
-        # HG-WL差值规则
-        hg_wl_diff = hg_min - wl_min
-        if 0.10 < hg_wl_diff <= 0.20:
-            return True
-        if abs(hg_wl_diff - 0.10) < 0.01:
-            return True
-        if abs(hg_wl_diff + 0.06) < 0.01 or abs(hg_wl_diff + 0.09) < 0.01:
-            return True
-        if abs(hg_wl_diff - 0.04) < 0.01 or abs(hg_wl_diff - 0.03) < 0.01 or abs(hg_wl_diff - 0.01) < 0.01:
-            return True
-        
-        # WL-HG=0.10
-        if abs((wl_min - hg_min) - 0.10) < 0.01:
-            return True
-        
-        # HGD-WLD规则
-        if abs((hg_draw - wl_draw) - 0.30) < 0.05:
-            return True
-        if abs((hg_draw - wl_draw) - 0.25) < 0.05:
-            return True
-        
-        # 容让规则 (简化处理)
-        if 1.50 <= wl_min < 2.00:
-            return True
-        
-        return False
-    
-    def check_low_water_rules(self, am_min):
-        """检查低水规则"""
-        # 1.70<AM<1.89
-        return 1.70 < am_min < 1.89
-    
-    def check_high_water_rules(self, am_min, wl_min):
-        """检查高水不败规则"""
-        am_wl_diff = am_min - wl_min
-        
-        # AM>2.00, AM-WL=0.05
-        if am_min > 2.00 and abs(am_wl_diff - 0.05) < 0.01:
-            return True
-        
-        # AM<2.00, AM-WL=0.02~0.03  
-        if am_min < 2.00 and 0.02 <= am_wl_diff <= 0.03:
-            return True
-        
-        return False
-    
-    def check_wl_specific_combinations(self, wl_odds, wl_draw):
-        """检查威廉希尔特定组合"""
-        wl_min = min(wl_odds)
-        
-        # WL=1.80+3.70+4.20
-        if abs(wl_min - 1.80) < 0.05:
-            if wl_odds[1] > 3.65 and wl_odds[2] > 4.15:
-                return True
-        
-        # WL=1.91, +(D>=3.50)
-        if abs(wl_min - 1.91) < 0.05 and wl_draw >= 3.50:
-            return True
-        
-        # D=3.25相关组合
-        if abs(wl_draw - 3.25) < 0.05:
-            return True
-        
-        return False
+        """按规则表分析 (各联赛规则定义见 rules.json)"""
+        features = make_features(wl_odds, hg_min, wl_min, hg_draw, wl_draw, am_min)
+        return self.rules.messages(league_code, features)
     
     def format_result(self, match_id, match_data, results):
-        """格式化输出结果"""
-        output = [f"\n=== 比赛 {match_id} 分析结果 ==="]
-        output.append(f"联赛: {match_data['league_name']}")
-        output.append(f"澳门初盘: {match_data['am'][0]:.2f} | {match_data['am'][1]:.2f} | {match_data['am'][2]:.2f}")
-        output.append(f"威廉希尔: {match_data['wl'][0]:.2f} | {match_data['wl'][1]:.2f} | {match_data['wl'][2]:.2f}")  
-        output.append(f"皇冠初盘: {match_data['hg'][0]:.2f} | {match_data['hg'][1]:.2f} | {match_data['hg'][2]:.2f}")
-        output.append("")
-        
-        if results:
-            output.append("触发规则:")
-            for i, result in enumerate(results, 1):
-                output.append(f"{i}. {result}")
-            
-            # 综合判断
-            upper_count = sum(1 for r in results if "上盘" in r or "低赔率方" in r or "低水方" in r or "强队" in r or "超级强队" in r)
-            lower_count = sum(1 for r in results if "下盘" in r or "高赔率方" in r or "弱队" in r)
-            draw_count = sum(1 for r in results if "平局" in r)
-            
-            output.append("")
-            output.append("=== 综合判断 ===")
-            if upper_count > lower_count and upper_count > draw_count:
-                output.append("🔥 建议: 支持上盘/低赔率方")
-            elif lower_count > upper_count and lower_count > draw_count:
-                output.append("🔥 建议: 支持下盘/高赔率方") 
-            elif draw_count > 0 and draw_count >= upper_count and draw_count >= lower_count:
-                output.append("🟡 建议: 关注平局选项")
-            else:
-                output.append("⚖️  信号混合，建议谨慎")
-        else:
-            output.append("❌ 未触发任何已知规则")
-        
-        return "\n".join(output)
+        """格式化输出结果 (results 为规则说明文字列表)"""
+        verdict = verdict_from_messages(results)
+        return render_report(match_id, match_data['league_name'], match_data['am'], match_data['wl'],
+                             match_data['hg'], results, verdict)
 
     def show_leagues(self):
         """显示所有支持的联赛"""
         print("\n=== 支持的联赛列表 ===")
-        print("五大联赛:")
-        for code in ["1", "2", "3", "4", "5"]:
-            print(f"  {code}. {self.leagues[code]}")
-        
-        print("\n二级联赛:")
-        for code in ["6", "7", "8"]:
-            print(f"  {code}. {self.leagues[code]}")
-        
-        print("\n亚洲联赛:")
-        for code in ["9", "10", "11"]:
-            print(f"  {code}. {self.leagues[code]}")
-        
-        print("\n南美联赛:")
-        for code in ["12"]:
-            print(f"  {code}. {self.leagues[code]}")
-        
-        print("\n北美联赛:")
-        for code in ["13"]:
-            print(f"  {code}. {self.leagues[code]}")
+        for i, group in enumerate(self.rules.groups):
+            if i:
+                print()
+            print(f"{group}:")
+            for code in self.rules.league_codes(group):
+                print(f"  {code}. {self.leagues[code]}")
         print()
 
-# 创建系统实例
-system = FootballPredictionSystem()
+_system = None
+
+
+def get_system():
+    """默认系统实例 (首次使用时创建, import main 不编译规则表)"""
+    global _system
+    if _system is None:
+        _system = FootballPredictionSystem()
+    return _system
+
+
+def __getattr__(name):
+    # 兼容旧代码中的 main.system / from main import system
+    if name == "system":
+        return get_system()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # 交互界面
-def interactive_system():
+def interactive_system(system=None):
+    system = system or get_system()
     print("=== 足球赛果判断系统 (多联赛版) ===")
     print("输入格式说明:")
     print("- 比赛编号: 任意字符串")
@@ -758,7 +482,10 @@ def interactive_system():
             # 添加数据
             result = system.add_match(match_id, league_code, am_odds, wl_odds, hg_odds)
             print(result)
-            
+            if isinstance(result, Rejection):
+                # 数据未通过检查, 已打印原因, 不再分析
+                continue
+
             # 自动分析
             analysis = system.analyze_match(match_id)
             print(analysis)
@@ -771,6 +498,202 @@ def interactive_system():
             print(f"输入错误: {e}")
             print("请检查输入格式")
 
+def main(argv=None):
+    """命令行入口: 默认进入交互模式"""
+    import argparse
+    import ingest
+
+    parser = argparse.ArgumentParser(description="足球赛果判断系统 (多联赛版)")
+    parser.add_argument("--ingest", metavar="PATH",
+                        help="流式导入并分析 CSV/JSONL 赔率文件, '-' 表示标准输入")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="输入格式 (默认按扩展名判断)")
+    parser.add_argument("--chunk-size", type=int, default=ingest.DEFAULT_CHUNK_SIZE, help="每批分析的行数")
+    parser.add_argument("--output", "-o", default="-", help="结果输出文件 (JSONL, 默认标准输出)")
+    parser.add_argument("--analyze-file", metavar="PATH",
+                        help="分析 CSV/JSONL 文件中的全部比赛并写出报告 (写到 --output, 格式见 --report-format)")
+    parser.add_argument("--report-format", choices=["text", "json", "jsonl", "csv", "columnar"],
+                        help="报告格式 (默认按输出文件扩展名判断: .txt/.json/.jsonl/.csv/.npz, 标准输出为 text)")
+    parser.add_argument("--render-workers", type=int, default=2, help="报告生成线程数 (0 为在主线程生成)")
+    parser.add_argument("--reject-file", metavar="PATH",
+                        help="--ingest/--analyze-file/--build-archive 时把不合格的记录及原因写入此文件 (JSONL)")
+    parser.add_argument("--backtest", metavar="PATH", help="用历史赔率和赛果 CSV 回测全部规则")
+    parser.add_argument("--sweep", metavar="PATH", help="用历史赔率和赛果 CSV 扫描规则阈值, 报告命中率/覆盖率的 Pareto 前沿")
+    parser.add_argument("--sweep-league", action="append", metavar="CODE", help="只扫描该联赛 (可重复, 默认全部)")
+    parser.add_argument("--sweep-rule", action="append", metavar="RULE", help="只扫描该规则 (可重复, 默认全部)")
+    parser.add_argument("--sweep-span", type=int, default=5, help="阈值在当前值两侧各取的步数")
+    parser.add_argument("--sweep-workers", type=int, help="扫描线程数 (默认CPU核数)")
+    parser.add_argument("--feature-cache", metavar="PATH", help="扫描用的列式特征缓存文件 (.npz), 不存在或过期时重建")
+    parser.add_argument("--replay", metavar="PATH",
+                        help="按时间顺序回放录制的赔率流 (JSONL), 报告吞吐量、滞后和与录制结果不同的判断")
+    parser.add_argument("--replay-speed", default="fast", metavar="SPEED",
+                        help="回放速度: 1x 实时, 100x 百倍速 (或其他倍数), fast 尽快处理 (默认)")
+    parser.add_argument("--json", action="store_true", help="回测/扫描/回放报告以 JSON 输出")
+    parser.add_argument("--build-archive", metavar="PATH",
+                        help="把 CSV/JSONL 赔率文件转换为二进制归档 (写到 --output 指定的文件)")
+    parser.add_argument("--archive", metavar="PATH", help="打开二进制赔率归档后进入交互模式")
+    parser.add_argument("--cache-file", metavar="PATH", help="分析缓存文件, 启动时载入, 退出时保存")
+    parser.add_argument("--db", metavar="PATH", help="SQLite 数据库, 保存比赛和分析结果 (可与 --ingest 同用)")
+    parser.add_argument("--serve", action="store_true", help="启动本机 HTTP/JSON 分析服务")
+    parser.add_argument("--host", default="127.0.0.1", help="服务监听地址")
+    parser.add_argument("--port", type=int, default=8080, help="服务端口")
+    parser.add_argument("--batch-window", type=float, default=2.0, help="服务合并请求的时间窗口 (毫秒)")
+    parser.add_argument("--shard", action="append", metavar="HOST:PORT[=CODES]",
+                        help="--ingest 时按联赛把分析请求发送到工作节点 (可重复, 例如 127.0.0.1:9001=9,10,11)")
+    parser.add_argument("--snapshot", metavar="PATH",
+                        help="交互模式启动时载入快照 (并重放日志), 运行中记录日志, 退出时重新保存快照")
+    parser.add_argument("--rule-order", metavar="PATH", help="启动时载入学到的规则条件顺序")
+    parser.add_argument("--learn-rule-order", metavar="DATA",
+                        help="用 CSV/JSONL 赔率样本学习规则条件顺序并保存到 --rule-order 指定的文件")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="剖析本次运行: .folded/.txt 输出折叠调用栈 (火焰图), 其他输出 cProfile 统计文件")
+    parser.add_argument("--metrics", metavar="PATH",
+                        help="统计各联赛/规则的调用、触发次数和耗时, 结束时写入 (.prom 为 Prometheus 格式, 其他为 JSON)")
+    args = parser.parse_args(argv)
+
+    system = get_system()
+    if args.metrics:
+        system.instrument()
+    try:
+        if args.profile:
+            from instrument import profile_call
+            profile_call(lambda: _run(system, parser, args), args.profile)
+            print(f"剖析结果已写入 {args.profile}", file=sys.stderr)
+        else:
+            _run(system, parser, args)
+    finally:
+        if args.metrics:
+            system.instrumentation.dump(args.metrics)
+
+
+def _rejects(args):
+    """不合格记录的处理: 给出 --reject-file 时写入拒绝文件, 否则打印到标准错误"""
+    import contextlib
+    import ingest
+    if args.reject_file:
+        from validate import RejectFile
+        return RejectFile(args.reject_file)
+    return contextlib.nullcontext(ingest.print_reject)
+
+
+def _run(system, parser, args):
+    import ingest
+
+    if args.learn_rule_order:
+        if not args.rule_order:
+            parser.error("--learn-rule-order 需要用 --rule-order 指定保存的文件")
+        records = []
+        for record in ingest.read_records(args.learn_rule_order, args.format):
+            try:
+                parsed = ingest.parse_record(record, system.leagues)
+            except (ValueError, TypeError):
+                continue
+            records.append(parsed[1:5])
+        print(system.learn_rule_order(records, args.rule_order), file=sys.stderr)
+        return
+    if args.rule_order:
+        print(system.load_rule_order(args.rule_order), file=sys.stderr)
+
+    if args.backtest:
+        import backtest
+        store = backtest.HistoryStore.from_csv(args.backtest, system.rules)
+        report = backtest.run_backtest(store, system.rules)
+        print(report.to_json() if args.json else report.to_text())
+        return
+
+    if args.sweep:
+        import sweep
+        cache = sweep.FeatureCache.open(args.sweep, args.feature_cache, system.rules)
+        try:
+            report = sweep.run_sweep(cache, args.sweep_league, system.rules, args.sweep_rule, span=args.sweep_span,
+                                     workers=args.sweep_workers)
+        except ValueError as e:
+            parser.error(str(e))
+        print(report.to_json() if args.json else report.to_text())
+        return
+
+    if args.replay:
+        import replay
+        try:
+            speed = replay.parse_speed(args.replay_speed)
+        except ValueError as e:
+            parser.error(str(e))
+        report = replay.replay_file(system, args.replay, speed)
+        print(report.to_json() if args.json else report.to_text())
+        return
+
+    if args.build_archive:
+        import archive
+        if args.output == "-":
+            parser.error("--build-archive 需要用 --output 指定归档文件")
+        with _rejects(args) as on_reject:
+            count = archive.build_archive(ingest.read_records(args.build_archive, args.format), args.output,
+                                          system.leagues, on_reject=on_reject)
+        print(f"已写入 {count} 场比赛到 {args.output}", file=sys.stderr)
+        return
+
+    if args.archive:
+        print(system.open_archive(args.archive))
+
+    if args.db:
+        print(system.open_repository(args.db), file=sys.stderr)
+
+    if args.cache_file and system.cache is not None:
+        system.cache.load(args.cache_file, system.rules)
+
+    if args.shard:
+        from shard import parse_shard_spec
+        print(system.connect_shards(*parse_shard_spec(args.shard)), file=sys.stderr)
+
+    if args.analyze_file:
+        import report
+        if args.report_format == "columnar" and args.output == "-":
+            parser.error("columnar 格式需要用 --output 指定 .npz 文件")
+        with _rejects(args) as on_reject:
+            stats = report.analyze_file(system, args.analyze_file, args.output, args.report_format, args.format,
+                                        args.chunk_size, args.render_workers, "shard" if args.shard else "vector",
+                                        on_reject=on_reject)
+        print(stats.summary(), file=sys.stderr)
+        return
+
+    if args.ingest:
+        output = ingest.open_output(args.output)
+        try:
+            with _rejects(args) as on_reject:
+                stats = ingest.ingest(system, args.ingest, output, args.format, args.chunk_size,
+                                      repository=system.repository, engine="shard" if args.shard else "vector",
+                                      on_reject=on_reject)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        print(stats.summary(), file=sys.stderr)
+        return
+
+    if args.serve:
+        import server
+        try:
+            server.run(system, args.host, args.port, args.batch_window / 1000)
+        finally:
+            if args.cache_file and system.cache is not None:
+                system.cache.save(args.cache_file, system.rules)
+        return
+
+    if args.snapshot:
+        if os.path.exists(args.snapshot):
+            try:
+                print(system.load_snapshot(args.snapshot))
+            except ValueError as e:
+                parser.error(str(e))
+        else:
+            print(system.save_snapshot(args.snapshot))
+
+    try:
+        interactive_system(system)
+    finally:
+        if args.cache_file and system.cache is not None:
+            system.cache.save(args.cache_file, system.rules)
+        if args.snapshot:
+            print(system.save_snapshot(args.snapshot))
+
 # 启动交互系统
 if __name__ == "__main__":
-    interactive_system()
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,96 @@
+"""
+亚盘与大小球盘口
+
+除胜平负 (1X2) 赔率外, 每家公司还可以有两种盘口, 每种盘口与胜平负赔率一样是三个数:
+
+- ah 亚盘:   [盘口线, 主队水位, 客队水位], 盘口线以主队为准, -0.5 表示主让半球, 0.25 表示主受让平半
+- ou 大小球: [盘口线, 大球水位, 小球水位], 例如 [2.5, 0.90, 0.98]
+
+水位为港盘 (不含本金), 盘口线为 0.25 的整数倍。盘口按 "{公司}_{盘口}" 命名 (wl_ah、hg_ou 等),
+在 MatchStore 中与胜平负赔率一样按列存放, 每场 3 个元素, 缺失为 NaN。
+
+规则可以引用的盘口特征 (每家公司一组, 例如 wl_ah_line):
+    {公司}_ah_line   亚盘盘口线 (主队)
+    {公司}_ah_upper  上盘 (让球方) 水位, 平手盘以主队为上盘
+    {公司}_ah_lower  下盘 (受让方) 水位
+    {公司}_ou_line   大小球盘口线
+    {公司}_ou_over   大球水位
+    {公司}_ou_under  小球水位
+没有对应盘口的比赛, 这些特征为 NaN, 引用它们的条件一律不成立。
+"""
+
+MARKET_BOOKMAKERS = ("am", "wl", "hg", "lb")
+MARKETS = ("ah", "ou")
+MARKET_COLUMNS = tuple(f"{b}_{m}" for b in MARKET_BOOKMAKERS for m in MARKETS)
+
+# 各盘口的特征 (盘口线 + 两项水位)
+MARKET_PARTS = {"ah": ("line", "upper", "lower"), "ou": ("line", "over", "under")}
+# CSV 中两项水位的列名
+MARKET_SIDES = {"ah": ("home", "away"), "ou": ("over", "under")}
+
+MARKET_FEATURES = tuple(f"{column}_{part}" for column in MARKET_COLUMNS for part in MARKET_PARTS[column[-2:]])
+
+# 特征 -> (盘口, 第几项特征)
+FEATURE_SOURCES = {f"{column}_{part}": (column, k)
+                   for column in MARKET_COLUMNS for k, part in enumerate(MARKET_PARTS[column[-2:]])}
+
+_NAN = float("nan")
+
+
+def csv_fields(column):
+    """盘口在 CSV 中的三列: {盘口}_line, 两项水位"""
+    return [f"{column}_line"] + [f"{column}_{side}" for side in MARKET_SIDES[column[-2:]]]
+
+
+def feature_values(triple, column):
+    """
+    由一个盘口 [盘口线, 水位, 水位] 计算该盘口的三项特征 (缺失时为 NaN)
+    亚盘的两项水位按上盘/下盘排列
+    """
+    if triple is None:
+        return _NAN, _NAN, _NAN
+    line, first, second = triple
+    if column.endswith("_ah") and line > 0:
+        # 客队让球, 客队为上盘
+        return line, second, first
+    return line, first, second
+
+
+def market_features(triples, names):
+    """
+    单场比赛的盘口特征 {特征名: 值}
+    triples: {盘口: [盘口线, 水位, 水位] 或 None}; names: 需要的特征
+    """
+    features = {}
+    computed = {}
+    for name in names:
+        column, k = FEATURE_SOURCES[name]
+        if column not in computed:
+            computed[column] = feature_values(triples.get(column), column)
+        features[name] = computed[column][k]
+    return features
+
+
+def market_feature_arrays(columns, names, rows, size):
+    """
+    批量计算盘口特征 {特征名: (n,) 数组}
+    columns: {盘口: (N, 3) 数组} (可为 None); rows: 取其中的行 (slice 或行号数组); size: 行数
+    没有该盘口时特征为 NaN
+    """
+    import numpy as np
+
+    features = {}
+    for name in names:
+        column, k = FEATURE_SOURCES[name]
+        values = None if columns is None else columns.get(column)
+        if values is None:
+            features[name] = np.full(size, np.nan)
+            continue
+        values = values[rows]
+        if k == 0 or column.endswith("_ou"):
+            features[name] = values[:, k]
+        else:
+            # 盘口线为正 (客队让球) 时两项水位互换
+            away_upper = values[:, 0] > 0
+            features[name] = np.where(away_upper, values[:, 3 - k], values[:, k])
+    return features
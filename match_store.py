@@ -0,0 +1,191 @@
+"""
+列式比赛存储
+
+取代原来 self.matches 中 "每场比赛一个字典 + 四个浮点列表" 的结构。各公司赔率按列
+(struct-of-arrays) 存放在 array('d') 中, 每场比赛占连续 3 个元素; 联赛代码存为 int8,
+比赛编号通过 id -> 行号 的字典定位。单场比赛的常驻内存从约 1KB 降到约 100 字节 (另加
+比赛编号本身), 且不依赖 numpy; 需要批量计算时可用 as_arrays() 零拷贝得到 numpy 视图。
+
+按编号读取时返回与旧结构相同的字典, 原有读取 self.matches[match_id] 的代码无需修改。
+
+亚盘/大小球盘口 (markets.py) 以同样的方式按列存放 (每场 3 个元素, 缺失为 NaN)。盘口列在第一次
+写入该盘口时才创建 (之前的比赛补 NaN), 只有胜平负赔率时不占内存, 写入也不多做任何事。
+"""
+
+from array import array
+
+from markets import FEATURE_SOURCES, MARKET_COLUMNS, market_features
+
+BOOKMAKERS = ("am", "wl", "hg", "lb")
+
+# 没有立博赔率时的占位值
+_MISSING = float("nan")
+
+
+class MatchStore:
+    """
+    列式比赛存储
+    leagues: 联赛代码 -> 联赛名称 (代码须为 int8 范围内的整数字符串)
+    """
+
+    def __init__(self, leagues):
+        self.leagues = leagues
+        self.index = {}
+        self.codes = array("b")
+        self.has_lb = array("b")
+        self.columns = {bookmaker: array("d") for bookmaker in BOOKMAKERS}
+        # 盘口 -> 列, 按需创建
+        self.markets = {}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, match_id):
+        return match_id in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __getitem__(self, match_id):
+        return self.record(self.index[match_id])
+
+    def keys(self):
+        return self.index.keys()
+
+    def get(self, match_id, default=None):
+        row = self.index.get(match_id)
+        return default if row is None else self.record(row)
+
+    def items(self):
+        for match_id, row in self.index.items():
+            yield match_id, self.record(row)
+
+    def add(self, match_id, league_code, am_odds, wl_odds, hg_odds, lb_odds=None, markets=None):
+        """
+        写入一场比赛, 编号已存在时覆盖原有数据 (包括盘口); 返回行号
+        markets: {盘口: [盘口线, 水位, 水位]}, 例如 {"wl_ah": [-0.5, 0.92, 0.96]}
+        """
+        code = int(league_code)
+        odds = (am_odds, wl_odds, hg_odds, lb_odds)
+        for values in odds:
+            if values is not None and len(values) != 3:
+                raise ValueError(f"赔率必须为胜平负三项, 实际为 {len(values)} 项")
+        row = self.index.get(match_id)
+        if row is None:
+            row = len(self.codes)
+            self.codes.append(code)
+            self.has_lb.append(lb_odds is not None)
+            for bookmaker, values in zip(BOOKMAKERS, odds):
+                self.columns[bookmaker].extend(values if values is not None else (_MISSING,) * 3)
+            self.index[match_id] = row
+        else:
+            self.codes[row] = code
+            self.has_lb[row] = lb_odds is not None
+            start = row * 3
+            for bookmaker, values in zip(BOOKMAKERS, odds):
+                self.columns[bookmaker][start:start + 3] = array(
+                    "d", values if values is not None else (_MISSING,) * 3)
+        if markets or self.markets:
+            self._add_markets(row, markets)
+        return row
+
+    def _add_markets(self, row, markets):
+        markets = markets or {}
+        for column in markets:
+            if column not in MARKET_COLUMNS:
+                raise ValueError(f"未知的盘口: {column}")
+        for column in markets:
+            self._market_column(column)
+        for column, values in self.markets.items():
+            triple = markets.get(column)
+            if triple is not None and len(triple) != 3:
+                raise ValueError(f"盘口必须为盘口线和两项水位, 实际为 {len(triple)} 项")
+            triple = array("d", triple if triple is not None else (_MISSING,) * 3)
+            if len(values) == row * 3:
+                values.extend(triple)
+            else:
+                values[row * 3:row * 3 + 3] = triple
+
+    def _market_column(self, column):
+        """取得 (必要时创建) 盘口列, 已有的比赛补 NaN"""
+        values = self.markets.get(column)
+        if values is None:
+            values = self.markets[column] = array("d", (_MISSING,)) * (3 * len(self.codes))
+        return values
+
+    def set_market(self, row, column, values):
+        """更新某一行的盘口 [盘口线, 水位, 水位]"""
+        if column not in MARKET_COLUMNS:
+            raise ValueError(f"未知的盘口: {column}")
+        if len(values) != 3:
+            raise ValueError(f"盘口必须为盘口线和两项水位, 实际为 {len(values)} 项")
+        self._market_column(column)[row * 3:row * 3 + 3] = array("d", values)
+
+    def market(self, row, column):
+        """某一行的盘口 [盘口线, 水位, 水位], 缺失时返回 None"""
+        values = self.markets.get(column)
+        if values is None:
+            return None
+        triple = values[row * 3:row * 3 + 3].tolist()
+        return None if triple[0] != triple[0] else triple
+
+    def market_features(self, row, names):
+        """某一行的盘口特征 {特征名: 值} (见 markets.py), 只读取 names 用到的盘口"""
+        columns = {FEATURE_SOURCES[name][0] for name in names}
+        return market_features({column: self.market(row, column) for column in columns}, names)
+
+    def set_odds(self, row, bookmaker, odds):
+        """更新某一行某公司的赔率"""
+        if len(odds) != 3:
+            raise ValueError(f"赔率必须为胜平负三项, 实际为 {len(odds)} 项")
+        start = row * 3
+        self.columns[bookmaker][start:start + 3] = array("d", odds)
+        if bookmaker == "lb":
+            self.has_lb[row] = True
+
+    def row(self, match_id):
+        """比赛编号 -> 行号 (不存在时返回 None)"""
+        return self.index.get(match_id)
+
+    def league(self, row):
+        """某一行的联赛代码 (字符串)"""
+        return str(self.codes[row])
+
+    def odds(self, row, bookmaker):
+        """某一行某公司的赔率 [胜, 平, 负], 缺失时返回 None"""
+        if bookmaker == "lb" and not self.has_lb[row]:
+            return None
+        start = row * 3
+        return self.columns[bookmaker][start:start + 3].tolist()
+
+    def record(self, row):
+        """按旧结构返回一场比赛的字典"""
+        league_code = self.league(row)
+        data = {"league": league_code, "league_name": self.leagues[league_code]}
+        for bookmaker in BOOKMAKERS:
+            data[bookmaker] = self.odds(row, bookmaker)
+        markets = {column: self.market(row, column) for column in self.markets}
+        markets = {column: triple for column, triple in markets.items() if triple is not None}
+        if markets:
+            data["markets"] = markets
+        return data
+
+    def as_arrays(self):
+        """
+        返回 numpy 视图 (不复制数据): am/wl/hg/lb 为 (N, 3) float64, codes 为 int8,
+        markets 为 {盘口: (N, 3) float64} (只含已创建的盘口列)
+        持有视图期间数组不能扩容, 需在再次写入前释放
+        """
+        import numpy as np
+
+        result = {bookmaker: np.frombuffer(column, dtype=np.float64).reshape(-1, 3)
+                  for bookmaker, column in self.columns.items()}
+        result["codes"] = np.frombuffer(self.codes, dtype=np.int8)
+        result["markets"] = {column: np.frombuffer(values, dtype=np.float64).reshape(-1, 3)
+                             for column, values in self.markets.items()}
+        return result
+
+    def nbytes(self):
+        """数组部分占用的字节数 (不含比赛编号和索引字典)"""
+        columns = list(self.columns.values()) + list(self.markets.values())
+        return sum(column.itemsize * len(column) for column in columns) + len(self.codes) * 2
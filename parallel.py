@@ -0,0 +1,133 @@
+"""
+多进程并行分析
+
+把输入按行区间或按联赛切分成若干块, 交给进程池中的工作进程分析。每个工作进程只加载
+编译好的规则表 (不创建 FootballPredictionSystem, 也不共享 self.matches), 结果按输入
+顺序合并。fork 启动方式下输入数组通过进程继承共享, 不需要逐块序列化。
+
+编译出的求值函数不能序列化, 工作进程收到的是规则表定义 (CompiledRules.table, 已包含
+register_league 注册的联赛) 并自行编译, spawn 启动方式下与主进程的规则表也相同。
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from batch import (BatchResult, as_markets, as_odds, compute_features, compute_verdicts, evaluate_rules,
+                   to_league_codes, vector_rules)
+from rule_engine import compile_rule_table, default_rules
+
+DEFAULT_CHUNK_SIZE = 50000
+SHARD_MODES = ("rows", "league")
+
+# 工作进程内的状态: 规则表与输入数组
+_worker = {}
+
+
+def _init_worker(rules, am, wl, hg, codes, markets=None, archive_path=None):
+    """rules: 当前进程中为 CompiledRules, 进程池中为规则表定义"""
+    if isinstance(rules, dict):
+        rules = compile_rule_table(rules, registered=False)
+    if archive_path:
+        # 每个工作进程自行映射归档文件, 共享页缓存
+        from archive import open_archive
+        arrays = open_archive(archive_path, rules.league_names()).as_arrays()
+        am, wl, hg, codes = arrays["am"], arrays["wl"], arrays["hg"], arrays["codes"]
+    _worker.update(rules=rules, am=am, wl=wl, hg=hg, codes=codes, markets=markets)
+
+
+def _analyze_rows(rows):
+    """分析一块数据, rows 为 slice 或行号数组"""
+    rules = _worker["rules"]
+    features = compute_features(_worker["am"][rows], _worker["wl"][rows], _worker["hg"][rows])
+    markets = _worker["markets"]
+    if markets is not None:
+        markets = {column: values[rows] for column, values in markets.items()}
+    fired = evaluate_rules(features, _worker["codes"][rows], rules, markets)
+    return rows, fired, compute_verdicts(fired, rules)
+
+
+def plan_shards(codes, chunk_size, shard="rows"):
+    """
+    切分任务
+    rows: 连续行区间
+    league: 先按联赛分组 (保持组内原顺序), 再按块大小切分, 每块内的联赛尽量单一
+    """
+    if shard not in SHARD_MODES:
+        raise ValueError(f"无效的切分方式: {shard}")
+    n = len(codes)
+    if shard == "rows":
+        return [slice(start, min(start + chunk_size, n)) for start in range(0, n, chunk_size)]
+    order = np.argsort(codes, kind="stable")
+    bounds = np.flatnonzero(np.diff(codes[order])) + 1
+    shards = []
+    for group in np.split(order, bounds):
+        shards.extend(group[start:start + chunk_size] for start in range(0, len(group), chunk_size))
+    return shards
+
+
+def analyze_parallel(am_odds, wl_odds, hg_odds, leagues, workers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                     shard="rows", rules=None, markets=None):
+    """
+    多进程批量分析, 返回与 analyze_batch 相同的 BatchResult (按输入顺序)
+    workers: 进程数 (默认CPU核数)
+    chunk_size: 每块行数
+    shard: 切分方式 rows / league
+    rules: 编译后的规则表 (默认使用 rules.json)
+    markets: 盘口 {"wl_ah": (N, 3) 数组, ...} (见 markets.py), 与 analyze_batch 相同
+    """
+    rules = rules or default_rules()
+    vector = vector_rules(rules)
+    am = as_odds(am_odds, "澳门")
+    wl = as_odds(wl_odds, "威廉希尔")
+    hg = as_odds(hg_odds, "皇冠")
+    codes = to_league_codes(leagues, vector.leagues)
+    if not (len(am) == len(wl) == len(hg) == len(codes)):
+        raise ValueError("赔率数组与联赛代码长度不一致")
+    markets = as_markets(markets, len(codes))
+    if chunk_size <= 0:
+        raise ValueError("chunk_size 必须为正数")
+
+    return _run(codes, rules, workers, chunk_size, shard, (am, wl, hg, codes, markets))
+
+
+def analyze_archive_parallel(archive_path, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, shard="rows", rules=None):
+    """
+    多进程分析赔率归档 (archive.py), 工作进程各自映射归档文件, 不传递赔率数据
+    返回按归档行顺序排列的 BatchResult
+    """
+    from archive import open_archive
+
+    rules = rules or default_rules()
+    vector = vector_rules(rules)
+    with open_archive(archive_path, rules.league_names()) as archive:
+        codes = to_league_codes(np.array(archive.codes), vector.leagues)
+    if chunk_size <= 0:
+        raise ValueError("chunk_size 必须为正数")
+    return _run(codes, rules, workers, chunk_size, shard, (None, None, None, codes, None, archive_path))
+
+
+def _run(codes, rules, workers, chunk_size, shard, data):
+    """切分任务, 在进程池 (或当前进程) 中分析并按输入顺序合并"""
+    workers = workers or os.cpu_count() or 1
+    shards = plan_shards(codes, chunk_size, shard)
+    rule_ids = vector_rules(rules).rule_ids
+    fired = np.zeros((len(codes), len(rule_ids)), dtype=bool)
+    verdicts = np.zeros(len(codes), dtype=np.int8)
+
+    if workers == 1 or len(shards) <= 1:
+        _init_worker(rules, *data)
+        for rows, part_fired, part_verdicts in map(_analyze_rows, shards):
+            fired[rows] = part_fired
+            verdicts[rows] = part_verdicts
+        _worker.clear()
+    else:
+        if rules.table is None:
+            raise ValueError("规则表没有定义 (CompiledRules.table), 不能交给工作进程")
+        with ProcessPoolExecutor(max_workers=min(workers, len(shards)), initializer=_init_worker,
+                                 initargs=(rules.table, *data)) as pool:
+            for rows, part_fired, part_verdicts in pool.map(_analyze_rows, shards):
+                fired[rows] = part_fired
+                verdicts[rows] = part_verdicts
+    return BatchResult(fired, verdicts, rule_ids)
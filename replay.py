@@ -0,0 +1,346 @@
+"""
+赔率流回放
+
+把录制的一天赔率流 (JSONL) 按时间顺序重新送入 FootballPredictionSystem, 走与线上相同的
+add_match / update_odds / analyze_match_result 路径, 并与录制时的综合判断比较, 用于复现线上问题。
+
+录制文件每行一个事件:
+    {"ts": 1714730400.0, "match_id": "J1-001", "league": "9", "am": [...], "wl": [...], "hg": [...],
+     "lb": [...], "markets": {...}, "verdict": "upper", "rules": ["j1.upper"]}             添加比赛
+    {"ts": "2024-05-03T10:05:00", "match_id": "J1-001", "bookmaker": "wl", "odds": [...],
+     "verdict": "mixed"}                                                                   赔率更新
+    ts 为秒 (数字) 或 ISO 时间; verdict / rules 为录制时的结果 (可选, 有则比较)。
+    其余字段与 --ingest 的 JSONL 相同 (见 ingest.py)。
+
+事件放入按 (时间, 文件中的顺序) 排序的堆中依次取出, 录制文件不必有序, 同一时刻的事件按文件
+顺序处理, 同一文件每次回放的结果相同。speed 为回放倍速 (1 为实时, 100 为百倍速), None 为
+不等待、尽快处理; 按倍速回放时, 事件的计划时间 = 开始时间 + (ts - 第一个事件的 ts) / speed,
+实际开始处理的时间比计划晚的部分记为滞后 (lag)。
+"""
+
+import heapq
+import json
+import math
+import time
+from array import array
+from datetime import datetime
+
+from ingest import parse_markets, parse_record
+from validate import Rejection
+
+SPEEDS = {"1x": 1.0, "100x": 100.0, "fast": None}
+
+# 报告中保留的判断差异条数 (计数不受限制)
+DEFAULT_MAX_DIFFS = 1000
+
+
+def parse_speed(value):
+    """'1x' / '100x' / 'fast' 或正数 -> 倍速 (None 为尽快处理)"""
+    value = str(value).strip().lower()
+    if value in SPEEDS:
+        return SPEEDS[value]
+    try:
+        speed = float(value[:-1] if value.endswith("x") else value)
+    except ValueError:
+        raise ValueError(f"无效的回放速度: {value}") from None
+    if not speed > 0:
+        raise ValueError(f"无效的回放速度: {value}")
+    return speed
+
+
+def parse_timestamp(value):
+    """秒数或 ISO 时间 -> 秒"""
+    ts = None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        ts = float(value)
+    elif isinstance(value, str):
+        try:
+            ts = float(value)
+        except ValueError:
+            try:
+                ts = datetime.fromisoformat(value).timestamp()
+            except ValueError:
+                pass
+    if ts is None or not math.isfinite(ts):
+        raise ValueError(f"无效的时间: {value!r}")
+    return ts
+
+
+class RealClock:
+    """真实时钟"""
+
+    now = staticmethod(time.perf_counter)
+    sleep = staticmethod(time.sleep)
+
+
+class VirtualClock:
+    """虚拟时钟: sleep 只推进时间, 不真正等待 (测试倍速回放用)"""
+
+    def __init__(self, start=0.0):
+        self.time = start
+
+    def now(self):
+        return self.time
+
+    def sleep(self, seconds):
+        self.time += max(seconds, 0.0)
+
+
+class EventScheduler:
+    """按 (时间, 加入顺序) 出堆的事件队列"""
+
+    def __init__(self):
+        self._heap = []
+        self._seq = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def schedule(self, ts, event):
+        heapq.heappush(self._heap, (ts, self._seq, event))
+        self._seq += 1
+
+    def extend(self, items):
+        """一次加入大量 (时间, 事件), 之后整体建堆 (O(n))"""
+        for ts, event in items:
+            self._heap.append((ts, self._seq, event))
+            self._seq += 1
+        heapq.heapify(self._heap)
+
+    def peek_time(self):
+        return self._heap[0][0] if self._heap else None
+
+    def pop(self):
+        """取出最早的事件, 返回 (时间, 事件)"""
+        ts, _, event = heapq.heappop(self._heap)
+        return ts, event
+
+
+def read_events(path):
+    """读取录制文件, 逐个产出 (时间, 原始记录); 无法解析的行产出 (None, 原因)"""
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError("不是 JSON 对象")
+                yield parse_timestamp(record.get("ts")), record
+            except ValueError as e:
+                yield None, f"第 {line_no} 行: {e}"
+
+
+class _Percentiles:
+    """全部样本的分位数 (秒)"""
+
+    def __init__(self):
+        self.samples = array("d")
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, q):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+    def summary(self):
+        if not self.samples:
+            return None
+        return {"p50_ms": self.percentile(50) * 1000, "p99_ms": self.percentile(99) * 1000,
+                "max_ms": max(self.samples) * 1000}
+
+
+class ReplayReport:
+    """回放结果: 事件数、吞吐量、滞后、与录制结果不同的判断"""
+
+    def __init__(self, speed, max_diffs=DEFAULT_MAX_DIFFS):
+        self.speed = speed
+        self.max_diffs = max_diffs
+        self.events = 0
+        self.added = 0
+        self.updates = 0
+        self.compared = 0
+        self.diff_count = 0
+        self.diffs = []
+        self.errors = []
+        self.error_count = 0
+        self.first_ts = None
+        self.last_ts = None
+        self.elapsed = 0.0
+        self.interrupted = False
+        self.lag = _Percentiles()
+        self.latency = _Percentiles()
+
+    @property
+    def events_per_sec(self):
+        return self.events / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def span(self):
+        """录制时间跨度 (秒)"""
+        return self.last_ts - self.first_ts if self.first_ts is not None else 0.0
+
+    def error(self, ts, match_id, reason):
+        self.error_count += 1
+        if len(self.errors) < self.max_diffs:
+            self.errors.append({"ts": ts, "match_id": match_id, "reason": reason})
+
+    def diff(self, entry):
+        self.diff_count += 1
+        if len(self.diffs) < self.max_diffs:
+            self.diffs.append(entry)
+
+    def to_dict(self):
+        return {
+            "speed": self.speed,
+            "events": self.events,
+            "added": self.added,
+            "updates": self.updates,
+            "errors": self.error_count,
+            "compared": self.compared,
+            "diffs": self.diff_count,
+            "span_seconds": round(self.span, 3),
+            "seconds": round(self.elapsed, 3),
+            "events_per_sec": round(self.events_per_sec, 1),
+            "interrupted": self.interrupted,
+            "lag": self.lag.summary(),
+            "latency": self.latency.summary(),
+            "diff_list": self.diffs,
+            "error_list": self.errors,
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+
+    def to_text(self, limit=20):
+        def ms(summary):
+            if summary is None:
+                return "-"
+            return f"p50 {summary['p50_ms']:.3f}ms, p99 {summary['p99_ms']:.3f}ms, 最大 {summary['max_ms']:.3f}ms"
+
+        speed = "尽快" if self.speed is None else f"{self.speed:g}x"
+        lines = [
+            f"=== 回放 ({speed}{', 已中断' if self.interrupted else ''}) ===",
+            f"事件 {self.events} 个 (添加 {self.added}, 赔率更新 {self.updates}, 出错 {self.error_count}), "
+            f"录制跨度 {self.span:.1f} 秒, 用时 {self.elapsed:.2f} 秒, {self.events_per_sec:,.0f} 事件/秒",
+            f"处理耗时: {ms(self.latency.summary())}",
+            f"滞后: {ms(self.lag.summary())}",
+            f"比较 {self.compared} 次, 判断不同 {self.diff_count} 次",
+        ]
+        for entry in self.diffs[:limit]:
+            rules = ""
+            if entry.get("expected_rules") is not None:
+                rules = f"  规则 {entry['expected_rules']} -> {entry['rules']}"
+            lines.append(f"  {entry['ts']:.3f} {entry['match_id']} ({entry['event']}): "
+                         f"{entry['expected']} -> {entry['verdict']}{rules}")
+        for entry in self.errors[:limit]:
+            lines.append(f"  出错 {entry['match_id']}: {entry['reason']}")
+        return "\n".join(lines)
+
+
+class Replayer:
+    """
+    回放器
+    system: FootballPredictionSystem (通常为新建的实例); speed: 倍速, None 为尽快处理
+    clock: 时钟 (默认 RealClock, 测试时可用 VirtualClock)
+    """
+
+    def __init__(self, system, speed=None, clock=None, max_diffs=DEFAULT_MAX_DIFFS):
+        self.system = system
+        self.speed = speed
+        self.clock = clock or RealClock()
+        self.scheduler = EventScheduler()
+        self.report = ReplayReport(speed, max_diffs)
+
+    def load(self, events):
+        """加入 (时间, 原始记录); 时间为 None 的为无法解析的行, 记为出错"""
+        valid = []
+        for ts, record in events:
+            if ts is None:
+                self.report.error(None, None, record)
+            else:
+                valid.append((ts, record))
+        self.scheduler.extend(valid)
+
+    def _apply(self, record):
+        """执行一个事件, 返回 (事件类型, 分析结果)"""
+        system = self.system
+        bookmaker = record.get("bookmaker")
+        if bookmaker is None:
+            match_id, code, am, wl, hg, lb, kickoff = parse_record(record, system.leagues)
+            rejected = system.add_match(match_id, code, am, wl, hg, lb, kickoff, parse_markets(record.get("markets")))
+            if isinstance(rejected, Rejection):
+                raise ValueError(rejected)
+            self.report.added += 1
+            return "add", system.analyze_match_result(match_id)
+        match_id = str(record.get("match_id"))
+        odds = record.get("odds")
+        if odds is None or len(odds) != 3:
+            raise ValueError("赔率更新须为胜平负三项")
+        rejected = system.update_odds(match_id, bookmaker, odds)
+        if isinstance(rejected, Rejection):
+            raise ValueError(rejected)
+        self.report.updates += 1
+        return "odds", system.analyze_match_result(match_id)
+
+    def _compare(self, ts, record, kind, result):
+        expected = record.get("verdict")
+        expected_rules = record.get("rules")
+        if expected is None and expected_rules is None:
+            return
+        report = self.report
+        report.compared += 1
+        verdict = result.verdict_label
+        rules = result.rule_ids
+        if (expected is not None and expected != verdict) or (expected_rules is not None and expected_rules != rules):
+            report.diff({"ts": ts, "match_id": result.match_id, "event": kind, "expected": expected,
+                         "verdict": verdict, "expected_rules": expected_rules, "rules": rules})
+
+    def run(self):
+        """按时间顺序处理全部事件, 返回 ReplayReport"""
+        report = self.report
+        scheduler = self.scheduler
+        now = self.clock.now
+        speed = self.speed
+        started = now()
+        if len(scheduler):
+            report.first_ts = scheduler.peek_time()
+        try:
+            while len(scheduler):
+                ts, record = scheduler.pop()
+                if speed is not None:
+                    due = started + (ts - report.first_ts) / speed
+                    wait = due - now()
+                    if wait > 0:
+                        self.clock.sleep(wait)
+                    begin = now()
+                    report.lag.record(max(begin - due, 0.0))
+                else:
+                    begin = now()
+                report.events += 1
+                report.last_ts = ts
+                try:
+                    kind, result = self._apply(record)
+                except (ValueError, TypeError) as e:
+                    report.error(ts, record.get("match_id"), str(e))
+                    continue
+                if result is None:
+                    report.error(ts, record.get("match_id"), "比赛数据不存在")
+                    continue
+                self._compare(ts, record, kind, result)
+                report.latency.record(now() - begin)
+        except KeyboardInterrupt:
+            report.interrupted = True
+        report.elapsed = now() - started
+        return report
+
+
+def replay_file(system, path, speed=None, clock=None, max_diffs=DEFAULT_MAX_DIFFS):
+    """回放录制文件, 返回 ReplayReport"""
+    replayer = Replayer(system, speed, clock, max_diffs)
+    replayer.load(read_events(path))
+    return replayer.run()
@@ -0,0 +1,237 @@
+"""
+批量分析报告
+
+analyze_file 读取 CSV/JSONL 赔率文件 (格式见 ingest.py), 分析每场比赛并写出报告:
+
+- text      与交互模式 analyze 相同的报告文本
+- json      JSON 数组; jsonl 每行一个对象 (与 --ingest 的输出相同)
+- csv       match_id,league,verdict,rules (规则编号以 | 分隔)
+- columnar  列式 .npz 文件 (numpy.load 读取): match_id, league, verdict, fired (场数 x 规则数),
+            rule_ids, am / wl / hg (场数 x 3)
+
+读取和规则求值在主线程按块进行, 每块的报告交给线程池生成, 与下一块的求值同时进行;
+生成结果按输入顺序整块写入带缓冲的文件, 不逐行 print 或拼接字符串。
+"""
+
+import csv
+import io
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import ingest
+from result import VERDICT_LABELS, render_report
+
+FORMATS = ("text", "json", "jsonl", "csv", "columnar")
+# 按输出文件扩展名判断格式
+EXTENSIONS = {".txt": "text", ".json": "json", ".jsonl": "jsonl", ".ndjson": "jsonl", ".csv": "csv",
+              ".npz": "columnar"}
+
+DEFAULT_WORKERS = 2
+
+
+def detect_format(path):
+    """按扩展名判断报告格式, 标准输出和未知扩展名为 text"""
+    if path in (None, "-"):
+        return "text"
+    return EXTENSIONS.get(os.path.splitext(path)[1].lower(), "text")
+
+
+class ReportWriter:
+    """
+    报告输出
+    render(parsed, result) 在线程池中调用, 生成一块的输出; write 在主线程按输入顺序调用
+    """
+
+    binary = False
+
+    def __init__(self, path, rules):
+        self.path = path
+        self.rules = rules
+        self._file = None
+        if not self.binary:
+            self._file = ingest.open_output(path) if path not in (None, "-") else sys.stdout
+        self.chunks = 0
+
+    def render(self, parsed, result):
+        raise NotImplementedError
+
+    def write(self, rendered):
+        self._file.write(rendered)
+
+    def close(self):
+        if self._file is not None:
+            self._file.flush()
+            if self._file is not sys.stdout:
+                self._file.close()
+
+
+class TextReport(ReportWriter):
+    """与 analyze_match 相同的报告文本"""
+
+    def __init__(self, path, rules):
+        super().__init__(path, rules)
+        # 每个联赛按规则表顺序排列的 (规则在 BatchResult 中的列, 说明文字)
+        self._leagues = {}
+
+    def _league(self, code, rule_ids):
+        plan = self._leagues.get(code)
+        if plan is None:
+            league = self.rules.leagues[code]
+            column = {rule_id: i for i, rule_id in enumerate(rule_ids)}
+            plan = self._leagues[code] = (league.name, [column[rule.rule_id] for rule in league.rules],
+                                          [league.rendered[rule.rule_id] for rule in league.rules])
+        return plan
+
+    def render(self, parsed, result):
+        rows_by_league = {}
+        for i, row in enumerate(parsed):
+            rows_by_league.setdefault(row[1], []).append(i)
+        messages = [None] * len(parsed)
+        for code, rows in rows_by_league.items():
+            _, columns, texts = self._league(code, result.rule_ids)
+            hits = result.fired[np.array(rows)][:, columns].tolist()
+            for i, row_hits in zip(rows, hits):
+                messages[i] = [text for text, hit in zip(texts, row_hits) if hit]
+        verdicts = result.verdicts.tolist()
+        reports = []
+        for i, (match_id, code, am, wl, hg, _, _) in enumerate(parsed):
+            name = self._league(code, result.rule_ids)[0]
+            reports.append(render_report(match_id, name, am, wl, hg, messages[i], verdicts[i]))
+        reports.append("")
+        return "\n".join(reports)
+
+
+class JsonLinesReport(ReportWriter):
+    """每行一个 {"match_id", "league", "rules", "verdict"}"""
+
+    def _lines(self, parsed, result):
+        dumps = json.JSONEncoder(ensure_ascii=False).encode
+        labels = result.verdict_labels()
+        rule_lists = result.rule_lists()
+        return [dumps({"match_id": row[0], "league": row[1], "rules": rule_lists[i], "verdict": labels[i]})
+                for i, row in enumerate(parsed)]
+
+    def render(self, parsed, result):
+        lines = self._lines(parsed, result)
+        lines.append("")
+        return "\n".join(lines)
+
+
+class JsonReport(JsonLinesReport):
+    """JSON 数组 (逐块写出, 不在内存中保留全部结果)"""
+
+    def render(self, parsed, result):
+        return ",\n".join(self._lines(parsed, result))
+
+    def write(self, rendered):
+        self._file.write(",\n" if self.chunks else "[\n")
+        self._file.write(rendered)
+        self.chunks += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.write("\n]\n" if self.chunks else "[]\n")
+        super().close()
+
+
+class CsvReport(ReportWriter):
+    """match_id,league,verdict,rules"""
+
+    def write(self, rendered):
+        if not self.chunks:
+            self._file.write("match_id,league,verdict,rules\r\n")
+        self._file.write(rendered)
+        self.chunks += 1
+
+    def render(self, parsed, result):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        labels = result.verdict_labels()
+        rule_lists = result.rule_lists()
+        writer.writerows((row[0], row[1], labels[i], "|".join(rule_lists[i])) for i, row in enumerate(parsed))
+        return buffer.getvalue()
+
+
+class ColumnarReport(ReportWriter):
+    """列式 .npz, 各块在 close 时合并写出"""
+
+    binary = True
+
+    def __init__(self, path, rules):
+        if path in (None, "-"):
+            raise ValueError("columnar 格式需要指定输出文件")
+        super().__init__(path, rules)
+        self._parts = []
+        self._rule_ids = None
+
+    def render(self, parsed, result):
+        return (np.array([row[0] for row in parsed]),
+                np.array([int(row[1]) for row in parsed], dtype=np.int8),
+                result.verdicts, np.packbits(result.fired, axis=1),
+                np.array([row[2:5] for row in parsed], dtype=np.float64), result.rule_ids)
+
+    def write(self, rendered):
+        self._parts.append(rendered[:5])
+        self._rule_ids = rendered[5]
+
+    def close(self):
+        n_rules = len(self._rule_ids) if self._rule_ids is not None else 0
+        columns = [np.concatenate(part) for part in zip(*self._parts)] if self._parts else None
+        if columns is None:
+            columns = [np.array([], dtype=str), np.zeros(0, np.int8), np.zeros(0, np.int8),
+                       np.zeros((0, 0), np.uint8), np.zeros((0, 3, 3))]
+        match_ids, leagues, verdicts, packed, odds = columns
+        tmp_path = self.path + ".tmp.npz"
+        np.savez(tmp_path, match_id=match_ids, league=leagues, verdict=verdicts,
+                 verdict_labels=np.array(VERDICT_LABELS),
+                 fired=np.unpackbits(packed, axis=1, count=n_rules).astype(bool),
+                 rule_ids=np.array(self._rule_ids or (), dtype=str),
+                 am=odds[:, 0], wl=odds[:, 1], hg=odds[:, 2])
+        os.replace(tmp_path, self.path)
+
+
+WRITERS = {
+    "text": TextReport,
+    "json": JsonReport,
+    "jsonl": JsonLinesReport,
+    "csv": CsvReport,
+    "columnar": ColumnarReport,
+}
+
+
+def analyze_file(system, source, output="-", fmt=None, input_format=None, chunk_size=ingest.DEFAULT_CHUNK_SIZE,
+                 workers=DEFAULT_WORKERS, engine="vector", on_reject=None):
+    """
+    分析 source (CSV/JSONL, '-' 为标准输入) 中的全部比赛并写出报告
+    fmt: 报告格式 (默认按输出文件扩展名判断); workers: 报告生成线程数, 0 表示在主线程生成
+    返回 ingest.IngestStats
+    """
+    fmt = fmt or detect_format(output)
+    if fmt not in WRITERS:
+        raise ValueError(f"不支持的报告格式: {fmt}")
+    writer = WRITERS[fmt](output, system.rules)
+    stats = ingest.IngestStats()
+    chunks = ingest.analyze_chunks(system, ingest.read_records(source, input_format), chunk_size, stats, on_reject,
+                                   engine)
+    try:
+        if not workers:
+            for parsed, result in chunks:
+                writer.write(writer.render(parsed, result))
+            return stats
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for parsed, result in chunks:
+                pending.append(pool.submit(writer.render, parsed, result))
+                # 已完成的块及时写出; 积压过多时等待, 限制内存
+                while pending and (pending[0].done() or len(pending) > 2 * workers):
+                    writer.write(pending.popleft().result())
+            while pending:
+                writer.write(pending.popleft().result())
+        return stats
+    finally:
+        writer.close()
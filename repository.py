@@ -0,0 +1,187 @@
+"""
+SQLite 比赛仓库
+
+把比赛赔率和分析结果持久化到 SQLite, 程序退出后不丢失。连接使用 WAL 模式, 批量写入
+用 executemany 并放在同一事务中; 联赛代码、开赛时间和比赛编号都有索引, 按联赛和日期
+查询 (例如 "本周的日职乙比赛") 走索引而不是遍历全部比赛。
+
+表结构:
+    matches(match_id, league, kickoff, am_home..lb_away)
+    results(match_id, verdict, rules, analyzed_at)
+"""
+
+import sqlite3
+from datetime import date, datetime, timedelta
+
+from match_store import BOOKMAKERS
+from validate import parse_kickoff
+
+ODDS_COLUMNS = [f"{b}_{o}" for b in BOOKMAKERS for o in ("home", "draw", "away")]
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS matches (
+    match_id TEXT PRIMARY KEY,
+    league INTEGER NOT NULL,
+    kickoff TEXT,
+    {", ".join(f"{column} REAL" for column in ODDS_COLUMNS)}
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_matches_league_kickoff ON matches (league, kickoff);
+CREATE INDEX IF NOT EXISTS idx_matches_kickoff ON matches (kickoff);
+CREATE TABLE IF NOT EXISTS results (
+    match_id TEXT PRIMARY KEY,
+    verdict TEXT NOT NULL,
+    rules TEXT NOT NULL,
+    analyzed_at TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+_INSERT_MATCH = (f"INSERT OR REPLACE INTO matches (match_id, league, kickoff, {', '.join(ODDS_COLUMNS)}) "
+                 f"VALUES ({', '.join('?' * (3 + len(ODDS_COLUMNS)))})")
+_INSERT_RESULT = "INSERT OR REPLACE INTO results (match_id, verdict, rules, analyzed_at) VALUES (?, ?, ?, ?)"
+_SELECT_MATCH = f"SELECT match_id, league, kickoff, {', '.join(ODDS_COLUMNS)} FROM matches"
+
+def week_range(day=None):
+    """day 所在的一周 (周一 00:00 至下周一 00:00)"""
+    day = day or date.today()
+    if isinstance(day, str):
+        day = datetime.fromisoformat(day)
+    if isinstance(day, datetime):
+        day = day.date()
+    start = day - timedelta(days=day.weekday())
+    return start, start + timedelta(days=7)
+
+
+def _match_row(match_id, league_code, am_odds, wl_odds, hg_odds, lb_odds=None, kickoff=None):
+    lb_odds = lb_odds if lb_odds is not None else (None, None, None)
+    return (str(match_id), int(league_code), parse_kickoff(kickoff),
+            *am_odds, *wl_odds, *hg_odds, *lb_odds)
+
+
+class MatchRepository:
+    """
+    SQLite 比赛仓库
+    path: 数据库文件 (":memory:" 为内存数据库)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM matches").fetchone()[0]
+
+    def __contains__(self, match_id):
+        return self.conn.execute("SELECT 1 FROM matches WHERE match_id = ?", (str(match_id),)).fetchone() is not None
+
+    def save_match(self, match_id, league_code, am_odds, wl_odds, hg_odds, lb_odds=None, kickoff=None):
+        """保存一场比赛 (编号已存在时覆盖)"""
+        with self.conn:
+            self.conn.execute(_INSERT_MATCH, _match_row(match_id, league_code, am_odds, wl_odds, hg_odds,
+                                                        lb_odds, kickoff))
+
+    def save_matches(self, rows):
+        """
+        批量保存比赛, 一个事务
+        rows: (match_id, league_code, am, wl, hg[, lb[, kickoff]]) 序列
+        """
+        with self.conn:
+            self.conn.executemany(_INSERT_MATCH, (_match_row(*row) for row in rows))
+
+    def save_results(self, results):
+        """
+        批量保存分析结果, 一个事务
+        results: (match_id, 规则编号列表, 综合判断) 序列, 或 result.AnalysisResult 序列
+        """
+        analyzed_at = datetime.now().isoformat(sep=" ", timespec="seconds")
+        rows = []
+        for item in results:
+            if hasattr(item, "rule_ids"):
+                item = (item.match_id, item.rule_ids, item.verdict_label)
+            match_id, rule_ids, verdict = item
+            rows.append((str(match_id), verdict, ",".join(rule_ids), analyzed_at))
+        with self.conn:
+            self.conn.executemany(_INSERT_RESULT, rows)
+
+    def save_result(self, result):
+        self.save_results([result])
+
+    def save_batch(self, parsed, batch_result):
+        """保存一块导入数据及其分析结果 (ingest.analyze_stream 的 on_chunk 回调)"""
+        labels = batch_result.verdict_labels()
+        rule_lists = batch_result.rule_lists()
+        analyzed_at = datetime.now().isoformat(sep=" ", timespec="seconds")
+        with self.conn:
+            self.conn.executemany(_INSERT_MATCH, [_match_row(*row) for row in parsed])
+            self.conn.executemany(_INSERT_RESULT, [
+                (row[0], labels[i], ",".join(rule_lists[i]), analyzed_at) for i, row in enumerate(parsed)])
+
+    def get(self, match_id):
+        """
+        读取一场比赛, 返回 (联赛代码, am, wl, hg, lb, 开赛时间); 不存在时返回 None
+        """
+        row = self.conn.execute(_SELECT_MATCH + " WHERE match_id = ?", (str(match_id),)).fetchone()
+        return None if row is None else _unpack(row)[1:]
+
+    def get_result(self, match_id):
+        """读取最近一次分析结果 {"rules", "verdict", "analyzed_at"}; 没有时返回 None"""
+        row = self.conn.execute("SELECT verdict, rules, analyzed_at FROM results WHERE match_id = ?",
+                                (str(match_id),)).fetchone()
+        if row is None:
+            return None
+        verdict, rules, analyzed_at = row
+        return {"rules": rules.split(",") if rules else [], "verdict": verdict, "analyzed_at": analyzed_at}
+
+    def find(self, league=None, start=None, end=None):
+        """
+        按联赛和开赛时间查询比赛编号 (走索引)
+        league: 联赛代码
+        start / end: 开赛时间范围 [start, end)
+        """
+        sql, params = _where(league, start, end)
+        return [row[0] for row in self.conn.execute("SELECT match_id FROM matches" + sql, params)]
+
+    def find_matches(self, league=None, start=None, end=None):
+        """与 find 相同, 但返回 (match_id, 联赛代码, am, wl, hg, lb, 开赛时间) 列表"""
+        sql, params = _where(league, start, end)
+        return [_unpack(row) for row in self.conn.execute(_SELECT_MATCH + sql, params)]
+
+    def explain(self, league=None, start=None, end=None):
+        """查询计划 (确认是否使用索引)"""
+        sql, params = _where(league, start, end)
+        return [row[-1] for row in self.conn.execute("EXPLAIN QUERY PLAN SELECT match_id FROM matches" + sql, params)]
+
+
+def _where(league, start, end):
+    clauses, params = [], []
+    if league is not None:
+        clauses.append("league = ?")
+        params.append(int(league))
+    if start is not None:
+        clauses.append("kickoff >= ?")
+        params.append(parse_kickoff(start))
+    if end is not None:
+        clauses.append("kickoff < ?")
+        params.append(parse_kickoff(end))
+    sql = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+    order = " ORDER BY kickoff, match_id" if start is not None or end is not None else ""
+    return sql + order, params
+
+
+def _unpack(row):
+    match_id, league, kickoff = row[:3]
+    odds = row[3:]
+    am, wl, hg, lb = (list(odds[i:i + 3]) for i in range(0, 12, 3))
+    return match_id, str(league), am, wl, hg, (None if lb[0] is None else lb), kickoff
+
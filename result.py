@@ -0,0 +1,160 @@
+"""
+分析结果对象
+
+AnalysisResult 直接保存触发的规则和综合判断, 判断由规则方向计数得出, 不再扫描文字。
+报告文本只在调用 render() 时才生成。
+"""
+
+from enum import IntEnum
+
+
+class Direction(IntEnum):
+    """规则方向"""
+    NEUTRAL = 0
+    UPPER = 1
+    LOWER = 2
+    DRAW = 3
+
+
+class Verdict(IntEnum):
+    """综合判断"""
+    NONE = 0
+    UPPER = 1
+    LOWER = 2
+    DRAW = 3
+    MIXED = 4
+
+
+DIRECTION_CODES = {
+    None: Direction.NEUTRAL,
+    "upper": Direction.UPPER,
+    "lower": Direction.LOWER,
+    "draw": Direction.DRAW,
+}
+
+VERDICT_LABELS = tuple(v.name.lower() for v in Verdict)
+
+VERDICT_TEXT = {
+    Verdict.UPPER: "🔥 建议: 支持上盘/低赔率方",
+    Verdict.LOWER: "🔥 建议: 支持下盘/高赔率方",
+    Verdict.DRAW: "🟡 建议: 关注平局选项",
+    Verdict.MIXED: "⚖️  信号混合，建议谨慎",
+}
+
+# 旧版按说明文字判断方向时使用的关键词
+_UPPER_WORDS = ("上盘", "低赔率方", "低水方", "强队", "超级强队")
+_LOWER_WORDS = ("下盘", "高赔率方", "弱队")
+_DRAW_WORDS = ("平局",)
+
+
+def decide_verdict(n_rules, upper, lower, draw):
+    """由各方向的规则数得出综合判断"""
+    if not n_rules:
+        return Verdict.NONE
+    if upper > lower and upper > draw:
+        return Verdict.UPPER
+    if lower > upper and lower > draw:
+        return Verdict.LOWER
+    if draw > 0 and draw >= upper and draw >= lower:
+        return Verdict.DRAW
+    return Verdict.MIXED
+
+
+def verdict_from_messages(messages):
+    """按说明文字中的关键词计数得出综合判断 (兼容只有文字结果的调用方)"""
+    upper = lower = draw = 0
+    for message in messages:
+        upper += any(word in message for word in _UPPER_WORDS)
+        lower += any(word in message for word in _LOWER_WORDS)
+        draw += any(word in message for word in _DRAW_WORDS)
+    return decide_verdict(len(messages), upper, lower, draw)
+
+
+def render_report(match_id, league_name, am_odds, wl_odds, hg_odds, messages, verdict):
+    """生成分析报告文本"""
+    output = [f"\n=== 比赛 {match_id} 分析结果 ==="]
+    output.append(f"联赛: {league_name}")
+    output.append(f"澳门初盘: {am_odds[0]:.2f} | {am_odds[1]:.2f} | {am_odds[2]:.2f}")
+    output.append(f"威廉希尔: {wl_odds[0]:.2f} | {wl_odds[1]:.2f} | {wl_odds[2]:.2f}")
+    output.append(f"皇冠初盘: {hg_odds[0]:.2f} | {hg_odds[1]:.2f} | {hg_odds[2]:.2f}")
+    output.append("")
+
+    if messages:
+        output.append("触发规则:")
+        for i, message in enumerate(messages, 1):
+            output.append(f"{i}. {message}")
+        output.append("")
+        output.append("=== 综合判断 ===")
+        output.append(VERDICT_TEXT[verdict])
+    else:
+        output.append("❌ 未触发任何已知规则")
+
+    return "\n".join(output)
+
+
+class AnalysisResult:
+    """
+    单场比赛的分析结果
+    match_id: 比赛编号
+    league: 编译后的联赛规则 (rule_engine.CompiledLeague)
+    rules: 触发的规则 (rule_engine.CompiledRule), 按规则表顺序
+    verdict: 综合判断 (Verdict), 未给出时由 rules 的方向计算
+    odds: (澳门, 威廉希尔, 皇冠) 赔率, 仅用于生成报告
+    """
+
+    __slots__ = ("match_id", "league", "rules", "verdict", "odds", "_text")
+
+    def __init__(self, match_id, league, rules, odds=None, verdict=None):
+        self.match_id = match_id
+        self.league = league
+        self.rules = rules
+        self.odds = odds
+        self._text = None
+        if verdict is not None:
+            self.verdict = verdict
+            return
+        counts = [0, 0, 0, 0]
+        for rule in rules:
+            counts[rule.direction_code] += 1
+        self.verdict = decide_verdict(len(rules), counts[Direction.UPPER], counts[Direction.LOWER],
+                                      counts[Direction.DRAW])
+
+    @property
+    def league_code(self):
+        return self.league.code
+
+    @property
+    def rule_ids(self):
+        return [rule.rule_id for rule in self.rules]
+
+    @property
+    def directions(self):
+        return [rule.direction_code for rule in self.rules]
+
+    @property
+    def messages(self):
+        rendered = self.league.rendered
+        return [rendered[rule.rule_id] for rule in self.rules]
+
+    @property
+    def verdict_label(self):
+        return VERDICT_LABELS[self.verdict]
+
+    def render(self):
+        """生成报告文本 (首次调用时生成并缓存)"""
+        if self._text is None:
+            am_odds, wl_odds, hg_odds = self.odds
+            self._text = render_report(self.match_id, self.league.name, am_odds, wl_odds, hg_odds,
+                                       self.messages, self.verdict)
+        return self._text
+
+    def to_dict(self):
+        return {
+            "match_id": self.match_id,
+            "league": self.league.code,
+            "rules": self.rule_ids,
+            "verdict": self.verdict_label,
+        }
+
+    def __repr__(self):
+        return f"AnalysisResult({self.match_id!r}, league={self.league.code!r}, verdict={self.verdict_label})"
@@ -0,0 +1,564 @@
+"""
+规则表编译器
+
+各联赛规则以数据形式写在 rules.json 中: 每条规则由若干"条件组"组成, 任一条件组
+全部满足即触发 (或-与结构)。每个条件是 特征 / 比较方式 / 目标值 / 容差 的组合:
+
+    {"feature": "wl_min", "op": "eq", "target": [1.44, 1.57], "tolerance": 0.02}
+    {"feature": "hg_wl_diff", "op": "between", "target": [0.1, 0.2], "bounds": "[)"}
+    {"feature": "am_min", "op": ">", "target": 2.00}
+    {"feature": "wl_draw", "op": "<=", "target": "hg_draw"}
+
+除胜平负赔率的特征外, 规则还可以引用亚盘/大小球盘口特征 (markets.MARKET_FEATURES, 例如
+wl_ou_line)。盘口特征只在用到它们的联赛中计算; 特征缺失 (或为 NaN) 时相关条件不成立。
+
+编译时把同一特征上的区间条件合并为一张有序端点表, 一次二分即可得到该特征上全部区间
+条件的结果; "等于其中某个值" 的条件按 (特征, 容差) 合并为有序数组, 同样用二分定位。
+单场比赛的计算量因此只和特征数量有关, 不再随取值列表变长而增长。
+"""
+
+import hashlib
+import json
+import os
+from bisect import bisect_left
+
+from markets import FEATURE_SOURCES, MARKET_FEATURES
+from result import DIRECTION_CODES, AnalysisResult
+
+RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules.json")
+
+# 规则可以引用的特征, 计算方式与原各 check_* 方法保持一致
+FEATURES = (
+    "am_min", "wl_min", "hg_min", "wl_draw", "hg_draw", "wl_0", "wl_2",
+    "hg_wl_diff", "wl_hg_diff", "am_wl_diff", "am_wl_gap", "hgd_wld_diff",
+)
+
+# 各特征由哪些基础赔率值计算得出
+FEATURE_INPUTS = {
+    "am_min": ("am_min",),
+    "wl_min": ("wl_min",),
+    "hg_min": ("hg_min",),
+    "wl_draw": ("wl_draw",),
+    "hg_draw": ("hg_draw",),
+    "wl_0": ("wl_0",),
+    "wl_2": ("wl_2",),
+    "hg_wl_diff": ("hg_min", "wl_min"),
+    "wl_hg_diff": ("hg_min", "wl_min"),
+    "am_wl_diff": ("am_min", "wl_min"),
+    "am_wl_gap": ("am_min", "wl_min"),
+    "hgd_wld_diff": ("hg_draw", "wl_draw"),
+}
+FEATURE_INPUTS.update((feature, (feature,)) for feature in MARKET_FEATURES)
+
+DIRECTIONS = ("upper", "lower", "draw", None)
+
+COMPARE_OPS = ("<", "<=", ">", ">=")
+
+# 等值查找时的候选窗口放宽量, 最终仍以 abs(x - v) < tol 精确判断
+_EQ_SLACK = 1e-9
+
+
+def make_features(wl_odds, hg_min, wl_min, hg_draw, wl_draw, am_min):
+    """由各公司最低赔率和平局赔率计算规则特征"""
+    return {
+        "am_min": am_min,
+        "wl_min": wl_min,
+        "hg_min": hg_min,
+        "wl_draw": wl_draw,
+        "hg_draw": hg_draw,
+        "wl_0": wl_odds[0],
+        "wl_2": wl_odds[2],
+        "hg_wl_diff": hg_min - wl_min,
+        "wl_hg_diff": wl_min - hg_min,
+        "am_wl_diff": am_min - wl_min,
+        "am_wl_gap": abs(am_min - wl_min),
+        "hgd_wld_diff": hg_draw - wl_draw,
+    }
+
+
+def rule_features(rule_def):
+    """规则定义中引用的全部特征"""
+    features = set()
+    for clause in rule_def["when"]:
+        for atom in clause:
+            feature = atom["feature"]
+            features.update(feature if isinstance(feature, list) else [feature])
+            if isinstance(atom.get("target"), str):
+                features.add(atom["target"])
+    return features
+
+
+def rule_inputs(rule_def):
+    """规则实际依赖的基础赔率值 (am_min / wl_min / wl_draw 等)"""
+    return {name for feature in rule_features(rule_def) for name in FEATURE_INPUTS[feature]}
+
+
+def match_features(am_odds, wl_odds, hg_odds):
+    """由三家公司的赔率计算规则特征"""
+    return make_features(wl_odds, min(hg_odds), min(wl_odds), hg_odds[1], wl_odds[1], min(am_odds))
+
+
+_MARKET_FEATURES = frozenset(MARKET_FEATURES)
+
+
+def _read(feature):
+    """生成代码中读取特征的表达式, 盘口特征可能缺失"""
+    if feature in _MARKET_FEATURES:
+        return f"f.get({feature!r}, _NAN)"
+    return f"f[{feature!r}]"
+
+
+class CompiledRule:
+    """编译后的单条规则"""
+
+    __slots__ = ("rule_id", "direction", "direction_code", "message", "clauses", "clause_masks")
+
+    def __init__(self, rule_id, direction, message, clauses):
+        self.rule_id = rule_id
+        self.direction = direction
+        self.direction_code = DIRECTION_CODES[direction]
+        self.message = message
+        # 每个条件组为条件编号元组; 标量路径使用位掩码
+        self.clauses = clauses
+        self.clause_masks = tuple(sum(1 << atom for atom in clause) for clause in clauses)
+
+    def render(self, league_name):
+        """生成规则触发说明"""
+        return self.message.format(league_name=league_name)
+
+
+class CompiledLeague:
+    """
+    编译后的联赛规则
+    range_index: [(特征, 有序端点, 各区段的条件编号)]
+    eq_index: [(特征, 容差, 有序取值, 各取值的条件编号)]
+    compare_atoms: [(特征a, 比较方式, 特征b, 条件编号)]
+    """
+
+    def __init__(self, code, name, group, rules, n_atoms, range_index, eq_index, compare_atoms,
+                 info=None, definitions=()):
+        self.code = code
+        self.name = name
+        self.group = group
+        self.rules = rules
+        # 原始定义, 用于按需编译规则子集
+        self.info = info
+        self.definitions = definitions
+        self.n_atoms = n_atoms
+        self.range_index = range_index
+        self.eq_index = eq_index
+        self.compare_atoms = compare_atoms
+        self.features = sorted(
+            {feature for feature, *_ in range_index}
+            | {feature for feature, *_ in eq_index}
+            | {a for a, _, _, _ in compare_atoms}
+            | {b for _, _, b, _ in compare_atoms}
+        )
+        # 用到的盘口特征; 为空时分析该联赛不需要读取盘口数据
+        self.market_features = tuple(feature for feature in self.features if feature in _MARKET_FEATURES)
+        self.market_columns = tuple(dict.fromkeys(FEATURE_SOURCES[feature][0] for feature in self.market_features))
+        # 规则说明只和联赛名称有关, 编译时一次生成
+        self.rendered = {rule.rule_id: rule.render(name) for rule in rules}
+        self.atom_bits, self.default_evaluate = self._generate()
+        # 求值函数的唯一替换点: 基础求值函数 (默认或 adaptive 的短路求值) 外面依次套上包装
+        # (例如 instrument 的计数), 各方只增删自己的那一层, 不互相覆盖
+        self._base_evaluate = None
+        self._wrappers = {}
+        self.evaluate = self.default_evaluate
+
+    def set_evaluator(self, evaluate=None):
+        """换用基础求值函数 (结果须与 default_evaluate 相同), None 恢复默认; 已有的包装保留"""
+        self._base_evaluate = evaluate
+        self._rebuild()
+
+    def add_wrapper(self, key, wrap):
+        """加一层包装: wrap(内层求值函数) -> 求值函数; 同一 key 重复添加时替换"""
+        self._wrappers[key] = wrap
+        self._rebuild()
+
+    def remove_wrapper(self, key):
+        if self._wrappers.pop(key, None) is not None:
+            self._rebuild()
+
+    def _rebuild(self):
+        evaluate = self._base_evaluate or self.default_evaluate
+        for wrap in self._wrappers.values():
+            evaluate = wrap(evaluate)
+        self.evaluate = evaluate
+
+    def subset(self, rule_ids):
+        """只包含指定规则的联赛 (重新编译, 条件表只含这些规则用到的条件)"""
+        rule_ids = set(rule_ids)
+        return compile_league(self.code, self.info, [d for d in self.definitions if d["id"] in rule_ids])
+
+    def _sources(self, env):
+        """
+        条件位的计算代码, 每个来源为 (代码行, 条件位掩码), 代码行把结果或到 {bits} 中
+        区间条件: 每个特征一次二分得到区段, 区段直接对应成立条件的位图
+        等值条件: 按 (特征, 容差) 一次二分定位候选值, 再用 abs(x - v) < tol 精确判断
+        盘口特征用 f.get 读取 (缺失为 NaN), 区间条件先排除 NaN; 等值与比较对 NaN 本来就不成立
+        """
+        env["_NAN"] = float("nan")
+        sources = []
+        for n, (feature, ends, segments) in enumerate(self.range_index):
+            env[f"_E{n}"] = ends
+            env[f"_S{n}"] = [sum(1 << atom for atom in atoms) for atoms in segments]
+            lines = [
+                f"i = _bisect(_E{n}, x)",
+                f"{{bits}} |= _S{n}[2 * i + (i < {len(ends)} and _E{n}[i] == x)]",
+            ]
+            if feature in _MARKET_FEATURES:
+                lines = ["if x == x:"] + ["    " + line for line in lines]
+            sources.append(([f"x = {_read(feature)}"] + lines,
+                            sum(1 << atom for atom in {atom for atoms in segments for atom in atoms})))
+        for n, (feature, tol, values, value_atoms) in enumerate(self.eq_index):
+            env[f"_V{n}"] = values
+            env[f"_B{n}"] = [sum(1 << atom for atom in atoms) for atoms in value_atoms]
+            sources.append(([
+                f"x = {_read(feature)}",
+                f"i = _bisect(_V{n}, x - {tol + _EQ_SLACK!r})",
+                f"upper = x + {tol + _EQ_SLACK!r}",
+                f"while i < {len(values)} and _V{n}[i] <= upper:",
+                f"    if abs(x - _V{n}[i]) < {tol!r}:",
+                f"        {{bits}} |= _B{n}[i]",
+                f"    i += 1",
+            ], sum(1 << atom for atom in {atom for atoms in value_atoms for atom in atoms})))
+        for a, op, b, atom in self.compare_atoms:
+            sources.append(([
+                f"if {_read(a)} {op} {_read(b)}:",
+                f"    {{bits}} |= {1 << atom}",
+            ], 1 << atom))
+        return sources
+
+    def _generate(self):
+        """生成该联赛专用的求值函数 (先算出全部条件位, 再逐条规则判断)"""
+        env = {"_bisect": bisect_left, "_fired_rules": self.rules}
+        body = ["    bits = 0"]
+        for lines, _ in self._sources(env):
+            body += ["    " + line.format(bits="bits") for line in lines]
+
+        rule_body = ["    fired = []"]
+        for n, rule in enumerate(self.rules):
+            # 单条件的条件组合并为一次位与, 多条件的逐组比较
+            single = sum(mask for clause, mask in zip(rule.clauses, rule.clause_masks) if len(clause) == 1)
+            tests = [f"bits & {single}"] if single else []
+            tests += [f"bits & {mask} == {mask}"
+                      for clause, mask in zip(rule.clauses, rule.clause_masks) if len(clause) > 1]
+            rule_body += [
+                f"    if {' or '.join(tests) or 'False'}:",
+                f"        fired.append(_fired_rules[{n}])",
+            ]
+
+        source = "\n".join(
+            ["def atom_bits(f):"] + body + ["    return bits", "", "def evaluate(f):"]
+            + body + rule_body + ["    return fired", ""]
+        )
+        exec(compile(source, f"<rules:{self.code}>", "exec"), env)
+        return env["atom_bits"], env["evaluate"]
+
+    def source_functions(self):
+        """
+        每个条件位来源单独的计算函数及其条件位掩码 [(func(f) -> 位图, 掩码)]
+        用于测量各来源的计算开销
+        """
+        env = {"_bisect": bisect_left}
+        funcs = []
+        for n, (lines, mask) in enumerate(self._sources(env)):
+            source = "\n".join([f"def source_{n}(f):", "    bits = 0"]
+                               + ["    " + line.format(bits="bits") for line in lines] + ["    return bits", ""])
+            exec(compile(source, f"<rules:{self.code}:source{n}>", "exec"), env)
+            funcs.append((env[f"source_{n}"], mask))
+        return funcs
+
+    def ordered_evaluate(self, order):
+        """
+        按给定顺序短路求值的函数, 结果与 evaluate 相同
+        order: {规则编号: 条件组下标序列}, 未给出的规则按规则表顺序
+        条件位按需计算: 某个来源只在第一次被条件组用到时计算, 规则已触发时其余条件组不再检查
+        """
+        env = {"_bisect": bisect_left, "_fired_rules": self.rules}
+        sources = self._sources(env)
+        body = []
+        if sources:
+            body.append("    " + " = ".join(f"s{k}" for k in range(len(sources))) + " = None")
+        body.append("    fired = []")
+        # 已确定计算过 / 可能计算过的来源: 确定计算过的直接使用, 从未计算过的不必判断 None
+        known, maybe = set(), set()
+        for n, rule in enumerate(self.rules):
+            clause_order = order.get(rule.rule_id) or range(len(rule.clauses))
+            if not rule.clauses:
+                continue
+            for position, c in enumerate(clause_order):
+                mask = rule.clause_masks[c]
+                needed = [k for k, (_, source_mask) in enumerate(sources) if source_mask & mask]
+                indent = "    " if position == 0 else "        "
+                if position:
+                    body.append("    if not hit:")
+                for k in needed:
+                    if k in known:
+                        continue
+                    if k in maybe:
+                        body.append(f"{indent}if s{k} is None:")
+                        inner = indent + "    "
+                    else:
+                        inner = indent
+                    body.append(f"{inner}s{k} = 0")
+                    body += [inner + line.format(bits=f"s{k}") for line in sources[k][0]]
+                    maybe.add(k)
+                    if position == 0:
+                        known.add(k)
+                bits = " | ".join(f"s{k}" for k in needed) or "0"
+                if len(rule.clauses[c]) == 1:
+                    body.append(f"{indent}hit = ({bits}) & {mask} != 0")
+                else:
+                    body.append(f"{indent}hit = ({bits}) & {mask} == {mask}")
+            body += ["    if hit:", f"        fired.append(_fired_rules[{n}])"]
+        source = "\n".join(["def evaluate(f):"] + body + ["    return fired", ""])
+        exec(compile(source, f"<rules:{self.code}:ordered>", "exec"), env)
+        return env["evaluate"]
+
+
+class CompiledRules:
+    """编译后的完整规则表"""
+
+    def __init__(self, leagues, groups, fingerprint=None, table=None):
+        self.leagues = leagues
+        self.groups = groups
+        # 规则表内容的摘要, 用于判断持久化的缓存等是否仍然有效
+        self.fingerprint = fingerprint
+        # 编译所用的规则表定义 (已并入注册的联赛), 多进程分析时交给工作进程重新编译
+        self.table = table
+        rules = {}
+        for league in leagues.values():
+            for rule in league.rules:
+                rules.setdefault(rule.rule_id, rule)
+        self.rule_ids = tuple(rules)
+        self.directions = {rule_id: rule.direction for rule_id, rule in rules.items()}
+
+    def league_names(self):
+        """联赛代码 -> 联赛名称"""
+        return {code: league.name for code, league in self.leagues.items()}
+
+    def league_codes(self, group):
+        """某一分组下的联赛代码"""
+        return [code for code, league in self.leagues.items() if league.group == group]
+
+    def evaluate(self, league_code, features):
+        """返回触发的规则编号"""
+        return [rule.rule_id for rule in self.leagues[league_code].evaluate(features)]
+
+    def messages(self, league_code, features):
+        """返回触发规则的说明文字"""
+        league = self.leagues[league_code]
+        rendered = league.rendered
+        return [rendered[rule.rule_id] for rule in league.evaluate(features)]
+
+    def analyze(self, match_id, league_code, features, odds=None):
+        """返回结构化的分析结果 (result.AnalysisResult)"""
+        league = self.leagues[league_code]
+        return AnalysisResult(match_id, league, league.evaluate(features), odds)
+
+
+def _parse_bounds(atom):
+    op = atom["op"]
+    target = atom["target"]
+    if op == "between":
+        bounds = atom.get("bounds", "[]")
+        if bounds not in ("()", "[)", "(]", "[]"):
+            raise ValueError(f"无效的区间边界: {bounds}")
+        lo, hi = target
+        return float(lo), float(hi), bounds[0] == "[", bounds[1] == "]"
+    inf = float("inf")
+    if op == "<":
+        return -inf, float(target), False, False
+    if op == "<=":
+        return -inf, float(target), False, True
+    if op == ">":
+        return float(target), inf, False, False
+    if op == ">=":
+        return float(target), inf, True, False
+    raise ValueError(f"无效的比较方式: {op}")
+
+
+def _in_interval(x, lo, hi, lo_incl, hi_incl):
+    above = x >= lo if lo_incl else x > lo
+    below = x <= hi if hi_incl else x < hi
+    return above and below
+
+
+def _build_range_index(intervals):
+    """把同一特征上的区间条件编译成有序端点表, 每个区段记录成立的条件"""
+    inf = float("inf")
+    ends = sorted({e for lo, hi, _, _, _ in intervals for e in (lo, hi) if e not in (inf, -inf)})
+    segments = []
+    for seg in range(2 * len(ends) + 1):
+        i, is_point = divmod(seg, 2)
+        if is_point:
+            x = ends[i]
+        elif not ends:
+            x = 0.0
+        elif i == 0:
+            x = ends[0] - 1.0
+        elif i == len(ends):
+            x = ends[-1] + 1.0
+        else:
+            x = (ends[i - 1] + ends[i]) / 2
+        segments.append(tuple(atom for lo, hi, lo_incl, hi_incl, atom in intervals
+                              if _in_interval(x, lo, hi, lo_incl, hi_incl)))
+    return ends, segments
+
+
+def _league_rules(table, code, info):
+    rules = []
+    for set_name in info["rule_sets"]:
+        if set_name not in table["rule_sets"]:
+            raise ValueError(f"联赛 {code} 引用了不存在的规则集: {set_name}")
+        rules.extend(table["rule_sets"][set_name])
+    return rules
+
+
+def compile_league(code, info, rule_defs):
+    """编译单个联赛的规则"""
+    atom_ids = {}
+    intervals = {}
+    eq_values = {}
+    compare_atoms = []
+
+    def atom_id(key):
+        if key not in atom_ids:
+            atom_ids[key] = len(atom_ids)
+        return atom_ids[key]
+
+    def compile_atom(atom):
+        features = atom["feature"]
+        features = tuple(features) if isinstance(features, list) else (features,)
+        for feature in features:
+            if feature not in FEATURES and feature not in _MARKET_FEATURES:
+                raise ValueError(f"未知特征: {feature}")
+        op = atom["op"]
+        target = atom["target"]
+
+        if op == "eq":
+            tol = float(atom["tolerance"])
+            targets = tuple(float(v) for v in (target if isinstance(target, list) else [target]))
+            key = ("eq", features, targets, tol)
+            if key not in atom_ids:
+                aid = atom_id(key)
+                for feature in features:
+                    for v in targets:
+                        eq_values.setdefault((feature, tol), {}).setdefault(v, set()).add(aid)
+            return atom_ids[key]
+
+        if op in COMPARE_OPS and isinstance(target, str):
+            if target not in FEATURES and target not in _MARKET_FEATURES:
+                raise ValueError(f"未知特征: {target}")
+            if len(features) != 1:
+                raise ValueError("特征之间的比较只支持单个特征")
+            key = ("cmp", features[0], op, target)
+            if key not in atom_ids:
+                compare_atoms.append((features[0], op, target, atom_id(key)))
+            return atom_ids[key]
+
+        bounds = _parse_bounds(atom)
+        key = ("range", features, bounds)
+        if key not in atom_ids:
+            aid = atom_id(key)
+            for feature in features:
+                intervals.setdefault(feature, []).append(bounds + (aid,))
+        return atom_ids[key]
+
+    rules = []
+    for rule in rule_defs:
+        direction = rule.get("direction")
+        if direction not in DIRECTIONS:
+            raise ValueError(f"规则 {rule['id']} 的方向无效: {direction}")
+        clauses = tuple(tuple(sorted({compile_atom(atom) for atom in clause})) for clause in rule["when"])
+        rules.append(CompiledRule(rule["id"], direction, rule["message"], clauses))
+
+    range_index = []
+    for feature, feature_intervals in intervals.items():
+        ends, segments = _build_range_index(feature_intervals)
+        range_index.append((feature, ends, segments))
+
+    eq_index = []
+    for (feature, tol), by_value in eq_values.items():
+        values = sorted(by_value)
+        eq_index.append((feature, tol, values, [tuple(sorted(by_value[v])) for v in values]))
+
+    return CompiledLeague(code, info["name"], info.get("group"), tuple(rules), len(atom_ids),
+                          range_index, eq_index, compare_atoms, info, tuple(rule_defs))
+
+
+# 插件注册的联赛: 代码 -> (联赛信息, 规则定义列表)
+_registered_leagues = {}
+
+
+def register_league(code, name, group, rules=(), rule_sets=()):
+    """
+    注册额外的联赛 (插件), 不需要修改 rules.json
+    rules: 该联赛专用的规则定义 (rules.json 规则集中的格式); rule_sets: 同时使用的已有规则集, 例如 ("general",)
+    之后编译的规则表 (load_rules / default_rules) 都包含该联赛, 代码与已有联赛相同时取代原联赛;
+    已创建的 FootballPredictionSystem 不受影响
+    """
+    global _default_rules
+    code = str(code)
+    if not code.isdigit() or int(code) > 127:
+        raise ValueError(f"联赛代码须为 0-127 的整数: {code}")
+    rules = [dict(rule) for rule in rules]
+    # 先单独编译一次, 规则定义有误时在注册时报错
+    compile_league(code, {"name": name, "group": group}, rules)
+    _registered_leagues[code] = ({"name": name, "group": group, "rule_sets": list(rule_sets)}, rules)
+    _default_rules = None
+
+
+def unregister_league(code):
+    """取消注册的联赛"""
+    global _default_rules
+    if _registered_leagues.pop(str(code), None) is not None:
+        _default_rules = None
+
+
+def _with_registered_leagues(table):
+    """把注册的联赛并入规则表 (不修改原表), 每个联赛的专用规则作为单独的规则集"""
+    if not _registered_leagues:
+        return table
+    table = dict(table, leagues=dict(table["leagues"]), rule_sets=dict(table["rule_sets"]))
+    for code, (info, rules) in _registered_leagues.items():
+        set_name = f"plugin:{code}"
+        table["rule_sets"][set_name] = rules
+        table["leagues"][code] = dict(info, rule_sets=info["rule_sets"] + [set_name])
+        if table.get("groups") and info["group"] not in table["groups"]:
+            table["groups"] = table["groups"] + [info["group"]]
+    return table
+
+
+def compile_rule_table(table, registered=True):
+    """
+    编译整张规则表 (包含 register_league 注册的联赛)
+    registered=False 时不再并入注册的联赛 (table 为 CompiledRules.table 时使用)
+    """
+    if registered:
+        table = _with_registered_leagues(table)
+    leagues = {}
+    for code, info in table["leagues"].items():
+        leagues[code] = compile_league(code, info, _league_rules(table, code, info))
+    groups = table.get("groups") or list(dict.fromkeys(league.group for league in leagues.values()))
+    canonical = json.dumps(table, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return CompiledRules(leagues, groups, hashlib.sha256(canonical).hexdigest()[:16], table)
+
+
+def load_rules(path=None):
+    """读取并编译规则表文件"""
+    with open(path or RULES_PATH, encoding="utf-8") as f:
+        return compile_rule_table(json.load(f))
+
+
+_default_rules = None
+
+
+def default_rules():
+    """默认规则表 (首次使用时编译)"""
+    global _default_rules
+    if _default_rules is None:
+        _default_rules = load_rules()
+    return _default_rules
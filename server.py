@@ -0,0 +1,283 @@
+"""
+分析服务 (asyncio HTTP/JSON)
+
+python main.py --serve 在本机启动 HTTP 服务, 多个客户端可以同时提交比赛:
+
+    POST /analyze        {"match_id": "J1-001", "league": "9", "am": [...], "wl": [...], "hg": [...],
+                          "markets": {...}}  (盘口可选, 格式同 --ingest 的 JSONL, 见 ingest.py)
+                         -> {"match_id", "league", "rules", "verdict"}  ("text": true 时附带报告文本)
+    POST /analyze/batch  {"matches": [{...}, ...]} -> {"results": [...]}
+    GET  /stats          请求数、批次数、延迟 p50/p99
+
+短时间窗口 (默认 2 毫秒) 内到达的 /analyze 请求合并为一批统一求值; 批量较大时使用
+FootballPredictionSystem.analyze_batch (numpy), 较小时逐场使用同一规则表。
+连接默认保持 (HTTP/1.1 keep-alive)。
+"""
+
+import asyncio
+import json
+import sys
+import time
+from collections import deque
+
+from ingest import parse_markets, parse_record
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+DEFAULT_WINDOW = 0.002
+MAX_BATCH = 4096
+# 批量不小于此值时使用 numpy 批量引擎
+VECTOR_THRESHOLD = 64
+LATENCY_SAMPLES = 100000
+MAX_BODY = 64 * 1024 * 1024
+
+_MISSING = (float("nan"),) * 3
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large"}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class LatencyStats:
+    """最近若干次请求的延迟统计"""
+
+    def __init__(self, size=LATENCY_SAMPLES):
+        self.samples = deque(maxlen=size)
+        self.requests = 0
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+        self.requests += 1
+
+    def percentile(self, q):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+    def summary(self):
+        return {
+            "requests": self.requests,
+            "p50_ms": self.percentile(50) * 1000,
+            "p99_ms": self.percentile(99) * 1000,
+        }
+
+
+class Coalescer:
+    """把窗口期内到达的单场分析请求合并为一批"""
+
+    def __init__(self, analyze, window=DEFAULT_WINDOW, max_batch=MAX_BATCH):
+        self.analyze = analyze
+        self.window = window
+        self.max_batch = max_batch
+        self.pending = []
+        self.timer = None
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, parsed):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((parsed, future))
+        if len(self.pending) >= self.max_batch:
+            self.flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(self.window, self.flush)
+        return future
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        pending, self.pending = self.pending, []
+        if not pending:
+            return
+        self.batches += 1
+        self.items += len(pending)
+        try:
+            results = self.analyze([parsed for parsed, _ in pending])
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(pending, results):
+            if not future.done():
+                future.set_result(result)
+
+
+class AnalysisServer:
+    """
+    分析服务
+    system: FootballPredictionSystem
+    window: 请求合并窗口 (秒)
+    """
+
+    def __init__(self, system, window=DEFAULT_WINDOW):
+        self.system = system
+        self.coalescer = Coalescer(self.analyze_parsed, window)
+        self.latency = LatencyStats()
+        self.connections = 0
+
+    def analyze_one(self, parsed):
+        """单场分析 (FootballPredictionSystem.analyze_odds, 与 analyze_match_result 共用分析缓存)"""
+        return self.system.analyze_odds(*parsed[:5], markets=parsed[7])
+
+    def analyze_parsed(self, parsed):
+        """分析 _parse 结果列表, 返回结果字典列表"""
+        if len(parsed) < VECTOR_THRESHOLD:
+            return [self.analyze_one(row).to_dict() for row in parsed]
+        import numpy as np
+
+        # 盘口按列组成 (N, 3) 数组, 没有该盘口的行为 NaN
+        columns = sorted({column for row in parsed if row[7] for column in row[7]})
+        markets = {column: np.array([(row[7] or {}).get(column) or _MISSING for row in parsed], dtype=np.float64)
+                   for column in columns}
+        batch = self.system.analyze_batch(np.array([row[2] for row in parsed]),
+                                          np.array([row[3] for row in parsed]),
+                                          np.array([row[4] for row in parsed]),
+                                          [row[1] for row in parsed], markets=markets or None)
+        labels = batch.verdict_labels().tolist()
+        return [{"match_id": row[0], "league": row[1], "rules": rules, "verdict": label}
+                for row, rules, label in zip(parsed, batch.rule_lists(), labels)]
+
+    def _parse(self, record):
+        if not isinstance(record, dict):
+            raise HttpError(400, "比赛数据必须为 JSON 对象")
+        if record.get("match_id") in (None, ""):
+            # 编号只用于回显, 可以省略
+            record = dict(record, match_id="-")
+        try:
+            parsed = parse_record(record, self.system.leagues)
+            markets = parse_markets(record.get("markets"))
+        except (ValueError, TypeError) as e:
+            raise HttpError(400, str(e)) from None
+        # parse_record 的结果之后附上盘口
+        return parsed + (markets,)
+
+    async def handle_analyze(self, payload):
+        parsed = self._parse(payload)
+        if payload.get("text"):
+            result = self.analyze_one(parsed)
+            return dict(result.to_dict(), text=result.render())
+        return await self.coalescer.submit(parsed)
+
+    async def handle_batch(self, payload):
+        matches = payload.get("matches") if isinstance(payload, dict) else None
+        if not isinstance(matches, list):
+            raise HttpError(400, "请求体须包含 matches 数组")
+        parsed = [self._parse(record) for record in matches]
+        return {"results": self.analyze_parsed(parsed) if parsed else []}
+
+    def stats(self):
+        stats = self.latency.summary()
+        stats.update(batches=self.coalescer.batches,
+                     mean_batch=self.coalescer.items / self.coalescer.batches if self.coalescer.batches else 0.0,
+                     connections=self.connections)
+        return stats
+
+    async def dispatch(self, method, path, body):
+        if path == "/stats":
+            if method != "GET":
+                raise HttpError(405, "只支持 GET")
+            return self.stats()
+        if path not in ("/analyze", "/analyze/batch"):
+            raise HttpError(404, f"未知路径: {path}")
+        if method != "POST":
+            raise HttpError(405, "只支持 POST")
+        try:
+            payload = json.loads(body or b"null")
+        except ValueError as e:
+            raise HttpError(400, f"JSON格式错误: {e}") from None
+        if path == "/analyze":
+            return await self.handle_analyze(payload)
+        return await self.handle_batch(payload)
+
+    async def handle_connection(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    await self._respond(writer, 413, {"error": "请求头过长"}, False)
+                    break
+                started = time.perf_counter()
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, path, version = lines[0].split(" ", 2)
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "无效的请求行"}, False)
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(":")
+                    if name:
+                        headers[name.strip().lower()] = value.strip()
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+                try:
+                    length = int(headers.get("content-length") or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self._respond(writer, 400, {"error": "无效的 Content-Length"}, False)
+                    break
+                if length > MAX_BODY:
+                    await self._respond(writer, 413, {"error": "请求体过大"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                try:
+                    status, data = 200, await self.dispatch(method, path.split("?", 1)[0], body)
+                except HttpError as e:
+                    status, data = e.status, {"error": str(e)}
+                await self._respond(writer, status, data, keep_alive)
+                self.latency.record(time.perf_counter() - started)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def _respond(self, writer, status, data, keep_alive):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, ready=None):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        if ready is not None:
+            ready(server)
+        async with server:
+            await server.serve_forever()
+
+
+def run(system, host=DEFAULT_HOST, port=DEFAULT_PORT, window=DEFAULT_WINDOW):
+    """启动服务, Ctrl+C 退出时打印延迟统计"""
+    app = AnalysisServer(system, window)
+
+    def ready(server):
+        address = server.sockets[0].getsockname()
+        print(f"分析服务已启动: http://{address[0]}:{address[1]} (POST /analyze, /analyze/batch; GET /stats)",
+              file=sys.stderr)
+
+    try:
+        asyncio.run(app.serve(host, port, ready))
+    except KeyboardInterrupt:
+        pass
+    stats = app.stats()
+    print(f"共处理 {stats['requests']} 个请求, p50 {stats['p50_ms']:.2f}ms, p99 {stats['p99_ms']:.2f}ms, "
+          f"平均每批 {stats['mean_batch']:.1f} 场", file=sys.stderr)
+    return stats
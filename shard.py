@@ -0,0 +1,456 @@
+"""
+按联赛分片的多节点分析
+
+各联赛的规则互不相关, 可以把联赛分组交给不同的进程或机器 (例如亚洲联赛 9/10/11 一个节点,
+五大联赛另一个节点):
+
+- ShardWorker: 工作节点, 在 TCP 端口上接受批量分析请求, 可以只负责部分联赛
+- ShardRouter: 把每个联赛固定路由到一个节点 (显式分配, 其余联赛用一致性哈希, 增减节点时
+  只有少数联赛改变归属), 按节点拆分批量请求并发发送, 结果按输入顺序合并为 BatchResult,
+  与本机 analyze_batch 相同
+- LocalCluster: 在本机启动若干工作进程, 用于测试或单机多核
+
+协议 (小端):
+    帧头: b"FPSH", 类型 (u8), 保留 (u8, u16), 数据长度 (u64), 其后为数据
+    HELLO    请求无数据; 回复 JSON {"fingerprint", "leagues", "rules"}, 路由器据此确认规则表一致
+    ANALYZE  请求: 场数 n (u32), 联赛代码 i1[n], 澳门/威廉希尔/皇冠赔率 f8[n, 3];
+             回复: 场数 n (u32), 规则数 r (u16), 判断代码 i1[n], 触发矩阵按行 packbits 的 u1[n, ceil(r/8)]
+    ERROR    回复 UTF-8 错误信息
+
+工作节点命令行:
+    python shard.py --port 9001 --leagues 9,10,11
+"""
+
+import argparse
+import json
+import socket
+import socketserver
+import struct
+import subprocess
+import sys
+import threading
+import zlib
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from batch import BatchResult, as_odds, compute_features, compute_verdicts, evaluate_rules, to_league_codes, vector_rules
+from rule_engine import default_rules, load_rules
+
+MAGIC = b"FPSH"
+HELLO = 1
+ANALYZE = 2
+ERROR = 3
+
+_FRAME = struct.Struct("<4sBBHQ")
+_REQUEST = struct.Struct("<I")
+_REPLY = struct.Struct("<IH")
+
+DEFAULT_HOST = "127.0.0.1"
+# 单个请求的最大场数, 超出时按块依次发送
+MAX_BATCH = 65536
+# 一致性哈希中每个节点的虚拟节点数
+VIRTUAL_NODES = 64
+DEFAULT_TIMEOUT = 60.0
+
+
+class ShardError(Exception):
+    """工作节点返回错误或连接失败"""
+
+
+def parse_endpoint(endpoint):
+    """"host:port" -> (host, port)"""
+    host, sep, port = endpoint.rpartition(":")
+    if not sep or not port.isdigit():
+        raise ValueError(f"无效的节点地址: {endpoint}")
+    return host or DEFAULT_HOST, int(port)
+
+
+def parse_shard_spec(specs):
+    """
+    命令行节点列表 ["host:port=9,10,11", "host:port", ...] -> (节点列表, {节点: 联赛代码列表})
+    未写联赛的节点只通过一致性哈希分配
+    """
+    endpoints, assignments = [], {}
+    for spec in specs:
+        endpoint, _, codes = spec.partition("=")
+        parse_endpoint(endpoint)
+        endpoints.append(endpoint)
+        if codes:
+            assignments[endpoint] = [code.strip() for code in codes.split(",") if code.strip()]
+    return endpoints, assignments
+
+
+def _recv_exact(sock, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if not count:
+            raise ConnectionError("连接已关闭")
+        received += count
+    return buffer
+
+
+def _frame(kind, payload=b""):
+    return _FRAME.pack(MAGIC, kind, 0, 0, len(payload)) + payload
+
+
+def _read_frame(read):
+    """read(n) 读取恰好 n 字节, 返回 (类型, 数据)"""
+    magic, kind, _, _, size = _FRAME.unpack(read(_FRAME.size))
+    if magic != MAGIC:
+        raise ConnectionError("协议错误")
+    return kind, read(size)
+
+
+def encode_request(codes, am, wl, hg):
+    n = len(codes)
+    return b"".join([_REQUEST.pack(n), np.ascontiguousarray(codes, dtype=np.int8).tobytes()]
+                    + [np.ascontiguousarray(odds, dtype="<f8").tobytes() for odds in (am, wl, hg)])
+
+
+def decode_request(payload):
+    (n,) = _REQUEST.unpack_from(payload)
+    offset = _REQUEST.size
+    if len(payload) != offset + 73 * n:
+        raise ValueError("请求长度与场数不一致")
+    codes = np.frombuffer(payload, dtype=np.int8, count=n, offset=offset)
+    offset += n
+    odds = []
+    for _ in range(3):
+        odds.append(np.frombuffer(payload, dtype="<f8", count=3 * n, offset=offset).reshape(n, 3))
+        offset += 24 * n
+    return codes, odds[0], odds[1], odds[2]
+
+
+def encode_reply(fired, verdicts):
+    return (_REPLY.pack(len(verdicts), fired.shape[1]) + np.ascontiguousarray(verdicts, dtype=np.int8).tobytes()
+            + np.packbits(fired, axis=1).tobytes())
+
+
+def decode_reply(payload):
+    n, n_rules = _REPLY.unpack_from(payload)
+    offset = _REPLY.size
+    verdicts = np.frombuffer(payload, dtype=np.int8, count=n, offset=offset)
+    packed = np.frombuffer(payload, dtype=np.uint8, offset=offset + n).reshape(n, -1)
+    fired = np.unpackbits(packed, axis=1, count=n_rules).astype(bool)
+    return fired, verdicts
+
+
+class _ThreadingServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class ShardWorker:
+    """
+    工作节点
+    rules: 编译后的规则表 (须与路由器相同); leagues: 负责的联赛代码, None 表示全部
+    """
+
+    def __init__(self, rules=None, leagues=None):
+        self.rules = rules or default_rules()
+        self.vector = vector_rules(self.rules)
+        codes = list(self.vector.leagues) if leagues is None else [int(code) for code in leagues]
+        self.leagues = sorted(str(code) for code in codes)
+        self.accepted = np.zeros(256, dtype=bool)
+        self.accepted[np.array(codes, dtype=np.int64) % 256] = True
+        self.requests = 0
+        self.matches = 0
+
+    def hello(self):
+        return {"fingerprint": self.rules.fingerprint, "leagues": self.leagues, "rules": list(self.vector.rule_ids)}
+
+    def analyze(self, payload):
+        """处理一个 ANALYZE 请求, 返回回复数据"""
+        codes, am, wl, hg = decode_request(payload)
+        rejected = ~self.accepted[codes.astype(np.uint8)]
+        if rejected.any():
+            raise ValueError(f"本节点不负责联赛 {int(codes[np.argmax(rejected)])}")
+        fired = evaluate_rules(compute_features(am, wl, hg), codes, self.rules)
+        self.requests += 1
+        self.matches += len(codes)
+        return encode_reply(fired, compute_verdicts(fired, self.rules))
+
+    def handle(self, kind, payload):
+        """返回 (回复类型, 回复数据)"""
+        try:
+            if kind == HELLO:
+                return HELLO, json.dumps(self.hello(), ensure_ascii=False).encode("utf-8")
+            if kind == ANALYZE:
+                return ANALYZE, self.analyze(payload)
+            raise ValueError(f"未知的请求类型: {kind}")
+        except (ValueError, KeyError) as e:
+            return ERROR, str(e).encode("utf-8")
+
+    def server(self, host=DEFAULT_HOST, port=0):
+        """创建 TCP 服务 (每个连接一个线程), 调用 serve_forever() 开始服务"""
+        worker = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def setup(self):
+                super().setup()
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def handle(self):
+                read = self.rfile.read
+                while True:
+                    try:
+                        kind, payload = _read_frame(read)
+                    except (ConnectionError, struct.error):
+                        return
+                    self.wfile.write(_frame(*worker.handle(kind, payload)))
+
+        return _ThreadingServer((host, port), Handler)
+
+
+class HashRing:
+    """一致性哈希环 (crc32, 各进程结果相同)"""
+
+    def __init__(self, endpoints, replicas=VIRTUAL_NODES):
+        points = sorted((zlib.crc32(f"{endpoint}#{i}".encode()), endpoint)
+                        for endpoint in endpoints for i in range(replicas))
+        self.keys = [key for key, _ in points]
+        self.endpoints = [endpoint for _, endpoint in points]
+
+    def route(self, key):
+        if not self.keys:
+            raise ValueError("没有可用的工作节点")
+        i = bisect_left(self.keys, zlib.crc32(f"league:{key}".encode()))
+        return self.endpoints[i % len(self.endpoints)]
+
+
+class _Connection:
+    def __init__(self, endpoint, timeout):
+        self.endpoint = endpoint
+        self.sock = socket.create_connection(parse_endpoint(endpoint), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.lock = threading.Lock()
+
+    def call(self, kind, payload=b""):
+        self.sock.sendall(_frame(kind, payload))
+        reply, data = _read_frame(lambda size: _recv_exact(self.sock, size))
+        if reply == ERROR:
+            raise ShardError(f"{self.endpoint}: {bytes(data).decode('utf-8')}")
+        if reply != kind:
+            raise ShardError(f"{self.endpoint}: 回复类型错误")
+        return data
+
+    def close(self):
+        self.sock.close()
+
+
+class ShardRouter:
+    """
+    按联赛路由到工作节点
+    endpoints: 节点地址列表 ["host:port", ...]
+    assignments: {节点: 联赛代码列表}, 显式分配; 其余联赛按一致性哈希分配到没有显式分配的节点
+    rules: 规则表 (默认 rules.json), 连接时与各节点核对指纹
+    """
+
+    def __init__(self, endpoints, assignments=None, rules=None, max_batch=MAX_BATCH, timeout=DEFAULT_TIMEOUT):
+        self.rules = rules or default_rules()
+        self.vector = vector_rules(self.rules)
+        self.endpoints = list(dict.fromkeys(list(endpoints) + list(assignments or {})))
+        if not self.endpoints:
+            raise ValueError("没有可用的工作节点")
+        self.assignments = {}
+        for endpoint, codes in (assignments or {}).items():
+            for code in codes:
+                code = str(code)
+                if code not in self.rules.leagues:
+                    raise ValueError(f"无效的联赛代码: {code}")
+                if self.assignments.setdefault(code, endpoint) != endpoint:
+                    raise ValueError(f"联赛 {code} 同时分配给了多个节点")
+        # 其余联赛只分配给没有显式分配的节点 (全部节点都有分配时用全部节点)
+        self.ring = HashRing([endpoint for endpoint in self.endpoints if endpoint not in (assignments or {})]
+                             or self.endpoints)
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self._connections = {}
+        self._lock = threading.Lock()
+        self._pool = None
+        # 联赛代码 (int8) -> 节点下标
+        self._slots = np.full(256, -1, dtype=np.int64)
+        for code, endpoint in self.routes().items():
+            self._slots[int(code) % 256] = self.endpoints.index(endpoint)
+
+    def route(self, league_code):
+        """联赛所在的节点"""
+        league_code = str(league_code)
+        return self.assignments.get(league_code) or self.ring.route(league_code)
+
+    def routes(self):
+        """{联赛代码: 节点}"""
+        return {code: self.route(code) for code in self.rules.leagues}
+
+    def _connection(self, endpoint):
+        with self._lock:
+            connection = self._connections.get(endpoint)
+        if connection is not None:
+            return connection
+        try:
+            connection = _Connection(endpoint, self.timeout)
+            info = json.loads(bytes(connection.call(HELLO)))
+        except OSError as e:
+            raise ShardError(f"{endpoint}: 无法连接 ({e})") from None
+        if info["fingerprint"] != self.rules.fingerprint or tuple(info["rules"]) != self.vector.rule_ids:
+            connection.close()
+            raise ShardError(f"{endpoint}: 规则表与本机不一致")
+        missing = [code for code, target in self.routes().items() if target == endpoint and code not in info["leagues"]]
+        if missing:
+            connection.close()
+            raise ShardError(f"{endpoint}: 节点不负责路由给它的联赛 {', '.join(missing)}")
+        with self._lock:
+            self._connections[endpoint] = connection
+        return connection
+
+    def connect(self):
+        """连接并核对全部节点 (否则在首次请求时连接)"""
+        for endpoint in self.endpoints:
+            self._connection(endpoint)
+        return self
+
+    def _drop(self, endpoint):
+        with self._lock:
+            connection = self._connections.pop(endpoint, None)
+        if connection is not None:
+            connection.close()
+
+    def _analyze_on(self, endpoint, rows, codes, am, wl, hg, fired, verdicts):
+        connection = self._connection(endpoint)
+        with connection.lock:
+            try:
+                for start in range(0, len(rows), self.max_batch):
+                    part = rows[start:start + self.max_batch]
+                    reply = connection.call(ANALYZE, encode_request(codes[part], am[part], wl[part], hg[part]))
+                    fired[part], verdicts[part] = decode_reply(reply)
+            except OSError as e:
+                self._drop(endpoint)
+                raise ShardError(f"{endpoint}: 连接中断 ({e})") from None
+
+    def analyze(self, am_odds, wl_odds, hg_odds, leagues):
+        """
+        批量分析, 参数与 analyze_batch 相同, 返回按输入顺序合并的 BatchResult
+        各节点的请求并发进行
+        """
+        am = as_odds(am_odds, "澳门")
+        wl = as_odds(wl_odds, "威廉希尔")
+        hg = as_odds(hg_odds, "皇冠")
+        codes = to_league_codes(leagues, self.vector.leagues)
+        if not (len(am) == len(wl) == len(hg) == len(codes)):
+            raise ValueError("赔率数组与联赛代码长度不一致")
+        fired = np.zeros((len(codes), len(self.vector.rule_ids)), dtype=bool)
+        verdicts = np.zeros(len(codes), dtype=np.int8)
+        slots = self._slots[codes.astype(np.uint8)]
+        tasks = []
+        for k, endpoint in enumerate(self.endpoints):
+            rows = np.flatnonzero(slots == k)
+            if len(rows):
+                tasks.append((endpoint, rows))
+        if len(tasks) == 1:
+            self._analyze_on(*tasks[0], codes, am, wl, hg, fired, verdicts)
+        elif tasks:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=len(self.endpoints))
+            futures = [self._pool.submit(self._analyze_on, endpoint, rows, codes, am, wl, hg, fired, verdicts)
+                       for endpoint, rows in tasks]
+            for future in futures:
+                future.result()
+        return BatchResult(fired, verdicts, self.vector.rule_ids)
+
+    def close(self):
+        for endpoint in list(self._connections):
+            self._drop(endpoint)
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class LocalCluster:
+    """
+    在本机启动工作进程 (python shard.py --port 0), 端口由系统分配
+    workers: 进程数; leagues: 每个进程负责的联赛代码列表 (给出时进程数为其长度)
+    endpoints / assignments 可直接传给 ShardRouter
+    """
+
+    def __init__(self, workers=2, leagues=None, rules_path=None, host=DEFAULT_HOST):
+        groups = list(leagues) if leagues is not None else [None] * workers
+        self.processes = []
+        self.endpoints = []
+        self.assignments = {}
+        try:
+            for group in groups:
+                command = [sys.executable, __file__, "--host", host, "--port", "0"]
+                if group is not None:
+                    command += ["--leagues", ",".join(str(code) for code in group)]
+                if rules_path:
+                    command += ["--rules", rules_path]
+                process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+                self.processes.append(process)
+                # 第一行输出为实际监听的地址
+                line = process.stdout.readline().split()
+                if len(line) != 2 or line[0] != "listening":
+                    raise ShardError("工作进程启动失败")
+                self.endpoints.append(line[1])
+                if group is not None:
+                    self.assignments[line[1]] = [str(code) for code in group]
+        except BaseException:
+            self.close()
+            raise
+
+    def router(self, rules=None, **kwargs):
+        return ShardRouter(self.endpoints, self.assignments, rules, **kwargs)
+
+    def close(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.wait()
+            process.stdout.close()
+        self.processes = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="按联赛分片的分析工作节点")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="监听地址")
+    parser.add_argument("--port", type=int, default=9001, help="监听端口 (0 为系统分配)")
+    parser.add_argument("--leagues", help="负责的联赛代码, 逗号分隔 (默认全部)")
+    parser.add_argument("--rules", metavar="PATH", help="规则表文件 (默认 rules.json)")
+    args = parser.parse_args(argv)
+
+    rules = load_rules(args.rules) if args.rules else default_rules()
+    leagues = None
+    if args.leagues:
+        leagues = [code.strip() for code in args.leagues.split(",") if code.strip()]
+        invalid = [code for code in leagues if code not in rules.leagues]
+        if invalid:
+            parser.error(f"无效的联赛代码: {', '.join(invalid)}")
+    server = ShardWorker(rules, leagues).server(args.host, args.port)
+    host, port = server.server_address[:2]
+    print(f"listening {host}:{port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+系统状态快照与追加日志
+
+快照把 MatchStore 的各列按原始字节写出, 载入时直接 frombytes 还原, 不经过逐场的
+Python 对象转换, 百万场比赛的载入时间主要是重建 编号 -> 行号 字典。两次快照之间的
+add_match / update_odds 以定长二进制记录追加到日志文件, 重启时载入快照后只重放日志尾部。
+
+快照文件 (.fps):
+    32 字节文件头: b"FPSS", 版本 (u16), 盘口位图 (u16), 数据 CRC32 (u32), 比赛数 (u64), 快照标识 (u64)
+    codes   i1[N]      联赛代码
+    has_lb  i1[N]      是否有立博赔率
+    am/wl/hg/lb  f8[3N]  各公司赔率 (小端)
+    盘口    f8[3N]     位图中的各盘口 (按 MARKET_COLUMNS 顺序, 第 i 位对应第 i 个盘口)
+    ids     UTF-8      比赛编号, 以 \\0 分隔
+    版本 1 的快照没有盘口, 位图为 0, 仍可读取
+
+日志文件 (.fps.journal):
+    16 字节文件头: b"FPSJ", 版本 (u16), 保留 (u16), 快照标识 (u64)
+    记录: 类型 (u8), 联赛代码/公司 (i1), 是否有立博赔率 (u8), 编号字节数 (u16), 赔率个数 (u8),
+          CRC32 (u32, 覆盖前面各字段和其后的数据), 赔率 f8[...], 编号
+    类型 1 为添加比赛 (12 个赔率), 类型 2 为更新某公司赔率 (3 个赔率),
+    类型 3 为设置盘口 (联赛代码/公司 一栏为盘口在 MARKET_COLUMNS 中的序号, 3 个值)
+    带盘口的 add_match 写一条类型 1 记录, 再为每个盘口写一条类型 3 记录
+
+日志文件头中的快照标识与快照不一致时 (例如写完新快照后尚未重置日志就崩溃) 不重放;
+末尾不完整或校验失败的记录视为崩溃时未写完, 重放到此为止并截掉; 校验通过却无法识别的记录
+不是崩溃造成的, 载入时报错而不截断。日志每条记录写入后
+立即交给操作系统 (进程崩溃不丢数据), 不做 fsync。
+"""
+
+import os
+import struct
+import sys
+import zlib
+from array import array
+
+from markets import MARKET_COLUMNS
+from match_store import BOOKMAKERS, MatchStore
+
+MAGIC = b"FPSS"
+JOURNAL_MAGIC = b"FPSJ"
+VERSION = 2
+# 可以读取的快照版本
+VERSIONS = (1, 2)
+# 日志格式未变 (只增加了记录类型), 版本保持为 1, 已有的日志照常重放
+JOURNAL_VERSION = 1
+
+_HEADER = struct.Struct("<4sHHIQQ")
+_JOURNAL_HEADER = struct.Struct("<4sHHQ")
+_RECORD_PREFIX = struct.Struct("<BbBHB")
+_RECORD = struct.Struct("<BbBHBI")
+
+OP_ADD = 1
+OP_ODDS = 2
+OP_MARKET = 3
+
+_MISSING = (float("nan"),) * 3
+
+
+def journal_path(path):
+    return path + ".journal"
+
+
+def _little_endian(values):
+    """array('d') 转小端字节 (大端机器上先交换字节序)"""
+    if sys.byteorder == "big":
+        values = array("d", values)
+        values.byteswap()
+    return values
+
+
+def save_snapshot(store, path):
+    """
+    写入快照 (先写临时文件再替换), 返回快照标识
+    比赛编号须为不含 \\0 的字符串
+    """
+    ids = list(store.index)
+    for match_id in ids:
+        if not isinstance(match_id, str) or "\0" in match_id:
+            raise ValueError(f"快照只支持不含 \\0 的字符串编号: {match_id!r}")
+    blob = "\0".join(ids).encode("utf-8")
+    markets = [column for column in MARKET_COLUMNS if column in store.markets]
+    mask = sum(1 << MARKET_COLUMNS.index(column) for column in markets)
+    sections = [store.codes, store.has_lb] + [_little_endian(store.columns[b]) for b in BOOKMAKERS] + \
+        [_little_endian(store.markets[column]) for column in markets] + [blob]
+    crc = 0
+    for section in sections:
+        crc = zlib.crc32(section, crc)
+    token = int.from_bytes(os.urandom(8), "little")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, mask, crc, len(ids), token))
+        for section in sections:
+            f.write(section)
+    os.replace(tmp_path, path)
+    return token
+
+
+def load_snapshot(path, leagues):
+    """读取快照, 返回 (MatchStore, 快照标识)"""
+    with open(path, "rb") as f:
+        header = f.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            raise ValueError(f"快照文件不完整: {path}")
+        magic, version, mask, crc, n, token = _HEADER.unpack(header)
+        if magic != MAGIC or version not in VERSIONS or (version == 1 and mask) or mask >> len(MARKET_COLUMNS):
+            raise ValueError(f"不是快照文件或版本不支持: {path}")
+        market_columns = [column for i, column in enumerate(MARKET_COLUMNS) if mask >> i & 1]
+        # 各列直接从文件读入数组, 不经过中间的 bytes 对象
+        try:
+            codes = array("b")
+            codes.fromfile(f, n)
+            has_lb = array("b")
+            has_lb.fromfile(f, n)
+            columns = {}
+            for bookmaker in BOOKMAKERS:
+                column = columns[bookmaker] = array("d")
+                column.fromfile(f, 3 * n)
+            markets = {}
+            for market in market_columns:
+                column = markets[market] = array("d")
+                column.fromfile(f, 3 * n)
+        except EOFError:
+            raise ValueError(f"快照文件不完整: {path}") from None
+        blob = f.read()
+    check = 0
+    for section in [codes, has_lb] + [columns[b] for b in BOOKMAKERS] + list(markets.values()) + [blob]:
+        check = zlib.crc32(section, check)
+    if check != crc:
+        raise ValueError(f"快照校验失败: {path}")
+    if sys.byteorder == "big":
+        for column in list(columns.values()) + list(markets.values()):
+            column.byteswap()
+    ids = blob.decode("utf-8").split("\0") if n else []
+    if len(ids) != n:
+        raise ValueError(f"快照中的比赛编号数与比赛数不一致: {path}")
+    # 删去全部有效代码后剩下的字节即为无效代码
+    invalid = codes.tobytes().translate(None, array("b", [int(code) for code in leagues]).tobytes())
+    if invalid:
+        raise ValueError(f"快照中有无效的联赛代码: {sorted(set(array('b', invalid)))}")
+
+    store = MatchStore(leagues)
+    store.index = dict(zip(ids, range(n)))
+    store.codes = codes
+    store.has_lb = has_lb
+    store.columns = columns
+    store.markets = markets
+    return store, token
+
+
+class Journal:
+    """
+    追加日志
+    path: 日志文件; token: 对应快照的标识
+    reset=True 或原日志属于其他快照时新建 (清空) 日志, 否则在原文件末尾继续追加
+    """
+
+    def __init__(self, path, token, reset=False):
+        self.path = path
+        self.token = token
+        self.records = 0
+        if not reset:
+            try:
+                with open(path, "rb") as f:
+                    header = f.read(_JOURNAL_HEADER.size)
+                reset = (len(header) < _JOURNAL_HEADER.size
+                         or _JOURNAL_HEADER.unpack(header) != (JOURNAL_MAGIC, JOURNAL_VERSION, 0, token))
+            except FileNotFoundError:
+                reset = True
+        if reset:
+            with open(path, "wb") as f:
+                f.write(_JOURNAL_HEADER.pack(JOURNAL_MAGIC, JOURNAL_VERSION, 0, token))
+        self._file = open(path, "ab", buffering=0)
+
+    def _write(self, op, code, flag, match_id, odds):
+        if not isinstance(match_id, str):
+            raise ValueError(f"日志只支持字符串编号: {match_id!r}")
+        encoded = match_id.encode("utf-8")
+        payload = struct.pack(f"<{len(odds)}d", *odds) + encoded
+        crc = zlib.crc32(payload, zlib.crc32(_RECORD_PREFIX.pack(op, code, flag, len(encoded), len(odds))))
+        self._file.write(_RECORD.pack(op, code, flag, len(encoded), len(odds), crc) + payload)
+        self.records += 1
+
+    def add(self, match_id, league_code, am_odds, wl_odds, hg_odds, lb_odds=None, markets=None):
+        odds = (*am_odds, *wl_odds, *hg_odds, *(lb_odds if lb_odds is not None else _MISSING))
+        self._write(OP_ADD, int(league_code), lb_odds is not None, match_id, odds)
+        for column, values in (markets or {}).items():
+            if values is not None:
+                self.set_market(match_id, column, values)
+
+    def set_odds(self, match_id, bookmaker, odds):
+        self._write(OP_ODDS, BOOKMAKERS.index(bookmaker), 1, match_id, tuple(odds))
+
+    def set_market(self, match_id, column, values):
+        self._write(OP_MARKET, MARKET_COLUMNS.index(column), 1, match_id, tuple(values))
+
+    def close(self):
+        self._file.close()
+
+
+def replay_journal(path, token, store):
+    """
+    把日志中的记录应用到 store, 返回应用的记录数
+    日志属于其他快照时返回 0; 末尾不完整或校验失败的记录被截掉, 之后可以继续追加
+    校验通过但无法识别的记录 (未知类型、赔率个数不对、更新不存在的比赛) 抛出 ValueError, 日志不做修改
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return 0
+    if len(data) < _JOURNAL_HEADER.size:
+        return 0
+    magic, version, _, journal_token = _JOURNAL_HEADER.unpack_from(data)
+    if magic != JOURNAL_MAGIC or version != JOURNAL_VERSION or journal_token != token:
+        return 0
+
+    view = memoryview(data)
+    offset = _JOURNAL_HEADER.size
+    applied = 0
+    while offset + _RECORD.size <= len(data):
+        op, code, flag, id_size, n_odds, crc = _RECORD.unpack_from(data, offset)
+        start = offset + _RECORD.size
+        end = start + 8 * n_odds + id_size
+        if end > len(data) or zlib.crc32(view[start:end], zlib.crc32(view[offset:offset + _RECORD_PREFIX.size])) != crc:
+            break
+        odds = struct.unpack_from(f"<{n_odds}d", data, start)
+        match_id = bytes(view[start + 8 * n_odds:end]).decode("utf-8")
+        if op == OP_ADD and n_odds == 12:
+            store.add(match_id, code, odds[0:3], odds[3:6], odds[6:9], odds[9:12] if flag else None)
+        elif op == OP_ODDS and n_odds == 3 and 0 <= code < len(BOOKMAKERS) and match_id in store:
+            store.set_odds(store.row(match_id), BOOKMAKERS[code], odds)
+        elif op == OP_MARKET and n_odds == 3 and 0 <= code < len(MARKET_COLUMNS) and match_id in store:
+            store.set_market(store.row(match_id), MARKET_COLUMNS[code], odds)
+        else:
+            # 校验通过的记录不是崩溃造成的, 不能当作尾部截掉 (会丢掉其后的有效记录)
+            raise ValueError(f"日志 {path} 偏移 {offset} 处的记录无法识别 "
+                             f"(类型 {op}, 代码 {code}, 赔率 {n_odds} 个, 比赛 {match_id!r})")
+        applied += 1
+        offset = end
+    if offset < len(data):
+        # 崩溃时未写完的尾部
+        with open(path, "r+b") as f:
+            f.truncate(offset)
+    return applied
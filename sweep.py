@@ -0,0 +1,486 @@
+"""
+规则阈值扫描
+
+在历史数据上把规则的阈值和容差按网格逐一取值, 统计每组取值的命中率 (precision) 和覆盖率
+(coverage), 给出两者的 Pareto 前沿 (没有另一组取值在两项上都不差且至少一项更好)。
+命中口径与 backtest.py 相同, 规则的含义与 rule_engine 的编译结果逐场一致。
+
+- FeatureCache: 全部历史比赛的规则特征、联赛代码和三个方向的命中/收益, 只计算一次,
+  可以保存为列式 .npz 文件, 之后的扫描直接载入 (历史文件变化后自动重建)
+- 参数: 规则定义中的比较阈值、区间端点 (lo / hi)、单个目标值的等值条件的目标值,
+  以及等值条件的容差; 按位置命名, 例如 when[0][0].lo 为第 0 个条件组第 0 个条件的下端点
+- 网格: 阈值取 当前值 ± span 步 (赔率特征每步 0.02, 差值特征每步 0.01, 盘口线每步 0.25),
+  容差取当前值的 TOLERANCE_FACTORS 倍
+- 历史文件只有胜平负赔率, 盘口特征 (markets.py) 一律为 NaN, 引用它们的条件不成立
+- 求值: 每个条件在各取值下的结果先算成按位打包的掩码 (每场比赛 1 位), 一批组合的规则结果
+  就是这些掩码按组合取出后的位与 / 位或, 触发数和命中数用按位计数得到, 不再逐组合比较
+  浮点特征; 各批在线程池中并行 (numpy 的位运算不持有 GIL)
+"""
+
+import itertools
+import json
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from backtest import DIRECTION_NAMES, HistoryStore, _outcomes
+from batch import compute_features
+from markets import MARKET_FEATURES
+from rule_engine import COMPARE_OPS, FEATURES, _parse_bounds, default_rules
+
+DEFAULT_SPAN = 5
+ODDS_STEP = 0.02
+DIFF_STEP = 0.01
+LINE_STEP = 0.25
+DIFF_FEATURES = ("hg_wl_diff", "wl_hg_diff", "am_wl_diff", "am_wl_gap", "hgd_wld_diff")
+TOLERANCE_FACTORS = (0.5, 0.75, 1.0, 1.5, 2.0, 3.0)
+
+# 单次扫描的组合数上限; 整条规则超出时 sweep_league 改为逐个条件组扫描
+DEFAULT_MAX_COMBINATIONS = 50000
+# 触发次数少于此值的组合不进入前沿 (命中率没有意义)
+DEFAULT_MIN_FIRES = 30
+# 每批求值的组合数
+BATCH_SIZE = 1024
+
+_COMPARE_UFUNCS = {"<": np.less, "<=": np.less_equal, ">": np.greater, ">=": np.greater_equal}
+
+if hasattr(np, "bitwise_count"):
+    _popcount = np.bitwise_count
+else:
+    _POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def _popcount(packed):
+        return _POPCOUNT_TABLE[packed]
+
+
+class FeatureCache:
+    """
+    列式特征缓存
+    features: {特征名: (N,) 数组}; codes: 联赛代码; hits / profit: (N, 3) 各方向的命中与单位注收益
+    """
+
+    def __init__(self, features, codes, hits, profit, source=None):
+        self.features = features
+        self.codes = np.asarray(codes, dtype=np.int8)
+        self.hits = hits
+        self.profit = profit
+        # 生成缓存的历史文件 (路径, 大小, 修改时间), 用于判断缓存是否过期
+        self.source = source
+        self._leagues = {}
+
+    def __len__(self):
+        return len(self.codes)
+
+    @classmethod
+    def from_store(cls, store, source=None):
+        """由 backtest.HistoryStore 计算"""
+        matrix = compute_features(store.am, store.wl, store.hg)
+        hits, profit = _outcomes(store.wl, store.results)
+        return cls({name: matrix[name] for name in FEATURES}, store.codes, hits, profit, source)
+
+    @classmethod
+    def open(cls, history_path, cache_path=None, rules=None):
+        """
+        读取历史 CSV 的特征缓存: cache_path 存在且与历史文件一致时直接载入,
+        否则读取历史文件重新计算 (给出 cache_path 时保存)
+        """
+        st = os.stat(history_path)
+        source = [os.path.abspath(history_path), st.st_size, st.st_mtime_ns]
+        if cache_path and os.path.exists(cache_path):
+            cache = cls.load(cache_path)
+            if cache.source == source:
+                return cache
+        cache = cls.from_store(HistoryStore.from_csv(history_path, rules), source)
+        if cache_path:
+            cache.save(cache_path)
+        return cache
+
+    def save(self, path):
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, codes=self.codes, hits=self.hits, profit=self.profit,
+                 columns=np.array(FEATURES), features=np.stack([self.features[name] for name in FEATURES]),
+                 source=np.array(json.dumps(self.source)))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            columns = data["columns"].tolist()
+            if columns != list(FEATURES):
+                raise ValueError(f"特征缓存的列与当前版本不一致: {path}")
+            matrix = data["features"]
+            return cls(dict(zip(columns, matrix)), data["codes"], data["hits"], data["profit"],
+                       json.loads(str(data["source"])))
+
+    def league(self, code):
+        """某个联赛的比赛 (features, hits, profit), 结果缓存"""
+        code = int(code)
+        if code not in self._leagues:
+            rows = np.flatnonzero(self.codes == code)
+            self._leagues[code] = ({name: column[rows] for name, column in self.features.items()},
+                                   self.hits[rows], self.profit[rows])
+        return self._leagues[code]
+
+
+class Parameter:
+    """可扫描的参数: 规则定义中第 clause 个条件组第 atom 个条件的 field 字段"""
+
+    __slots__ = ("name", "clause", "atom", "field", "value", "grid", "current")
+
+    def __init__(self, clause, atom, field, value, grid):
+        self.name = f"when[{clause}][{atom}].{field}"
+        self.clause = clause
+        self.atom = atom
+        self.field = field
+        self.value = value
+        self.grid = grid
+        self.current = grid.index(value)
+
+
+def _atom_fields(atom):
+    """条件中可扫描的字段 [(字段, 当前值)]"""
+    op = atom["op"]
+    target = atom["target"]
+    if op == "eq":
+        fields = [] if isinstance(target, list) else [("target", float(target))]
+        return fields + [("tolerance", float(atom["tolerance"]))]
+    if op == "between":
+        return [("lo", float(target[0])), ("hi", float(target[1]))]
+    if op in COMPARE_OPS and not isinstance(target, str):
+        return [("target", float(target))]
+    return []
+
+
+def _grid(atom, field, value, span):
+    if field == "tolerance":
+        return sorted({round(value * factor, 10) for factor in TOLERANCE_FACTORS})
+    features = atom["feature"] if isinstance(atom["feature"], list) else [atom["feature"]]
+    if all(feature.endswith("_line") and feature in MARKET_FEATURES for feature in features):
+        step = LINE_STEP
+    else:
+        step = DIFF_STEP if all(feature in DIFF_FEATURES for feature in features) else ODDS_STEP
+    return [round(value + step * k, 10) for k in range(-span, span + 1)]
+
+
+def rule_parameters(rule_def, span=DEFAULT_SPAN):
+    """规则定义中全部可扫描的参数及其网格"""
+    return [Parameter(c, a, field, value, _grid(atom, field, value, span))
+            for c, clause in enumerate(rule_def["when"])
+            for a, atom in enumerate(clause)
+            for field, value in _atom_fields(atom)]
+
+
+def _atom_mask(f, atom, values=None):
+    """单个条件的结果 (布尔数组); values 为替换的字段取值"""
+    values = values or {}
+    features = atom["feature"] if isinstance(atom["feature"], list) else [atom["feature"]]
+    op = atom["op"]
+    target = atom["target"]
+    n = len(next(iter(f.values())))
+    # 缓存中没有的盘口特征为 NaN
+    f = {name: f[name] if name in f else np.full(n, np.nan)
+         for name in features + ([target] if isinstance(target, str) else [])}
+    mask = np.zeros(n, dtype=bool)
+    if op == "eq":
+        tol = values.get("tolerance", float(atom["tolerance"]))
+        targets = [values["target"]] if "target" in values else \
+            [float(v) for v in (target if isinstance(target, list) else [target])]
+        for feature in features:
+            for v in targets:
+                mask |= np.abs(f[feature] - v) < tol
+        return mask
+    if op in COMPARE_OPS and isinstance(target, str):
+        return _COMPARE_UFUNCS[op](f[features[0]], f[target])
+    if op == "between":
+        target = [values.get("lo", target[0]), values.get("hi", target[1])]
+    else:
+        target = values.get("target", target)
+    lo, hi, lo_incl, hi_incl = _parse_bounds(dict(atom, target=target))
+    for feature in features:
+        x = f[feature]
+        mask |= ((x >= lo) if lo_incl else (x > lo)) & ((x <= hi) if hi_incl else (x < hi))
+    return mask
+
+
+class _Plan:
+    """
+    一次扫描的求值计划
+    base: 不含被扫描参数的条件组之或 (打包掩码)
+    clauses: [(固定条件之与, [(该条件各取值的打包掩码, 参数位置, 取值编号的权重)])]
+    """
+
+    def __init__(self, rule_def, params, f):
+        self.params = params
+        self.sizes = np.array([len(p.grid) for p in params], dtype=np.int64)
+        # 组合编号按参数顺序混合进制展开, 第一个参数为最高位
+        self.strides = np.ones(len(params), dtype=np.int64)
+        for k in range(len(params) - 2, -1, -1):
+            self.strides[k] = self.strides[k + 1] * self.sizes[k + 1]
+        self.count = math.prod(self.sizes.tolist())
+        self.current = np.array([p.current for p in params], dtype=np.int64)
+
+        n = len(f[FEATURES[0]])
+        self.base = np.zeros((n + 7) // 8, dtype=np.uint8)
+        self.clauses = []
+        by_atom = {}
+        for k, p in enumerate(params):
+            by_atom.setdefault((p.clause, p.atom), []).append(k)
+        for c, clause in enumerate(rule_def["when"]):
+            fixed = np.ones(n, dtype=bool)
+            swept = []
+            for a, atom in enumerate(clause):
+                positions = by_atom.get((c, a))
+                if not positions:
+                    fixed &= _atom_mask(f, atom)
+                    continue
+                grids = [params[k].grid for k in positions]
+                fields = [params[k].field for k in positions]
+                masks = np.stack([np.packbits(_atom_mask(f, atom, dict(zip(fields, combo))))
+                                  for combo in itertools.product(*grids)])
+                weights = np.ones(len(positions), dtype=np.int64)
+                for j in range(len(positions) - 2, -1, -1):
+                    weights[j] = weights[j + 1] * len(grids[j + 1])
+                swept.append((masks, np.array(positions), weights))
+            if swept:
+                self.clauses.append((None if fixed.all() else np.packbits(fixed), swept))
+            else:
+                self.base |= np.packbits(fixed)
+
+    def indices(self, combos):
+        """组合编号 -> 各参数的取值编号 (B, 参数数)"""
+        return combos[:, None] // self.strides % self.sizes
+
+    def masks(self, combos):
+        """一批组合的规则结果 (B, 打包字节数)"""
+        idx = self.indices(combos)
+        result = np.repeat(self.base[None, :], len(combos), axis=0)
+        for fixed, swept in self.clauses:
+            clause = None
+            for masks, positions, weights in swept:
+                atom = masks[idx[:, positions] @ weights]
+                if clause is None:
+                    clause = atom
+                else:
+                    clause &= atom
+            if fixed is not None:
+                clause &= fixed
+            result |= clause
+        return result
+
+    def values(self, combo):
+        """组合编号 -> {参数名: 取值}"""
+        idx = self.indices(np.array([combo], dtype=np.int64))[0]
+        return {p.name: p.grid[i] for p, i in zip(self.params, idx.tolist())}
+
+
+def pareto_front(fires, hits, changes, min_fires=DEFAULT_MIN_FIRES):
+    """
+    命中率与覆盖率的 Pareto 前沿, 返回组合编号 (按覆盖率从高到低)
+    (触发数, 命中数) 相同的组合只保留改动参数最少的一个
+    """
+    valid = np.flatnonzero(fires >= max(min_fires, 1))
+    if not len(valid):
+        return valid
+    order = valid[np.lexsort((changes[valid], -hits[valid], -fires[valid]))]
+    precision = hits[order] / fires[order]
+    keep = np.ones(len(order), dtype=bool)
+    keep[1:] = precision[1:] > np.maximum.accumulate(precision)[:-1]
+    return order[keep]
+
+
+class SweepResult:
+    """一次扫描的结果: fires / hits 为每个组合的触发数和命中数, front 为前沿上的组合"""
+
+    def __init__(self, league, rule_id, direction, clause, plan, matches, fires, hits, front, baseline, elapsed):
+        self.league = league
+        self.rule_id = rule_id
+        self.direction = direction
+        # 只扫描了这个条件组的参数 (None 为整条规则)
+        self.clause = clause
+        self.params = plan.params
+        self.matches = matches
+        self.fires = fires
+        self.hits = hits
+        self.front = front
+        self.baseline = baseline
+        self.elapsed = elapsed
+
+    @property
+    def combinations(self):
+        return len(self.fires)
+
+    def to_dict(self):
+        return {
+            "league": self.league,
+            "rule": self.rule_id,
+            "direction": self.direction,
+            "clause": self.clause,
+            "matches": self.matches,
+            "combinations": self.combinations,
+            "seconds": round(self.elapsed, 3),
+            "params": [{"name": p.name, "value": p.value, "grid": p.grid} for p in self.params],
+            "baseline": self.baseline,
+            "front": self.front,
+        }
+
+
+def _point(plan, combo, fires, hits, profit, matches):
+    """前沿上一个组合的统计 (ROI 在这里按实际触发的比赛计算)"""
+    mask = np.unpackbits(plan.masks(np.array([combo], dtype=np.int64))[0], count=matches).astype(bool)
+    fires, hits = int(fires), int(hits)
+    return {
+        "params": plan.values(combo),
+        "fires": fires,
+        "coverage": fires / matches if matches else 0.0,
+        "hits": hits,
+        "precision": hits / fires if fires else None,
+        "roi": float(profit[mask].sum() / fires) if fires else None,
+    }
+
+
+def sweep_rule(cache, league_code, rule_id, rules=None, params=None, span=DEFAULT_SPAN,
+               max_combinations=DEFAULT_MAX_COMBINATIONS, min_fires=DEFAULT_MIN_FIRES, workers=None, clause=None):
+    """
+    在某个联赛的历史比赛上扫描一条规则的参数
+    params: 要扫描的参数名 (默认该规则全部参数, 其余参数保持当前值); clause: 只扫描该条件组的参数
+    返回 SweepResult
+    """
+    rules = rules or default_rules()
+    if str(league_code) not in rules.leagues:
+        raise ValueError(f"无效的联赛代码: {league_code}")
+    league = rules.leagues[str(league_code)]
+    definitions = {d["id"]: d for d in league.definitions}
+    if rule_id not in definitions:
+        raise ValueError(f"联赛 {league_code} 没有规则 {rule_id}")
+    rule_def = definitions[rule_id]
+    direction = rule_def.get("direction")
+    if direction is None:
+        raise ValueError(f"规则 {rule_id} 没有方向, 无法统计命中率")
+
+    candidates = rule_parameters(rule_def, span)
+    if clause is not None:
+        candidates = [p for p in candidates if p.clause == clause]
+    if params is not None:
+        unknown = set(params) - {p.name for p in candidates}
+        if unknown:
+            raise ValueError(f"规则 {rule_id} 没有参数: {', '.join(sorted(unknown))}")
+        candidates = [p for p in candidates if p.name in params]
+    count = math.prod(len(p.grid) for p in candidates)
+    if count > max_combinations:
+        raise ValueError(f"规则 {rule_id} 共 {count} 个组合, 超过上限 {max_combinations}; "
+                         "用 params / clause 缩小扫描范围或减小 span")
+
+    started = time.perf_counter()
+    f, hits, profit = cache.league(league_code)
+    matches = len(hits)
+    column = DIRECTION_NAMES.index(direction)
+    plan = _Plan(rule_def, candidates, f)
+    hit_bits = np.packbits(hits[:, column])
+
+    def evaluate(start):
+        combos = np.arange(start, min(start + BATCH_SIZE, plan.count), dtype=np.int64)
+        masks = plan.masks(combos)
+        fired = _popcount(masks).sum(axis=1, dtype=np.int64)
+        masks &= hit_bits
+        return fired, _popcount(masks).sum(axis=1, dtype=np.int64)
+
+    starts = range(0, plan.count, BATCH_SIZE)
+    if workers == 1 or len(starts) == 1:
+        parts = list(map(evaluate, starts))
+    else:
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+            parts = list(pool.map(evaluate, starts))
+    fires = np.concatenate([part[0] for part in parts])
+    hit_counts = np.concatenate([part[1] for part in parts])
+    changes = (plan.indices(np.arange(plan.count, dtype=np.int64)) != plan.current).sum(axis=1)
+
+    direction_profit = profit[:, column]
+    current = int(plan.current @ plan.strides)
+    front = [_point(plan, combo, fires[combo], hit_counts[combo], direction_profit, matches)
+             for combo in pareto_front(fires, hit_counts, changes, min_fires).tolist()]
+    baseline = _point(plan, current, fires[current], hit_counts[current], direction_profit, matches)
+    return SweepResult(str(league_code), rule_id, direction, clause, plan, matches, fires, hit_counts, front,
+                       baseline, time.perf_counter() - started)
+
+
+def sweep_league(cache, league_code, rules=None, rule_ids=None, span=DEFAULT_SPAN,
+                 max_combinations=DEFAULT_MAX_COMBINATIONS, min_fires=DEFAULT_MIN_FIRES, workers=None):
+    """
+    扫描某个联赛的全部 (或 rule_ids 指定的) 有方向的规则
+    组合数超过 max_combinations 的规则逐个条件组扫描 (其余条件组保持当前值)
+    """
+    rules = rules or default_rules()
+    if str(league_code) not in rules.leagues:
+        raise ValueError(f"无效的联赛代码: {league_code}")
+    league = rules.leagues[str(league_code)]
+    results = []
+    for rule_def in league.definitions:
+        if rule_ids is not None and rule_def["id"] not in rule_ids:
+            continue
+        if rule_def.get("direction") is None:
+            continue
+        params = rule_parameters(rule_def, span)
+        if not params:
+            continue
+        options = dict(rules=rules, span=span, max_combinations=max_combinations, min_fires=min_fires,
+                       workers=workers)
+        if math.prod(len(p.grid) for p in params) <= max_combinations:
+            results.append(sweep_rule(cache, league_code, rule_def["id"], **options))
+            continue
+        for c in sorted({p.clause for p in params}):
+            results.append(sweep_rule(cache, league_code, rule_def["id"], clause=c, **options))
+    return results
+
+
+class SweepReport:
+    """扫描报告: results 为 SweepResult 列表"""
+
+    def __init__(self, results, elapsed, names=None):
+        self.results = results
+        self.elapsed = elapsed
+        self.names = names or {}
+
+    def to_json(self):
+        return json.dumps({"seconds": round(self.elapsed, 3), "results": [r.to_dict() for r in self.results]},
+                          ensure_ascii=False, indent=2)
+
+    def to_text(self):
+        def pct(value):
+            return "-" if value is None else f"{value * 100:6.1f}%"
+
+        def line(label, point, current=None):
+            changed = {name: value for name, value in point["params"].items()
+                       if current is None or current[name] != value}
+            params = ", ".join(f"{name}={value:g}" for name, value in changed.items()) or "(当前取值)"
+            return (f"  {label:<6}{point['fires']:>8}{pct(point['coverage']):>9}{pct(point['precision']):>9}"
+                    f"{pct(point['roi']):>9}  {params}")
+
+        total = sum(r.combinations for r in self.results)
+        lines = [f"=== 阈值扫描 ({len(self.results)} 项, 共 {total} 个组合, 用时 {self.elapsed:.1f} 秒) ==="]
+        for r in self.results:
+            scope = "整条规则" if r.clause is None else f"条件组 when[{r.clause}]"
+            lines.append("")
+            lines.append(f"--- {self.names.get(r.league, r.league)} {r.rule_id} ({r.direction}) {scope}: "
+                         f"{r.matches} 场, {r.combinations} 个组合, {r.elapsed:.2f} 秒 ---")
+            lines.append(f"  {'':<6}{'触发':>6}{'覆盖率':>6}{'命中率':>6}{'ROI':>9}  参数")
+            current = r.baseline["params"]
+            lines.append(line("当前", r.baseline))
+            for point in r.front:
+                lines.append(line("前沿", point, current))
+        return "\n".join(lines)
+
+
+def run_sweep(cache, leagues=None, rules=None, rule_ids=None, **options):
+    """扫描多个联赛 (默认历史数据中出现的全部联赛), 返回 SweepReport"""
+    rules = rules or default_rules()
+    if leagues is None:
+        present = set(np.unique(cache.codes).tolist())
+        leagues = [code for code in rules.leagues if int(code) in present]
+    started = time.perf_counter()
+    results = []
+    for code in leagues:
+        results += sweep_league(cache, code, rules, rule_ids, **options)
+    return SweepReport(results, time.perf_counter() - started, rules.league_names())
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 各模块直接放在仓库根目录 (没有打包), 测试从根目录导入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,45 @@
+"""条件组顺序 (adaptive.py) 只作用于学习或载入它的实例"""
+
+import json
+
+from main import FootballPredictionSystem
+from rule_engine import default_rules
+
+
+def _reversed_order(rules):
+    """每个联赛都换用短路求值, 条件组倒序"""
+    return {
+        "fingerprint": rules.fingerprint,
+        "leagues": {code: {"mode": "ordered", "order": {rule.rule_id: list(range(len(rule.clauses)))[::-1]
+                                                        for rule in league.rules}}
+                    for code, league in rules.leagues.items()},
+    }
+
+
+def test_loaded_order_stays_on_the_instance(tmp_path):
+    path = str(tmp_path / "order.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(_reversed_order(default_rules()), f)
+
+    a = FootballPredictionSystem(cache_size=0)
+    b = FootballPredictionSystem(cache_size=0)
+    a.load_rule_order(path)
+    assert all(league.evaluate is not league.default_evaluate for league in a.rules.leagues.values())
+    assert all(league.evaluate is league.default_evaluate for league in default_rules().leagues.values())
+    assert b.rules is default_rules()
+
+    odds = ([1.6, 3.8, 5.2], [1.62, 3.7, 5.0], [1.58, 3.9, 5.4])
+    for code in a.leagues:
+        for system in (a, b):
+            system.add_match(code, code, *odds)
+        assert a.analyze_match_result(code).rule_ids == b.analyze_match_result(code).rule_ids
+
+
+def test_learned_order_does_not_touch_other_systems():
+    a = FootballPredictionSystem(cache_size=0)
+    odds = ([2.1, 3.2, 3.4], [2.05, 3.3, 3.5], [2.0, 3.25, 3.6])
+    records = [("7", odds[0], odds[1], odds[2])] * 300
+    a.learn_rule_order(records)
+    assert all(league.evaluate is league.default_evaluate for league in default_rules().leagues.values())
+    a.rule_order.restore()
+    assert all(league.evaluate is league.default_evaluate for league in a.rules.leagues.values())
@@ -0,0 +1,112 @@
+"""赔率归档 (archive.py) 的读写往返"""
+
+import numpy as np
+import pytest
+
+from archive import build_archive, open_archive, write_archive, write_store
+from main import FootballPredictionSystem
+from match_store import BOOKMAKERS, MatchStore
+from rule_engine import default_rules
+
+LEAGUES = default_rules().league_names()
+
+
+def _store(n=500):
+    rng = np.random.default_rng(3)
+    store = MatchStore(LEAGUES)
+    codes = list(LEAGUES)
+    for i in range(n):
+        odds = np.round(rng.uniform(1.2, 8.0, size=(4, 3)), 2).tolist()
+        store.add(f"M{i}-比赛", codes[i % len(codes)], odds[0], odds[1], odds[2], odds[3] if i % 3 else None)
+    return store
+
+
+def test_archive_round_trip(tmp_path):
+    path = str(tmp_path / "odds.fpa")
+    store = _store()
+    write_store(path, store)
+    with open_archive(path, LEAGUES) as archive:
+        assert len(archive) == len(store)
+        assert list(archive) == list(store)
+        for match_id, row in store.index.items():
+            assert archive.row(match_id) == row
+            assert match_id in archive
+            assert archive[match_id] == store[match_id]
+        assert archive.row("不存在") is None
+        arrays = archive.as_arrays()
+        expected = store.as_arrays()
+        for name in ("am", "wl", "hg", "codes"):
+            assert np.array_equal(arrays[name], expected[name])
+        assert np.array_equal(np.isnan(arrays["lb"]), np.isnan(expected["lb"]))
+        del arrays
+
+
+def test_archive_analysis_matches_store(tmp_path):
+    path = str(tmp_path / "odds.fpa")
+    system = FootballPredictionSystem()
+    store = _store(200)
+    write_store(path, store)
+    system.open_archive(path)
+    for match_id in store:
+        # 归档中的比赛按需分析, 结果与内存中的比赛相同 (随机赔率不一定通过 add_match 的检查, 直接写入存储)
+        fresh = FootballPredictionSystem()
+        fresh.matches.add(match_id, *[store[match_id][key] for key in ("league", *BOOKMAKERS)])
+        assert system.analyze_match(match_id) == fresh.analyze_match(match_id)
+    system.archive.close()
+
+
+def test_build_archive_rejects_invalid_rows(tmp_path):
+    path = str(tmp_path / "odds.fpa")
+    records = [
+        {"match_id": "A", "league": "1", "am": [2.1, 3.2, 3.4], "wl": [2.05, 3.3, 3.5], "hg": [2.0, 3.25, 3.6]},
+        {"match_id": "B", "league": "99", "am": [2.1, 3.2, 3.4], "wl": [2.05, 3.3, 3.5], "hg": [2.0, 3.25, 3.6]},
+        {"match_id": "C", "league": "9", "am": [1.5, 4.0, 6.0], "wl": [1.52, 4.1, 5.8], "hg": [1.48, 4.2, 6.1],
+         "lb": [1.5, 4.0, 6.5]},
+    ]
+    rejected = []
+    assert build_archive(records, path, LEAGUES, chunk_size=2, on_reject=lambda r, reason: rejected.append(r)) == 2
+    assert [record["match_id"] for record in rejected] == ["B"]
+    with open_archive(path, LEAGUES) as archive:
+        assert list(archive) == ["A", "C"]
+        assert archive["A"]["lb"] is None
+        assert archive["C"]["lb"] == [1.5, 4.0, 6.5]
+        assert archive.odds(archive.row("C"), "hg") == [1.48, 4.2, 6.1]
+
+
+def test_duplicate_ids_are_rejected(tmp_path):
+    path = str(tmp_path / "odds.fpa")
+    odds = np.full((2, 3), 2.0)
+    with pytest.raises(ValueError):
+        write_archive(path, ["A", "A"], np.array([1, 1], dtype=np.int8), odds, odds, odds)
+
+
+def test_invalid_archive_is_rejected(tmp_path):
+    path = str(tmp_path / "odds.fpa")
+    write_archive(path, ["A"], np.array([1], dtype=np.int8), *[np.full((1, 3), 2.0)] * 3)
+    with open(path, "r+b") as f:
+        f.write(b"XXXX")
+    with pytest.raises(ValueError):
+        open_archive(path, LEAGUES)
+
+
+def test_build_archive_rejects_duplicate_ids(tmp_path):
+    path = str(tmp_path / "odds.fpa")
+    odds = {"am": [2.1, 3.2, 3.4], "wl": [2.05, 3.3, 3.5], "hg": [2.0, 3.25, 3.6]}
+    records = [dict(odds, match_id=match_id, league=league)
+               for match_id, league in [("A", "1"), ("B", "2"), ("A", "3"), ("C", "4"), ("B", "5"), ("B", "99")]]
+    rejected = []
+    count = build_archive(records, path, LEAGUES, chunk_size=2,
+                          on_reject=lambda record, reason: rejected.append((record["league"], reason)))
+    assert count == 3
+    assert sorted(rejected) == [("3", "比赛编号重复: A"), ("5", "比赛编号重复: B"), ("99", "无效的联赛代码")]
+    with open_archive(path, LEAGUES) as archive:
+        assert list(archive) == ["A", "B", "C"]
+        assert archive["A"]["league"] == "1"
+
+
+def test_failed_close_removes_tmp_file(tmp_path):
+    path = str(tmp_path / "odds.fpa")
+    odds = np.full((2, 3), 2.0)
+    with pytest.raises(ValueError):
+        write_archive(path, ["A", "A"], np.array([1, 1], dtype=np.int8), odds, odds, odds)
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,74 @@
+"""历史回测 (backtest.py): 统计与逐场分析一致"""
+
+import numpy as np
+import pytest
+
+from backtest import AWAY, DRAW, HOME, HistoryStore, run_backtest
+from main import FootballPredictionSystem
+
+CSV_HEADER = "match_id,league,am_home,am_draw,am_away,wl_home,wl_draw,wl_away,hg_home,hg_draw,hg_away"
+
+
+def _history(n=400):
+    rng = np.random.default_rng(5)
+    base = rng.uniform(1.4, 5.0, size=(n, 3))
+    codes = rng.choice(np.arange(1, 14), size=n).astype(np.int8)
+    results = rng.integers(0, 3, size=n).astype(np.int8)
+    return HistoryStore(np.round(base, 2), np.round(base * 1.02, 2), np.round(base * 0.99, 2), codes, results)
+
+
+def test_rule_counts_match_single_analysis():
+    store = _history()
+    report = run_backtest(store)
+    system = FootballPredictionSystem(cache_size=0)
+    fires, hits = {}, {}
+    for i in range(len(store)):
+        system.matches.add(str(i), str(store.codes[i]), *(store.am[i].tolist(), store.wl[i].tolist(),
+                                                           store.hg[i].tolist()))
+        result = system.analyze_match_result(str(i))
+        wl = store.wl[i]
+        favourite = HOME if wl[0] <= wl[2] else AWAY
+        for rule_id in result.rule_ids:
+            fires[rule_id] = fires.get(rule_id, 0) + 1
+            direction = system.rules.directions[rule_id]
+            hit = {"upper": store.results[i] == favourite, "lower": store.results[i] != favourite,
+                   "draw": store.results[i] == DRAW}.get(direction)
+            if hit is not None:
+                hits[rule_id] = hits.get(rule_id, 0) + int(hit)
+
+    rows = {row["key"]: row for row in report.select("rule", "all")}
+    assert {key: row["fires"] for key, row in rows.items() if row["fires"]} == fires
+    for rule_id, count in hits.items():
+        assert rows[rule_id]["hits"] == count
+    verdicts = report.select("verdict", "all")
+    assert sum(row["fires"] for row in verdicts) == len(store)
+    assert "回测结果 (400 场比赛)" in report.to_text()
+
+
+def test_roi_of_a_single_upper_hit():
+    odds = [[1.5, 4.0, 6.0]]
+    store = HistoryStore(odds, odds, odds, [1], [HOME])
+    report = run_backtest(store)
+    for row in report.select("verdict", "all", "upper"):
+        if row["fires"]:
+            assert row["precision"] == 1.0 and row["roi"] == pytest.approx(0.5)
+
+
+def test_from_csv(tmp_path):
+    path = tmp_path / "history.csv"
+    path.write_text(CSV_HEADER + ",home_goals,away_goals\n"
+                    "A,1,2.1,3.2,3.4,2.05,3.3,3.5,2.0,3.25,3.6,2,1\n"
+                    "B,7,2.1,3.2,3.4,2.05,3.3,3.5,2.0,3.25,3.6,0,0\n", encoding="utf-8")
+    store = HistoryStore.from_csv(str(path))
+    assert store.codes.tolist() == [1, 7] and store.results.tolist() == [HOME, DRAW]
+    assert store.match_ids == ["A", "B"]
+
+    path.write_text(CSV_HEADER + ",result\nA,99,2.1,3.2,3.4,2.05,3.3,3.5,2.0,3.25,3.6,a\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="无效的联赛代码"):
+        HistoryStore.from_csv(str(path))
+
+
+def test_column_lengths_must_agree():
+    odds = [[2.1, 3.2, 3.4]] * 2
+    with pytest.raises(ValueError):
+        HistoryStore(odds, odds, odds, [1], [HOME, AWAY])
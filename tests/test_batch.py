@@ -0,0 +1,25 @@
+"""批量引擎 (batch.py) 的输入转换"""
+
+import numpy as np
+import pytest
+
+from batch import analyze_batch, to_league_codes
+
+
+def test_league_codes_from_strings_and_integers():
+    assert to_league_codes(["7", "12", "7"]).tolist() == [7, 12, 7]
+    codes = to_league_codes(np.array([1, 13], dtype=np.uint8))
+    assert codes.dtype == np.int8 and codes.tolist() == [1, 13]
+
+
+@pytest.mark.parametrize("leagues", [[257], np.array([1, 257]), [-255], ["257"], ["x"], ["99"]])
+def test_out_of_range_codes_do_not_wrap(leagues):
+    # 257 按 int8 转换会回绕成有效代码 1
+    with pytest.raises(ValueError, match="无效的联赛代码"):
+        to_league_codes(leagues)
+
+
+def test_analyze_batch_rejects_wrapped_code():
+    odds = np.array([[2.1, 3.2, 3.4]])
+    with pytest.raises(ValueError):
+        analyze_batch(odds, odds, odds, [257])
@@ -0,0 +1,75 @@
+"""分析缓存 (cache.py)"""
+
+import json
+
+import pytest
+
+from cache import AnalysisCache
+from main import FootballPredictionSystem
+from rule_engine import RULES_PATH
+
+AM, WL, HG = [2.1, 3.2, 3.4], [2.05, 3.3, 3.5], [2.0, 3.25, 3.6]
+MATCHES = [
+    ("A", "1", AM, WL, HG),
+    ("B", "7", [1.93, 3.23, 3.62], [1.95, 3.3, 3.6], [1.9, 3.25, 3.7]),
+    ("C", "12", [3.0, 3.1, 2.3], [2.9, 3.6, 2.35], [3.05, 3.0, 2.4]),
+    ("D", "1", AM, WL, HG),
+]
+
+
+def _market_rules(tmp_path):
+    with open(RULES_PATH, encoding="utf-8") as f:
+        table = json.load(f)
+    table["rule_sets"]["brazil"].append(
+        {"id": "brazil.high_total", "direction": None, "message": "{league_name} 大小球盘口偏高",
+         "when": [[{"feature": "wl_ou_line", "op": ">=", "target": 3.0}]]})
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps(table, ensure_ascii=False), encoding="utf-8")
+    return str(path)
+
+
+def _analyze(system, markets=None):
+    results = []
+    for match_id, code, am, wl, hg in MATCHES:
+        system.add_match(match_id, code, am, wl, hg, markets=markets if code == "12" else None)
+        result = system.analyze_match_result(match_id)
+        results.append((result.rule_ids, result.verdict))
+    return results
+
+
+def test_cached_results_match_fresh_analysis():
+    cached = FootballPredictionSystem()
+    assert _analyze(cached) == _analyze(FootballPredictionSystem(cache_size=0))
+    assert _analyze(cached) == _analyze(FootballPredictionSystem(cache_size=0))
+    assert cached.cache.stats()["hits"] == 5 and cached.cache.stats()["misses"] == 3
+
+
+def test_lru_eviction():
+    cache = AnalysisCache(2)
+    for key in ("a", "b", "a", "c"):
+        if cache.get(key) is None:
+            cache.put(key, (), 0)
+    assert list(cache.entries) == ["a", "c"]
+    assert cache.evictions == 1
+    with pytest.raises(ValueError):
+        AnalysisCache(0)
+
+
+def test_save_and_load_with_markets(tmp_path):
+    rules_path = _market_rules(tmp_path)
+    markets = {"wl_ou": [3.0, 0.95, 0.93]}
+    system = FootballPredictionSystem(rules_path)
+    expected = _analyze(system, markets)
+    assert "brazil.high_total" in expected[2][0]
+    path = str(tmp_path / "cache.json")
+    system.cache.save(path, system.rules)
+
+    restored = FootballPredictionSystem(rules_path)
+    assert restored.cache.load(path, restored.rules) == len(system.cache)
+    assert _analyze(restored, markets) == expected
+    assert restored.cache.misses == 0
+
+    # 规则表变化后不载入
+    other = FootballPredictionSystem()
+    assert other.cache.load(path, other.rules) == 0
+    assert other.cache.load(str(tmp_path / "missing.json"), other.rules) == 0
@@ -0,0 +1,74 @@
+"""流式导入 (ingest.py): CSV / JSONL 解析与逐场分析结果一致"""
+
+import io
+import json
+
+import pytest
+
+from ingest import CSV_FIELDS, ingest, parse_record, read_records
+from main import FootballPredictionSystem
+
+ROWS = [
+    ("A1", "1", [2.1, 3.2, 3.4], [2.05, 3.3, 3.5], [2.0, 3.25, 3.6], None),
+    ("A2", "7", [1.93, 3.23, 3.62], [1.95, 3.3, 3.6], [1.9, 3.25, 3.7], [2.0, 3.0, 4.0]),
+    ("A3", "9", [1.5, 4.0, 6.0], [1.52, 4.1, 5.8], [1.48, 4.2, 6.1], None),
+    ("坏-1", "99", [2.1, 3.2, 3.4], [2.05, 3.3, 3.5], [2.0, 3.25, 3.6], None),
+    ("坏-2", "1", [0.5, 3.2, 3.4], [2.05, 3.3, 3.5], [2.0, 3.25, 3.6], None),
+]
+
+
+def _csv(path, rows):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(",".join(CSV_FIELDS + ["wl_ou_line", "wl_ou_over", "wl_ou_under"]) + "\n")
+        for match_id, league, am, wl, hg, lb in rows:
+            fields = [match_id, league, *am, *wl, *hg, *(lb or ["", "", ""])]
+            fields += [2.5, 0.9, 0.98] if match_id == "A1" else ["", "", ""]
+            f.write(",".join(str(v) for v in fields) + "\n")
+        f.write("A4,1,2.1\n")
+    return str(path)
+
+
+def _jsonl(path, rows):
+    with open(path, "w", encoding="utf-8") as f:
+        for match_id, league, am, wl, hg, lb in rows:
+            record = {"match_id": match_id, "league": league, "am": am, "wl": wl, "hg": hg}
+            if lb:
+                record["lb"] = lb
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        f.write("{不是 JSON\n")
+    return str(path)
+
+
+@pytest.mark.parametrize("write", [_csv, _jsonl])
+def test_ingest_matches_single_analysis(tmp_path, write):
+    path = write(tmp_path / ("odds.csv" if write is _csv else "odds.jsonl"), ROWS)
+    system = FootballPredictionSystem(cache_size=0)
+    out = io.StringIO()
+    rejected = []
+    stats = ingest(system, path, out, chunk_size=2, on_reject=lambda record, reason: rejected.append(reason))
+    results = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [result["match_id"] for result in results] == ["A1", "A2", "A3"]
+    assert (stats.rows, stats.rejected) == (3, 3)
+    assert rejected[0] == "无效的联赛代码" and rejected[1].startswith("澳门赔率超出范围")
+
+    for (match_id, league, am, wl, hg, lb), result in zip(ROWS, results):
+        system.add_match(match_id, league, am, wl, hg, lb)
+        expected = system.analyze_match_result(match_id)
+        assert result["rules"] == expected.rule_ids
+        assert result["verdict"] == expected.verdict_label
+
+
+def test_csv_record_format(tmp_path):
+    records = list(read_records(_csv(tmp_path / "odds.csv", ROWS[:2])))
+    assert records[0]["markets"] == {"wl_ou": ["2.5", "0.9", "0.98"]}
+    assert "lb" not in records[0] and records[1]["lb"] == ["2.0", "3.0", "4.0"]
+    assert records[-1] == {"_error": "字段数不足: 3"}
+    parsed = parse_record(records[1], FootballPredictionSystem().leagues)
+    assert parsed == ("A2", "7", ROWS[1][2], ROWS[1][3], ROWS[1][4], ROWS[1][5], None)
+
+
+def test_csv_missing_columns(tmp_path):
+    path = tmp_path / "bad.csv"
+    path.write_text("match_id,league,am_home\nA,1,2.0\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="CSV缺少字段"):
+        list(read_records(str(path)))
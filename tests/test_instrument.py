@@ -0,0 +1,41 @@
+"""规则计数 (instrument.py) 只作用于启用它的实例"""
+
+import numpy as np
+
+from main import FootballPredictionSystem
+from rule_engine import default_rules
+
+ODDS = ([2.1, 3.2, 3.4], [2.05, 3.3, 3.5], [2.0, 3.25, 3.6])
+
+
+def _calls(instrumentation):
+    return sum(counter.calls for counter in instrumentation.leagues.values())
+
+
+def test_counts_only_the_instrumented_system():
+    a = FootballPredictionSystem(cache_size=0)
+    b = FootballPredictionSystem(cache_size=0)
+    counters = a.instrument()
+    for system in (a, b):
+        system.add_match("M1", "1", *ODDS)
+
+    b.analyze_match_result("M1")
+    b.analyze_batch(np.array([ODDS[0]]), np.array([ODDS[1]]), np.array([ODDS[2]]), ["1"])
+    assert _calls(counters) == 0
+
+    a.analyze_match_result("M1")
+    a.analyze_batch(np.array([ODDS[0]]), np.array([ODDS[1]]), np.array([ODDS[2]]), ["1"])
+    assert _calls(counters) == 2
+    assert a.rules is not default_rules()
+    assert b.rules is default_rules()
+
+
+def test_disable_keeps_counts_and_results():
+    system = FootballPredictionSystem(cache_size=0)
+    system.add_match("M1", "7", *ODDS)
+    expected = system.analyze_match_result("M1").rule_ids
+    counters = system.instrument()
+    assert system.analyze_match_result("M1").rule_ids == expected
+    system.instrument(False)
+    assert system.analyze_match_result("M1").rule_ids == expected
+    assert counters.leagues["7"].calls == 1
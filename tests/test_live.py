@@ -0,0 +1,60 @@
+"""实时赔率跟踪 (live.py) 与 update_odds"""
+
+import pytest
+
+from live import OddsTracker
+from main import FootballPredictionSystem
+from validate import Rejection
+
+AM, WL, HG = [2.1, 3.2, 3.4], [2.05, 3.3, 3.5], [2.0, 3.25, 3.6]
+
+
+def _system():
+    system = FootballPredictionSystem(cache_size=0)
+    system.add_match("M1", "1", AM, WL, HG)
+    return system
+
+
+def test_update_matches_full_analysis():
+    system = _system()
+    system.add_match("M2", "1", AM, WL, HG)
+    for step in range(1, 30):
+        wl = [round(2.05 - 0.02 * step, 2), 3.3, round(3.5 + 0.08 * step, 2)]
+        assert not isinstance(system.update_odds("M1", "wl", wl, timestamp=step), Rejection)
+        system.add_match("M2", "1", AM, wl, HG)
+        tracker = system.tracker
+        assert tracker.fired("M1") == system.analyze_match_result("M2").rule_ids
+        assert tracker.verdict("M1") == system.analyze_match_result("M2").verdict
+    assert len(tracker.history("M1", "wl")) == 30
+    assert system.analyze_match_result("M1").rule_ids == system.analyze_match_result("M2").rule_ids
+
+
+@pytest.mark.parametrize("odds", [[-5, 0, 1e9], [2.0, 3.0], ["a", 3.3, 3.5], [6.0, 3.6, 1.5]])
+def test_invalid_update_changes_nothing(tmp_path, odds):
+    system = _system()
+    system.save_snapshot(str(tmp_path / "s.fps"))
+    result = system.update_odds("M1", "wl", odds)
+    assert isinstance(result, Rejection) and result.startswith("无效的赔率")
+    assert system.matches["M1"]["wl"] == WL
+    assert "M1" not in system.tracker.tracked
+
+    reloaded = FootballPredictionSystem(cache_size=0)
+    reloaded.load_snapshot(str(tmp_path / "s.fps"))
+    assert reloaded.matches["M1"]["wl"] == WL
+
+
+def test_unknown_match_and_bookmaker_are_rejected():
+    system = _system()
+    assert system.update_odds("M9", "wl", WL) == "比赛数据不存在"
+    assert isinstance(system.update_odds("M1", "xx", WL), Rejection)
+    with pytest.raises(ValueError):
+        OddsTracker(system).update("M1", "wl", [1.01, 1.01, 1.01])
+
+
+def test_update_is_journaled(tmp_path):
+    system = _system()
+    system.save_snapshot(str(tmp_path / "s.fps"))
+    system.update_odds("M1", "lb", [2.1, 3.3, 3.3])
+    reloaded = FootballPredictionSystem(cache_size=0)
+    reloaded.load_snapshot(str(tmp_path / "s.fps"))
+    assert reloaded.matches["M1"]["lb"] == [2.1, 3.3, 3.3]
@@ -0,0 +1,82 @@
+"""赔率流回放 (replay.py)"""
+
+import json
+
+import pytest
+
+from main import FootballPredictionSystem
+from replay import VirtualClock, parse_speed, parse_timestamp, replay_file
+
+AM, WL, HG = [2.1, 3.2, 3.4], [2.05, 3.3, 3.5], [2.0, 3.25, 3.6]
+
+
+def _write(path, events):
+    with open(path, "w", encoding="utf-8") as f:
+        for event in events:
+            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+    return str(path)
+
+
+def test_invalid_update_is_an_error(tmp_path):
+    path = _write(tmp_path / "day.jsonl", [
+        {"ts": 1, "match_id": "M1", "league": "1", "am": AM, "wl": WL, "hg": HG},
+        {"ts": 2, "match_id": "M1", "bookmaker": "wl", "odds": [-5, 0, 1e9]},
+        {"ts": 3, "match_id": "M1", "bookmaker": "wl", "odds": [2.0, 3.3, 3.6]},
+    ])
+    system = FootballPredictionSystem(cache_size=0)
+    report = replay_file(system, path)
+    assert report.updates == 1
+    assert [entry["match_id"] for entry in report.errors] == ["M1"]
+    assert report.errors[0]["reason"].startswith("无效的赔率")
+    assert system.matches["M1"]["wl"] == [2.0, 3.3, 3.6]
+
+
+def _day(tmp_path):
+    """乱序录制的一天: 添加两场比赛, 之后更新赔率; 第二场录制时的判断故意写错"""
+    system = FootballPredictionSystem(cache_size=0)
+    system.add_match("M1", "1", AM, WL, HG)
+    first = system.analyze_match_result("M1")
+    system.update_odds("M1", "wl", [1.7, 3.6, 4.8])
+    updated = system.analyze_match_result("M1")
+    events = [
+        {"ts": "1970-01-01T00:01:40+00:00", "match_id": "M1", "bookmaker": "wl", "odds": [1.7, 3.6, 4.8],
+         "verdict": updated.verdict_label, "rules": updated.rule_ids},
+        {"ts": 10, "match_id": "M1", "league": "1", "am": AM, "wl": WL, "hg": HG, "verdict": first.verdict_label},
+        {"ts": 10, "match_id": "M2", "league": "7", "am": AM, "wl": WL, "hg": HG, "markets": {"wl_ah": None},
+         "verdict": "draw" if first.verdict_label != "draw" else "upper"},
+        {"ts": 20, "match_id": "M3", "league": "1", "am": AM, "wl": WL, "hg": [0.5, 3.25, 3.6]},
+        {"ts": "昨天", "match_id": "M4"},
+    ]
+    return _write(tmp_path / "day.jsonl", events)
+
+
+def test_replay_in_time_order(tmp_path):
+    path = _day(tmp_path)
+    reports = [replay_file(FootballPredictionSystem(cache_size=0), path) for _ in range(2)]
+    report = reports[0]
+    assert (report.events, report.added, report.updates) == (4, 2, 1)
+    assert report.compared == 3 and report.diff_count == 1
+    assert report.diffs[0]["match_id"] == "M2" and report.diffs[0]["event"] == "add"
+    assert [entry["match_id"] for entry in report.errors] == [None, "M3"]
+    assert "超出范围" in report.errors[1]["reason"]
+    assert report.span == 90.0
+    assert reports[1].to_dict()["diff_list"] == report.to_dict()["diff_list"]
+
+
+def test_virtual_clock_speed(tmp_path):
+    report = replay_file(FootballPredictionSystem(cache_size=0), _day(tmp_path), speed=10, clock=VirtualClock())
+    assert report.elapsed == pytest.approx(9.0)
+    assert report.lag.summary()["max_ms"] == 0.0
+
+
+def test_parse_speed_and_timestamp():
+    assert parse_speed("fast") is None
+    assert parse_speed("100x") == 100.0 and parse_speed("2.5") == 2.5
+    for value in ("0x", "-1", "slow"):
+        with pytest.raises(ValueError):
+            parse_speed(value)
+    assert parse_timestamp("1970-01-01T00:00:10+00:00") == 10.0
+    assert parse_timestamp("12.5") == 12.5
+    for value in (True, None, "nan", "昨天"):
+        with pytest.raises(ValueError):
+            parse_timestamp(value)
@@ -0,0 +1,88 @@
+"""批量分析报告 (report.py): 各格式的内容与逐场分析一致"""
+
+import csv
+import json
+
+import numpy as np
+import pytest
+
+from main import FootballPredictionSystem
+from report import analyze_file, detect_format
+
+
+def _records(n=120):
+    rng = np.random.default_rng(21)
+    records = []
+    for i in range(n):
+        probs = rng.dirichlet([4, 3, 3])
+        odds = [np.round(1.0 / (probs * margin), 2).tolist() for margin in (1.06, 1.05, 1.07)]
+        records.append({"match_id": f"M{i}", "league": str(i % 13 + 1), "am": odds[0], "wl": odds[1], "hg": odds[2]})
+    return records
+
+
+@pytest.fixture(scope="module")
+def source(tmp_path_factory):
+    records = _records()
+    path = tmp_path_factory.mktemp("report") / "odds.jsonl"
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records + [{"match_id": "bad", "league": "99", "am": [2, 3, 4], "wl": [2, 3, 4],
+                                  "hg": [2, 3, 4]}]:
+            f.write(json.dumps(record) + "\n")
+    system = FootballPredictionSystem(cache_size=0)
+    expected = []
+    for record in records:
+        system.add_match(record["match_id"], record["league"], record["am"], record["wl"], record["hg"])
+        expected.append((record, system.analyze_match_result(record["match_id"])))
+    return str(path), expected
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_text_report_matches_analyze_match(tmp_path, source, workers):
+    path, expected = source
+    output = str(tmp_path / "report.txt")
+    stats = analyze_file(FootballPredictionSystem(), path, output, chunk_size=16, workers=workers,
+                         on_reject=lambda record, reason: None)
+    assert (stats.rows, stats.rejected) == (len(expected), 1)
+    with open(output, encoding="utf-8") as f:
+        assert f.read() == "".join(result.render() + "\n" for _, result in expected)
+
+
+def test_structured_formats(tmp_path, source):
+    path, expected = source
+    rows = [{"match_id": record["match_id"], "league": record["league"], "rules": result.rule_ids,
+             "verdict": result.verdict_label} for record, result in expected]
+    for fmt, name in (("json", "r.json"), ("jsonl", "r.jsonl"), ("csv", "r.csv"), ("columnar", "r.npz")):
+        output = str(tmp_path / name)
+        assert detect_format(output) == fmt
+        analyze_file(FootballPredictionSystem(), path, output, chunk_size=16, on_reject=lambda record, reason: None)
+        if fmt == "json":
+            with open(output, encoding="utf-8") as f:
+                assert json.load(f) == rows
+        elif fmt == "jsonl":
+            with open(output, encoding="utf-8") as f:
+                assert [json.loads(line) for line in f] == rows
+        elif fmt == "csv":
+            with open(output, encoding="utf-8", newline="") as f:
+                assert list(csv.DictReader(f)) == [dict(row, rules="|".join(row["rules"])) for row in rows]
+        else:
+            with np.load(output) as data:
+                assert data["match_id"].tolist() == [row["match_id"] for row in rows]
+                labels = data["verdict_labels"][data["verdict"]].tolist()
+                assert labels == [row["verdict"] for row in rows]
+                rule_ids = data["rule_ids"].tolist()
+                assert [[rule_ids[k] for k in np.flatnonzero(fired)] for fired in data["fired"]] == \
+                    [sorted(row["rules"], key=rule_ids.index) for row in rows]
+                assert data["wl"].tolist() == [record["wl"] for record, _ in expected]
+
+
+def test_empty_and_invalid(tmp_path):
+    path = tmp_path / "empty.jsonl"
+    path.write_text("", encoding="utf-8")
+    output = str(tmp_path / "r.json")
+    analyze_file(FootballPredictionSystem(), str(path), output)
+    with open(output, encoding="utf-8") as f:
+        assert json.load(f) == []
+    with pytest.raises(ValueError):
+        analyze_file(FootballPredictionSystem(), str(path), "-", fmt="columnar")
+    with pytest.raises(ValueError):
+        analyze_file(FootballPredictionSystem(), str(path), "-", fmt="xml")
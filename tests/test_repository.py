@@ -0,0 +1,51 @@
+"""SQLite 比赛仓库 (repository.py)"""
+
+from datetime import date
+
+from main import FootballPredictionSystem
+from repository import MatchRepository, week_range
+
+AM, WL, HG = [2.1, 3.2, 3.4], [2.05, 3.3, 3.5], [2.0, 3.25, 3.6]
+
+
+def test_round_trip_and_queries(tmp_path):
+    with MatchRepository(str(tmp_path / "matches.db")) as repository:
+        repository.save_matches([
+            ("A", "10", AM, WL, HG, None, "2024-05-06 19:00"),
+            ("B", "10", AM, WL, HG, [2.2, 3.1, 3.3], "2024-05-12T23:59"),
+            ("C", "10", AM, WL, HG, None, "2024-05-13 00:00"),
+            ("D", "9", AM, WL, HG, None, "2024-05-08 12:00"),
+            ("E", "10", AM, WL, HG),
+        ])
+        assert len(repository) == 5 and "B" in repository and "Z" not in repository
+        assert repository.get("B") == ("10", AM, WL, HG, [2.2, 3.1, 3.3], "2024-05-12 23:59")
+        assert repository.get("E")[4:] == (None, None)
+        assert repository.get("Z") is None
+
+        start, end = week_range("2024-05-08")
+        assert (start, end) == (date(2024, 5, 6), date(2024, 5, 13))
+        assert repository.find("10", start, end) == ["A", "B"]
+        assert repository.find(start=start, end=end) == ["A", "D", "B"]
+        assert [row[0] for row in repository.find_matches("9")] == ["D"]
+        assert any("idx_matches_league_kickoff" in step for step in repository.explain("10", start, end))
+
+        repository.save_results([("A", ["j2.upper"], "upper"), ("B", [], "none")])
+        assert repository.get_result("A")["rules"] == ["j2.upper"]
+        assert repository.get_result("B")["rules"] == []
+        assert repository.get_result("C") is None
+
+
+def test_system_reads_back_from_database(tmp_path):
+    path = str(tmp_path / "matches.db")
+    system = FootballPredictionSystem(cache_size=0)
+    system.open_repository(path)
+    system.add_match("A", "10", AM, WL, HG, kickoff="2024-05-06 19:00")
+    expected = system.analyze_match_result("A")
+    assert system.repository.get_result("A")["verdict"] == expected.verdict_label
+    system.repository.close()
+
+    restored = FootballPredictionSystem(cache_size=0)
+    restored.open_repository(path)
+    assert restored.find_matches("10", *week_range("2024-05-06")) == ["A"]
+    assert restored.analyze_match_result("A").rule_ids == expected.rule_ids
+    restored.repository.close()
@@ -0,0 +1,218 @@
+"""
+编译后的求值器与规则定义一致
+
+参照结果由 reference_rules 逐条解释 rules.json 中的规则定义得到 (不经过编译), 与
+逐场求值 (evaluate)、按需短路求值 (ordered_evaluate)、numpy 向量化求值 (batch) 和查表引擎
+(lut) 逐条比较。特征值大量取在各条件的端点及端点两侧相邻的浮点数上, 检查开闭区间和容差边界。
+"""
+
+import copy
+import json
+import math
+import random
+
+import numpy as np
+import pytest
+
+from batch import VectorRules
+from lut import LutEngine
+from main import FootballPredictionSystem
+from markets import MARKET_FEATURES
+from rule_engine import FEATURES, RULES_PATH, compile_rule_table, match_features
+
+_MARKET_FEATURES = frozenset(MARKET_FEATURES)
+
+_COMPARE = {
+    "<": lambda x, y: x < y,
+    "<=": lambda x, y: x <= y,
+    ">": lambda x, y: x > y,
+    ">=": lambda x, y: x >= y,
+}
+
+# 加在英超上的盘口规则, 覆盖盘口特征的各种条件
+MARKET_RULES = [
+    {"id": "test.ah", "direction": "upper", "message": "{league_name} ah", "when": [
+        [{"feature": "wl_ah_line", "op": "<=", "target": -0.75}, {"feature": "wl_ah_upper", "op": "<", "target": 0.95}],
+        [{"feature": "hg_ah_lower", "op": "between", "target": [0.8, 0.9], "bounds": "[)"}],
+    ]},
+    {"id": "test.ou", "direction": "lower", "message": "{league_name} ou", "when": [
+        [{"feature": "am_ou_line", "op": "eq", "target": [2.25, 3.5], "tolerance": 0.01}],
+        [{"feature": "wl_ou_over", "op": "<", "target": "wl_ou_under"}, {"feature": "wl_min", "op": "<", "target": 2.0}],
+        [{"feature": ["lb_ah_upper", "lb_ou_under"], "op": ">", "target": 1.0}],
+    ]},
+]
+
+
+def _load_table():
+    with open(RULES_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _market_table():
+    table = copy.deepcopy(_load_table())
+    table["rule_sets"]["test_markets"] = MARKET_RULES
+    table["leagues"]["1"]["rule_sets"].append("test_markets")
+    return table
+
+
+@pytest.fixture(scope="module", params=["rules.json", "markets"])
+def rules(request):
+    table = _load_table() if request.param == "rules.json" else _market_table()
+    return compile_rule_table(table, registered=False)
+
+
+def _names(atom):
+    feature = atom["feature"]
+    return feature if isinstance(feature, list) else [feature]
+
+
+def _atom_holds(atom, f):
+    op = atom["op"]
+    target = atom["target"]
+    for name in _names(atom):
+        x = f.get(name, math.nan)
+        if isinstance(target, str):
+            hit = _COMPARE[op](x, f.get(target, math.nan))
+        elif op == "eq":
+            hit = any(abs(x - float(v)) < float(atom["tolerance"])
+                      for v in (target if isinstance(target, list) else [target]))
+        elif op == "between":
+            lo, hi = float(target[0]), float(target[1])
+            bounds = atom.get("bounds", "[]")
+            hit = (x >= lo if bounds[0] == "[" else x > lo) and (x <= hi if bounds[1] == "]" else x < hi)
+        else:
+            hit = _COMPARE[op](x, float(target))
+        if hit:
+            return True
+    return False
+
+
+def reference_rules(definitions, f):
+    """逐条解释规则定义: 任一条件组全部成立即触发"""
+    return [rule["id"] for rule in definitions
+            if any(all(_atom_holds(atom, f) for atom in clause) for clause in rule["when"])]
+
+
+def boundary_points(definitions):
+    """各特征上全部条件的端点 (等值条件另加 值±容差), 以及端点两侧相邻的浮点数"""
+    points = {}
+    for rule in definitions:
+        for clause in rule["when"]:
+            for atom in clause:
+                target = atom["target"]
+                if isinstance(target, str):
+                    continue
+                values = [float(v) for v in (target if isinstance(target, list) else [target])]
+                if atom["op"] == "eq":
+                    tol = float(atom["tolerance"])
+                    values += [v + d for v in values for d in (-tol, tol)]
+                for name in _names(atom):
+                    ends = points.setdefault(name, set())
+                    for v in values:
+                        ends.update((v, math.nextafter(v, -math.inf), math.nextafter(v, math.inf)))
+    return {name: sorted(values) for name, values in points.items()}
+
+
+def _compare_pairs(definitions):
+    return [(atom["feature"], atom["target"]) for rule in definitions for clause in rule["when"]
+            for atom in clause if isinstance(atom["target"], str)]
+
+
+def _random_features(rnd, league, n):
+    """特征字典列表; 盘口特征可能为 NaN (没有盘口)"""
+    points = boundary_points(league.definitions)
+    pairs = _compare_pairs(league.definitions)
+    names = FEATURES + tuple(league.market_features)
+    rows = []
+    for _ in range(n):
+        f = {}
+        for name in names:
+            r = rnd.random()
+            if name in points and r < 0.7:
+                f[name] = rnd.choice(points[name])
+            elif name in _MARKET_FEATURES and r < 0.85:
+                f[name] = math.nan
+            else:
+                f[name] = rnd.uniform(-2.0, 12.0)
+        for a, b in pairs:
+            # 两个特征相等时检查 < 与 <= 的区别
+            if rnd.random() < 0.3:
+                f[a] = f[b]
+        rows.append(f)
+    return rows
+
+
+def test_compiled_evaluators_match_reference(rules):
+    rnd = random.Random(7)
+    vector = VectorRules(rules)
+    for code, league in rules.leagues.items():
+        rows = _random_features(rnd, league, 1500)
+        expected = [reference_rules(league.definitions, f) for f in rows]
+
+        order = {rule.rule_id: rnd.sample(range(len(rule.clauses)), len(rule.clauses)) for rule in league.rules}
+        ordered = league.ordered_evaluate(order)
+        for f, want in zip(rows, expected):
+            # 逐场求值时没有的盘口特征不出现在字典中
+            scalar = {name: x for name, x in f.items() if not (name in _MARKET_FEATURES and math.isnan(x))}
+            assert [rule.rule_id for rule in league.evaluate(scalar)] == want, (code, f)
+            assert [rule.rule_id for rule in ordered(scalar)] == want, (code, f)
+
+        arrays = {name: np.array([f[name] for f in rows]) for name in rows[0]}
+        fired = np.zeros((len(rows), len(vector.rule_ids)), dtype=bool)
+        vector.leagues[int(code)].evaluate(arrays, fired, np.arange(len(rows)))
+        for f, want, hits in zip(rows, expected, fired):
+            assert sorted(vector.rule_ids[i] for i in np.flatnonzero(hits)) == sorted(want), (code, f)
+
+
+def _quoted_odds(rnd, ends):
+    """三项 0.01 报价的赔率, 多数取自规则端点"""
+    return [rnd.choice(ends) if rnd.random() < 0.6 else rnd.randint(101, 1000) / 100 for _ in range(3)]
+
+
+def test_engines_match_reference_on_quoted_odds():
+    system = FootballPredictionSystem(cache_size=0)
+    rules = system.rules
+    ends = sorted({round(v, 2) for league in rules.leagues.values()
+                   for values in boundary_points(league.definitions).values()
+                   for v in values if 1.01 <= v <= 10.0})
+    rnd = random.Random(11)
+    codes = list(rules.leagues)
+    rows = [(str(i), rnd.choice(codes), _quoted_odds(rnd, ends), _quoted_odds(rnd, ends), _quoted_odds(rnd, ends))
+            for i in range(20000)]
+
+    am = np.array([row[2] for row in rows])
+    wl = np.array([row[3] for row in rows])
+    hg = np.array([row[4] for row in rows])
+    leagues = [row[1] for row in rows]
+    vector = system.analyze_batch(am, wl, hg, leagues)
+    lut = LutEngine(rules, cache_dir=None).analyze(am, wl, hg, leagues)
+    assert (vector.fired == lut.fired).all()
+    assert (vector.verdicts == lut.verdicts).all()
+
+    for (match_id, code, am_odds, wl_odds, hg_odds), batch_rules, verdict in zip(
+            rows, vector.rule_lists(), vector.verdicts):
+        want = reference_rules(rules.leagues[code].definitions, match_features(am_odds, wl_odds, hg_odds))
+        result = system.analyze_odds(match_id, code, am_odds, wl_odds, hg_odds)
+        assert result.rule_ids == want
+        assert sorted(batch_rules) == sorted(want)
+        assert int(result.verdict) == verdict
+
+
+def test_market_rule_from_rules_file(tmp_path):
+    # 自带的 rules.json 只用胜平负赔率, 盘口规则写在自己的规则表中 (见 README)
+    assert not any(league.market_features for league in FootballPredictionSystem().rules.leagues.values())
+    table = _load_table()
+    table["rule_sets"]["brazil"].append(
+        {"id": "brazil.high_total", "direction": None, "message": "{league_name} 大小球盘口偏高 -> 大比分概率高",
+         "when": [[{"feature": "wl_ou_line", "op": ">=", "target": 3.0}]]})
+    path = tmp_path / "my_rules.json"
+    path.write_text(json.dumps(table, ensure_ascii=False), encoding="utf-8")
+
+    system = FootballPredictionSystem(rules_path=str(path))
+    odds = ([2.1, 3.2, 3.4], [2.05, 3.3, 3.5], [2.0, 3.25, 3.6])
+    system.add_match("BR-1", "12", *odds, markets={"wl_ou": [3.0, 0.95, 0.93]})
+    system.add_match("BR-2", "12", *odds, markets={"wl_ou": [2.5, 0.95, 0.93]})
+    system.add_match("BR-3", "12", *odds)
+    assert "brazil.high_total" in system.analyze_match_result("BR-1").rule_ids
+    assert "brazil.high_total" not in system.analyze_match_result("BR-2").rule_ids
+    assert "brazil.high_total" not in system.analyze_match_result("BR-3").rule_ids
@@ -0,0 +1,95 @@
+"""分析服务 (server.py): 合并请求与逐场分析结果一致"""
+
+import asyncio
+import json
+
+import numpy as np
+
+from main import FootballPredictionSystem
+from server import VECTOR_THRESHOLD, AnalysisServer, HttpError
+
+
+def _records(n):
+    rng = np.random.default_rng(11)
+    records = []
+    for i in range(n):
+        probs = rng.dirichlet([4, 3, 3])
+        odds = [np.round(1.0 / (probs * margin), 2).tolist() for margin in (1.06, 1.05, 1.07)]
+        records.append({"match_id": f"M{i}", "league": str(i % 13 + 1), "am": odds[0], "wl": odds[1], "hg": odds[2]})
+    return records
+
+
+def _expected(records):
+    system = FootballPredictionSystem(cache_size=0)
+    expected = []
+    for record in records:
+        system.add_match(record["match_id"], record["league"], record["am"], record["wl"], record["hg"])
+        result = system.analyze_match_result(record["match_id"])
+        expected.append({"match_id": record["match_id"], "league": record["league"],
+                         "rules": result.rule_ids, "verdict": result.verdict_label})
+    return expected
+
+
+def test_coalesced_requests_match_single_analysis():
+    records = _records(VECTOR_THRESHOLD + 16)
+    app = AnalysisServer(FootballPredictionSystem(cache_size=0), window=0.05)
+
+    async def main():
+        return await asyncio.gather(*[app.dispatch("POST", "/analyze", json.dumps(record).encode())
+                                      for record in records])
+
+    assert asyncio.run(main()) == _expected(records)
+    assert app.coalescer.batches == 1
+
+    small = records[:3]
+    assert asyncio.run(app.dispatch("POST", "/analyze/batch", json.dumps({"matches": small}).encode())) == \
+        {"results": _expected(small)}
+
+
+def test_errors():
+    app = AnalysisServer(FootballPredictionSystem(cache_size=0))
+    record = _records(1)[0]
+
+    def status(method, path, body):
+        try:
+            asyncio.run(app.dispatch(method, path, body))
+        except HttpError as e:
+            return e.status
+        return 200
+
+    assert status("POST", "/analyze", b"{") == 400
+    assert status("POST", "/analyze", json.dumps(dict(record, league="99")).encode()) == 400
+    assert status("POST", "/analyze", json.dumps(dict(record, markets={"wl_ah": None})).encode()) == 200
+    assert status("POST", "/analyze/batch", b"{}") == 400
+    assert status("GET", "/analyze", b"") == 405
+    assert status("GET", "/nope", b"") == 404
+
+
+def test_http_keep_alive():
+    records = _records(2)
+    app = AnalysisServer(FootballPredictionSystem(cache_size=0))
+
+    async def main():
+        server = await asyncio.start_server(app.handle_connection, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        responses = []
+        for record in records + [{"text": True, **records[0]}]:
+            body = json.dumps(record).encode()
+            # 最后一个请求要求服务端关闭连接
+            close = b"Connection: close\r\n" if record.get("text") else b""
+            writer.write(b"POST /analyze HTTP/1.1\r\n%sContent-Length: %d\r\n\r\n%s" % (close, len(body), body))
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = int(head.split(b"Content-Length: ")[1].split(b"\r\n")[0])
+            responses.append((head.split(b" ")[1], json.loads(await reader.readexactly(length))))
+        assert await reader.read() == b""
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        return responses
+
+    responses = asyncio.run(main())
+    assert [status for status, _ in responses] == [b"200"] * 3
+    assert [data for _, data in responses[:2]] == _expected(records)
+    assert "分析结果" in responses[2][1]["text"]
+    assert app.stats()["requests"] == 3
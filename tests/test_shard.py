@@ -0,0 +1,83 @@
+"""按联赛分片 (shard.py): 路由合并后的结果与本机批量分析相同"""
+
+import threading
+
+import numpy as np
+import pytest
+
+from main import FootballPredictionSystem
+from rule_engine import compile_rule_table, default_rules
+from shard import HashRing, LocalCluster, ShardError, ShardRouter, ShardWorker, parse_shard_spec
+
+
+def _batch(n=300):
+    rng = np.random.default_rng(19)
+    base = np.round(rng.uniform(1.4, 5.0, size=(n, 3)), 2)
+    leagues = [str(code) for code in rng.integers(1, 14, size=n)]
+    return base, np.round(base * 1.02, 2), np.round(base * 0.99, 2), leagues
+
+
+def _same(result, expected):
+    assert result.rule_lists() == expected.rule_lists()
+    assert result.verdict_labels().tolist() == expected.verdict_labels().tolist()
+
+
+@pytest.fixture
+def workers():
+    servers = []
+
+    def start(leagues=None, rules=None):
+        server = ShardWorker(rules, leagues).server()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        host, port = server.server_address
+        return f"{host}:{port}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_router_matches_local_batch(workers):
+    asia = workers(["9", "10", "11"])
+    rest = [workers(), workers()]
+    am, wl, hg, leagues = _batch()
+    expected = FootballPredictionSystem().analyze_batch(am, wl, hg, leagues)
+    with ShardRouter(rest + [asia], {asia: ["9", "10", "11"]}, max_batch=50) as router:
+        routes = router.connect().routes()
+        assert {code for code, endpoint in routes.items() if endpoint == asia} == {"9", "10", "11"}
+        _same(router.analyze(am, wl, hg, leagues), expected)
+        _same(router.analyze(am[:5], wl[:5], hg[:5], leagues[:5]), FootballPredictionSystem().analyze_batch(
+            am[:5], wl[:5], hg[:5], leagues[:5]))
+
+
+def test_router_rejects_mismatched_workers(workers):
+    partial = workers(["1"])
+    with pytest.raises(ShardError, match="不负责"):
+        ShardRouter([partial]).connect()
+    other_rules = compile_rule_table(dict(default_rules().table, version=999), registered=False)
+    with pytest.raises(ShardError, match="规则表"):
+        ShardRouter([workers(rules=other_rules)]).connect()
+    with pytest.raises(ValueError, match="多个节点"):
+        ShardRouter(["a:1", "b:2"], {"a:1": ["1"], "b:2": ["1"]})
+
+
+def test_hash_ring_and_spec():
+    ring = HashRing(["a:1", "b:2", "c:3"])
+    assert [ring.route(code) for code in range(1, 14)] == [HashRing(["c:3", "a:1", "b:2"]).route(code)
+                                                            for code in range(1, 14)]
+    # 增加节点时只有部分联赛改变归属
+    bigger = HashRing(["a:1", "b:2", "c:3", "d:4"])
+    moved = [code for code in range(1, 14) if bigger.route(code) != ring.route(code)]
+    assert all(bigger.route(code) == "d:4" for code in moved)
+    assert parse_shard_spec(["h:1=9, 10", "h:2"]) == (["h:1", "h:2"], {"h:1": ["9", "10"]})
+    with pytest.raises(ValueError):
+        parse_shard_spec(["nohost"])
+
+
+def test_local_cluster():
+    am, wl, hg, leagues = _batch(50)
+    with LocalCluster(leagues=[["9", "10", "11"], [c for c in default_rules().leagues if c not in "9 10 11".split()]]) \
+            as cluster, cluster.router() as router:
+        _same(router.analyze(am, wl, hg, leagues), FootballPredictionSystem().analyze_batch(am, wl, hg, leagues))
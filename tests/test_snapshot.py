@@ -0,0 +1,178 @@
+"""快照与追加日志 (snapshot.py) 的读写往返"""
+
+import math
+import struct
+
+import pytest
+
+import snapshot
+from main import FootballPredictionSystem
+from match_store import BOOKMAKERS, MatchStore
+from rule_engine import default_rules
+
+LEAGUES = default_rules().league_names()
+
+
+def _store():
+    store = MatchStore(LEAGUES)
+    store.add("A", "1", [2.1, 3.2, 3.4], [2.05, 3.3, 3.5], [2.0, 3.25, 3.6])
+    store.add("B", "9", [1.5, 4.0, 6.0], [1.52, 4.1, 5.8], [1.48, 4.2, 6.1], [1.5, 4.0, 6.5],
+              markets={"wl_ah": [-0.75, 0.92, 0.96]})
+    store.add("中文-3", "12", [3.0, 3.1, 2.3], [2.9, 3.2, 2.35], [3.05, 3.0, 2.4],
+              markets={"hg_ou": [2.5, 0.88, 1.0], "wl_ah": [0.25, 1.01, 0.85]})
+    return store
+
+
+def _dump(store):
+    """比赛数据 (NaN 统一为 None, 便于比较)"""
+    def clean(values):
+        return None if values is None else [None if math.isnan(v) else v for v in values]
+
+    return {match_id: (store.league(row), store.has_lb[row],
+                       [clean(store.odds(row, b)) for b in BOOKMAKERS],
+                       {column: store.market(row, column) for column in store.markets})
+            for match_id, row in store.index.items()}
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "state.fps")
+    store = _store()
+    token = snapshot.save_snapshot(store, path)
+    loaded, loaded_token = snapshot.load_snapshot(path, LEAGUES)
+    assert loaded_token == token
+    assert list(loaded.index) == list(store.index)
+    assert _dump(loaded) == _dump(store)
+    assert sorted(loaded.markets) == ["hg_ou", "wl_ah"]
+
+
+def test_empty_snapshot(tmp_path):
+    path = str(tmp_path / "empty.fps")
+    snapshot.save_snapshot(MatchStore(LEAGUES), path)
+    loaded, _ = snapshot.load_snapshot(path, LEAGUES)
+    assert len(loaded) == 0
+
+
+def test_version1_snapshot_still_loads(tmp_path):
+    path = str(tmp_path / "v1.fps")
+    store = MatchStore(LEAGUES)
+    store.add("A", "1", [2.1, 3.2, 3.4], [2.05, 3.3, 3.5], [2.0, 3.25, 3.6])
+    snapshot.save_snapshot(store, path)
+    # 版本 1 与没有盘口的版本 2 只差文件头中的版本号
+    with open(path, "r+b") as f:
+        f.seek(4)
+        f.write(struct.pack("<H", 1))
+    loaded, _ = snapshot.load_snapshot(path, LEAGUES)
+    assert _dump(loaded) == _dump(store)
+
+    snapshot.save_snapshot(_store(), path)
+    with open(path, "r+b") as f:
+        f.seek(4)
+        f.write(struct.pack("<H", 1))
+    with pytest.raises(ValueError):
+        snapshot.load_snapshot(path, LEAGUES)
+
+
+def test_corrupt_snapshot_is_rejected(tmp_path):
+    path = str(tmp_path / "state.fps")
+    snapshot.save_snapshot(_store(), path)
+    with open(path, "r+b") as f:
+        f.seek(-3, 2)
+        byte = f.read(1)
+        f.seek(-3, 2)
+        f.write(bytes([byte[0] ^ 0xFF]))
+    with pytest.raises(ValueError, match="校验失败"):
+        snapshot.load_snapshot(path, LEAGUES)
+    with open(path, "r+b") as f:
+        f.truncate(40)
+    with pytest.raises(ValueError):
+        snapshot.load_snapshot(path, LEAGUES)
+
+
+def test_journal_replay(tmp_path):
+    path = str(tmp_path / "state.fps")
+    store = _store()
+    token = snapshot.save_snapshot(store, path)
+    journal = snapshot.Journal(snapshot.journal_path(path), token, reset=True)
+    journal.add("D", "7", [1.9, 3.4, 3.9], [1.95, 3.3, 3.8], [1.92, 3.35, 3.85], markets={"am_ou": [2.75, 0.9, 0.95]})
+    store.add("D", "7", [1.9, 3.4, 3.9], [1.95, 3.3, 3.8], [1.92, 3.35, 3.85], markets={"am_ou": [2.75, 0.9, 0.95]})
+    journal.set_odds("A", "wl", [2.2, 3.1, 3.3])
+    store.set_odds(store.row("A"), "wl", [2.2, 3.1, 3.3])
+    journal.set_market("B", "wl_ah", [-1.0, 0.9, 0.98])
+    store.set_market(store.row("B"), "wl_ah", [-1.0, 0.9, 0.98])
+    journal.close()
+
+    loaded, loaded_token = snapshot.load_snapshot(path, LEAGUES)
+    assert snapshot.replay_journal(snapshot.journal_path(path), loaded_token, loaded) == 4
+    assert _dump(loaded) == _dump(store)
+
+    # 日志属于其他快照时不重放
+    other, _ = snapshot.load_snapshot(path, LEAGUES)
+    assert snapshot.replay_journal(snapshot.journal_path(path), loaded_token + 1, other) == 0
+
+
+def test_journal_truncates_torn_tail(tmp_path):
+    path = str(tmp_path / "state.fps")
+    token = snapshot.save_snapshot(_store(), path)
+    journal_file = snapshot.journal_path(path)
+    journal = snapshot.Journal(journal_file, token, reset=True)
+    journal.set_odds("A", "am", [2.2, 3.1, 3.3])
+    journal.set_odds("A", "hg", [2.3, 3.0, 3.2])
+    journal.close()
+    with open(journal_file, "r+b") as f:
+        f.seek(0, 2)
+        f.truncate(f.tell() - 5)
+
+    store, _ = snapshot.load_snapshot(path, LEAGUES)
+    assert snapshot.replay_journal(journal_file, token, store) == 1
+    assert store.odds(store.row("A"), "am") == [2.2, 3.1, 3.3]
+    assert store.odds(store.row("A"), "hg") == [2.0, 3.25, 3.6]
+
+    # 截掉损坏的尾部后可以继续追加
+    journal = snapshot.Journal(journal_file, token)
+    journal.set_odds("A", "hg", [2.4, 3.0, 3.1])
+    journal.close()
+    store, _ = snapshot.load_snapshot(path, LEAGUES)
+    assert snapshot.replay_journal(journal_file, token, store) == 2
+    assert store.odds(store.row("A"), "hg") == [2.4, 3.0, 3.1]
+
+
+
+@pytest.mark.parametrize("write", [
+    lambda journal: journal._write(9, 0, 0, "A", (1.0, 2.0, 3.0)),
+    lambda journal: journal._write(snapshot.OP_ODDS, 0, 0, "A", (1.0, 2.0)),
+    lambda journal: journal._write(snapshot.OP_ODDS, 7, 0, "A", (2.2, 3.1, 3.3)),
+    lambda journal: journal.set_odds("不存在", "am", [2.2, 3.1, 3.3]),
+])
+def test_journal_rejects_unknown_valid_records(tmp_path, write):
+    path = str(tmp_path / "state.fps")
+    token = snapshot.save_snapshot(_store(), path)
+    journal_file = snapshot.journal_path(path)
+    journal = snapshot.Journal(journal_file, token, reset=True)
+    write(journal)
+    journal.set_odds("A", "am", [2.2, 3.1, 3.3])
+    journal.close()
+    with open(journal_file, "rb") as f:
+        data = f.read()
+
+    store, _ = snapshot.load_snapshot(path, LEAGUES)
+    with pytest.raises(ValueError, match="无法识别"):
+        snapshot.replay_journal(journal_file, token, store)
+    # 校验通过的记录不截断, 其后的有效记录仍在日志中
+    with open(journal_file, "rb") as f:
+        assert f.read() == data
+
+def test_system_restores_snapshot_and_journal(tmp_path):
+    path = str(tmp_path / "state.fps")
+    system = FootballPredictionSystem()
+    system.add_match("A", "1", [2.1, 3.2, 3.4], [2.05, 3.3, 3.5], [2.0, 3.25, 3.6])
+    system.save_snapshot(path)
+    system.add_match("B", "9", [1.5, 4.0, 6.0], [1.52, 4.1, 5.8], [1.48, 4.2, 6.1],
+                     markets={"wl_ou": [2.5, 0.9, 0.98]})
+    system.update_odds("A", "wl", [2.2, 3.1, 3.3])
+    system.journal.close()
+
+    restored = FootballPredictionSystem()
+    restored.load_snapshot(path)
+    restored.journal.close()
+    assert _dump(restored.matches) == _dump(system.matches)
+    assert restored.analyze_match("A") == system.analyze_match("A")
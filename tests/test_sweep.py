@@ -0,0 +1,78 @@
+"""阈值扫描 (sweep.py): 每组取值的统计与按该取值改写规则后的回测相同"""
+
+import copy
+
+import numpy as np
+import pytest
+
+from backtest import HistoryStore, run_backtest
+from rule_engine import compile_rule_table, default_rules
+from sweep import FeatureCache, pareto_front, run_sweep, sweep_rule
+
+RULE_ID = "bundesliga2.low_water"
+
+
+def _history(n=3000):
+    rng = np.random.default_rng(23)
+    base = np.round(rng.uniform(1.5, 4.5, size=(n, 3)), 2)
+    codes = np.where(rng.random(n) < 0.7, 7, 1).astype(np.int8)
+    return HistoryStore(base, np.round(base + rng.choice([-0.03, 0.0, 0.03], size=(n, 3)), 2),
+                        np.round(base * 0.99, 2), codes, rng.integers(0, 3, size=n))
+
+
+def _rewritten(values):
+    """按参数取值改写规则定义后重新编译"""
+    table = copy.deepcopy(default_rules().table)
+    rule_def = next(d for rules in table["rule_sets"].values() for d in rules if d["id"] == RULE_ID)
+    for name, value in values.items():
+        clause, atom, field = int(name[5]), int(name[8]), name.split(".")[1]
+        target = rule_def["when"][clause][atom]
+        if field in ("lo", "hi"):
+            target["target"][0 if field == "lo" else 1] = value
+        else:
+            target[field] = value
+    return compile_rule_table(table, registered=False)
+
+
+def test_grid_matches_backtest():
+    store = _history()
+    cache = FeatureCache.from_store(store)
+    result = sweep_rule(cache, "7", RULE_ID, workers=1)
+    assert [p.name for p in result.params] == ["when[0][0].lo", "when[0][0].hi"]
+    assert result.combinations == 121
+    plan_values = [result.baseline["params"]] + [point["params"] for point in result.front]
+    for combo in (0, 17, 60, 120):
+        plan_values.append({p.name: p.grid[index] for p, index in zip(
+            result.params, np.unravel_index(combo, [len(p.grid) for p in result.params]))})
+    for values in plan_values:
+        row = run_backtest(store, _rewritten(values)).select("rule", "7", RULE_ID)
+        fires, hits = (row[0]["fires"], row[0]["hits"]) if row else (0, 0)
+        combo = int(np.ravel_multi_index([p.grid.index(values[p.name]) for p in result.params],
+                                         [len(p.grid) for p in result.params]))
+        assert (result.fires[combo], result.hits[combo]) == (fires, hits)
+
+
+def test_pareto_front():
+    fires = np.array([100, 80, 80, 50, 10, 5])
+    hits = np.array([40, 40, 36, 30, 9, 5])
+    changes = np.array([0, 1, 1, 2, 1, 1])
+    assert pareto_front(fires, hits, changes, min_fires=10).tolist() == [0, 1, 3, 4]
+
+
+def test_feature_cache_file(tmp_path):
+    history = tmp_path / "history.csv"
+    history.write_text("match_id,league,am_home,am_draw,am_away,wl_home,wl_draw,wl_away,hg_home,hg_draw,hg_away,"
+                       "result\nA,7,1.8,3.4,4.2,1.85,3.3,4.1,1.8,3.4,4.3,H\n", encoding="utf-8")
+    cache_path = str(tmp_path / "features.npz")
+    cache = FeatureCache.open(str(history), cache_path)
+    loaded = FeatureCache.open(str(history), cache_path)
+    assert loaded.source == cache.source and len(loaded) == 1
+    assert all(np.array_equal(loaded.features[name], cache.features[name]) for name in cache.features)
+    report = run_sweep(loaded, rule_ids=[RULE_ID], min_fires=1)
+    assert [r.league for r in report.results] == ["7"] and report.results[0].baseline["fires"] == 1
+    assert "阈值扫描" in report.to_text()
+
+    with pytest.raises(ValueError, match="没有方向"):
+        sweep_rule(cache, "7", "bundesliga2.wl_combo")
+    with pytest.raises(ValueError, match="超过上限"):
+        sweep_rule(cache, "7", "bundesliga2.lower", max_combinations=10)
@@ -0,0 +1,82 @@
+"""赔率校验 (validate.py): 按列检查与逐场检查结果相同"""
+
+import numpy as np
+import pytest
+
+import validate
+from ingest import parse_record
+from main import FootballPredictionSystem
+from rule_engine import default_rules
+from validate import Rejection, check_odds, validate_records
+
+LEAGUES = default_rules().league_names()
+AM, WL, HG = [2.1, 3.2, 3.4], [2.05, 3.3, 3.5], [2.0, 3.25, 3.6]
+
+
+def _record(match_id, **fields):
+    return dict({"match_id": match_id, "league": "1", "am": AM, "wl": WL, "hg": HG}, **fields)
+
+
+RECORDS = [
+    _record("ok"),
+    _record("lb", lb=[2.2, 3.1, 3.3]),
+    _record("range", am=[0.9, 3.2, 3.4]),
+    _record("overround", am=[3.0, 3.2, 3.4]),
+    _record("swapped", wl=[3.5, 3.3, 2.05], hg=[3.6, 3.25, 2.0]),
+    _record("league", league="99"),
+    _record("kickoff", kickoff="昨天"),
+    _record("market", markets={"wl_ah": [-0.5, 0.92, 0.96]}),
+    _record("null-market", markets={"wl_ah": None, "wl_ou": [2.5, 0.9, 0.98]}),
+    _record("bad-line", markets={"wl_ah": [-0.3, 0.92, 0.96]}),
+    _record("unknown-market", markets={"xx_ah": None}),
+]
+
+
+def _per_row(records):
+    accepted, rejected = [], []
+    for record in records:
+        try:
+            accepted.append(parse_record(record, LEAGUES)[0])
+        except ValueError:
+            rejected.append(record["match_id"])
+    return accepted, rejected
+
+
+def test_column_and_row_checks_agree():
+    rows, (am, wl, hg, lb, markets), rejected = validate_records(RECORDS, LEAGUES)
+    expected, expected_rejected = _per_row(RECORDS)
+    assert [row[0] for row in rows] == expected
+    assert [record["match_id"] for record, _ in rejected] == expected_rejected
+    assert "null-market" in expected and "unknown-market" in expected_rejected
+    assert am.shape == (len(rows), 3)
+    assert np.isnan(lb[[row[0] != "lb" for row in rows]]).all()
+    assert np.isnan(markets["wl_ah"][[row[0] == "null-market" for row in rows]]).all()
+
+
+def test_format_errors_fall_back_to_row_parsing():
+    records = RECORDS + [_record("short", am=[2.0, 3.0]), {"_error": "字段数不足: 5"}]
+    rows, _, rejected = validate_records(records, LEAGUES)
+    assert [row[0] for row in rows] == _per_row(RECORDS)[0]
+    assert len(rejected) == len(records) - len(rows)
+
+
+def test_mismatch_raises_runtime_error(monkeypatch):
+    monkeypatch.setattr(validate, "odds_ok", lambda *args: np.zeros(len(args[0]), dtype=bool))
+    with pytest.raises(RuntimeError):
+        validate_records([_record("ok")], LEAGUES)
+
+
+def test_check_odds_reasons():
+    check_odds(AM, WL, HG)
+    with pytest.raises(ValueError, match="三项"):
+        check_odds(AM, WL, [2.0, 3.0])
+    with pytest.raises(ValueError, match="不是数字"):
+        check_odds(AM, WL, ["x", 3.25, 3.6])
+
+
+def test_add_match_rejection_is_structured():
+    system = FootballPredictionSystem(cache_size=0)
+    result = system.add_match("M1", "1", AM, WL, [0.5, 3.25, 3.6])
+    assert isinstance(result, Rejection) and "M1" not in system.matches
+    assert not isinstance(system.add_match("M1", "1", AM, WL, HG, markets={"wl_ah": None}), Rejection)
+    assert system.matches.market(system.matches.row("M1"), "wl_ah") is None
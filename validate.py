@@ -0,0 +1,314 @@
+"""
+赔率校验
+
+同一套检查有逐场和按列两种实现, 结果完全相同:
+
+- check_odds: 逐场检查 (纯 Python), add_match 和 ingest.parse_record 使用
+- validate_records: 一块原始记录 (ingest.read_records) 整体转换为 (N, 3) 数组后按列检查,
+  只对不合格的行逐场生成原因; 块中有格式错误 (字段缺失、赔率项数不对、非数字) 时
+  这一块退回逐行解析。通过的行可以直接交给批量引擎, 分析时不再逐行 try/except。
+
+检查项 (依次):
+    赔率范围      每项赔率须在 (MIN_ODDS, MAX_ODDS] 内 (非数字、0、负数都不合格)
+    抽水          各公司 1/胜 + 1/平 + 1/负 须在 [MIN_OVERROUND, MAX_OVERROUND] 内
+    公司间分歧    任意两家公司隐含概率的总变差距离不超过 MAX_DIVERGENCE,
+                  超出通常是某家公司的胜负两列填反了
+
+开赛时间 (可选) 须能解析为时间, 统一为 'YYYY-MM-DD HH:MM' (parse_kickoff)。
+
+盘口 (markets.py, 记录中的 "markets" 字段) 另行检查: 盘口名须为已知盘口, 盘口线为 0.25 的整数倍
+(亚盘在 ±MAX_HANDICAP 内, 大小球在 (0, MAX_TOTAL] 内), 两项水位在 (MIN_WATER, MAX_WATER] 内。
+
+不合格的行可以用 RejectFile 写入拒绝文件 (JSONL, 每行 {"reason", "record"})。
+"""
+
+import json
+import math
+import re
+from datetime import date, datetime
+
+from markets import MARKET_COLUMNS
+
+MIN_ODDS = 1.0
+MAX_ODDS = 1000.0
+MIN_OVERROUND = 0.98
+MAX_OVERROUND = 1.35
+MAX_DIVERGENCE = 0.2
+
+MAX_HANDICAP = 5.0
+MAX_TOTAL = 10.0
+MIN_WATER = 0.0
+MAX_WATER = 3.0
+
+BOOKMAKER_NAMES = (("am", "澳门"), ("wl", "威廉希尔"), ("hg", "皇冠"), ("lb", "立博"))
+
+
+class Rejection(str):
+    """未通过检查的原因; add_match / update_odds 返回, 调用方用 isinstance 与成功的返回值区分"""
+
+    __slots__ = ()
+
+
+# 已经是标准格式的开赛时间不再解析
+_KICKOFF_FORMAT = re.compile(r"\d{4}-\d\d-\d\d \d\d:\d\d$")
+
+
+def parse_kickoff(value):
+    """开赛时间统一为 'YYYY-MM-DD HH:MM' 字符串 (按字符串比较即按时间先后); 空值返回 None"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, str) and _KICKOFF_FORMAT.match(value):
+        return value
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ", timespec="minutes")
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day).isoformat(sep=" ", timespec="minutes")
+    try:
+        return datetime.fromisoformat(str(value).strip()).isoformat(sep=" ", timespec="minutes")
+    except ValueError:
+        raise ValueError(f"无效的开赛时间: {value}") from None
+
+
+def check_odds(am_odds, wl_odds, hg_odds, lb_odds=None):
+    """
+    逐场检查赔率 (每家公司为 3 个数字), 不合格时抛出 ValueError (说明原因)
+    立博赔率可选
+    """
+    books = [(name, odds) for (_, name), odds in zip(BOOKMAKER_NAMES, (am_odds, wl_odds, hg_odds, lb_odds))
+             if odds is not None]
+    for name, odds in books:
+        if len(odds) != 3:
+            raise ValueError(f"{name}赔率必须为胜平负三项, 实际为 {len(odds)} 项")
+        for x in odds:
+            try:
+                # NaN 的比较结果为 False, 同样不合格
+                in_range = MIN_ODDS < x <= MAX_ODDS
+            except TypeError:
+                raise ValueError(f"{name}赔率不是数字: {x!r}") from None
+            if not in_range:
+                raise ValueError(f"{name}赔率超出范围 ({MIN_ODDS:g}, {MAX_ODDS:g}]: {x}")
+    probs = []
+    for name, odds in books:
+        inverse = (1.0 / odds[0], 1.0 / odds[1], 1.0 / odds[2])
+        overround = inverse[0] + inverse[1] + inverse[2]
+        if not MIN_OVERROUND <= overround <= MAX_OVERROUND:
+            raise ValueError(f"{name}抽水异常: 1/胜+1/平+1/负 = {overround:.3f}")
+        probs.append((name, [p / overround for p in inverse]))
+    for i, (name_a, pa) in enumerate(probs):
+        for name_b, pb in probs[i + 1:]:
+            divergence = 0.5 * (abs(pa[0] - pb[0]) + abs(pa[1] - pb[1]) + abs(pa[2] - pb[2]))
+            if divergence > MAX_DIVERGENCE:
+                raise ValueError(f"{name_a}与{name_b}的隐含概率相差过大 ({divergence:.3f}), 可能是胜负两列填反")
+
+
+def check_markets(markets):
+    """逐场检查盘口 {盘口: [盘口线, 水位, 水位]}, 不合格时抛出 ValueError (说明原因); 值为 None 的盘口视为没有"""
+    for column, triple in markets.items():
+        if column not in MARKET_COLUMNS:
+            raise ValueError(f"未知的盘口: {column}")
+        if triple is None:
+            continue
+        if len(triple) != 3:
+            raise ValueError(f"{column}盘口必须为盘口线和两项水位, 实际为 {len(triple)} 项")
+        line = triple[0]
+        try:
+            if column.endswith("_ah"):
+                line_ok = -MAX_HANDICAP <= line <= MAX_HANDICAP
+            else:
+                line_ok = 0 < line <= MAX_TOTAL
+            water_ok = all(MIN_WATER < x <= MAX_WATER for x in triple[1:])
+        except TypeError:
+            raise ValueError(f"{column}盘口不是数字: {triple!r}") from None
+        if not line_ok or line * 4 != round(line * 4):
+            raise ValueError(f"{column}盘口线无效 (须为 0.25 的整数倍): {line}")
+        if not water_ok:
+            raise ValueError(f"{column}水位超出范围 ({MIN_WATER:g}, {MAX_WATER:g}]: {list(triple[1:])}")
+
+
+def markets_ok(markets, n):
+    """
+    按列检查盘口, 返回每行是否合格的布尔数组 (与 check_markets 相同)
+    markets: {盘口: ((N, 3) 数组, 哪些行有该盘口)}
+    """
+    import numpy as np
+
+    ok = np.ones(n, dtype=bool)
+    for column, (values, present) in markets.items():
+        line = values[:, 0]
+        if column.endswith("_ah"):
+            line_ok = (line >= -MAX_HANDICAP) & (line <= MAX_HANDICAP)
+        else:
+            line_ok = (line > 0) & (line <= MAX_TOTAL)
+        with np.errstate(invalid="ignore"):
+            line_ok &= np.rint(line * 4) == line * 4
+        water_ok = ((values[:, 1:] > MIN_WATER) & (values[:, 1:] <= MAX_WATER)).all(axis=1)
+        ok &= ~present | (line_ok & water_ok)
+    return ok
+
+
+def odds_ok(am, wl, hg, lb=None, has_lb=None):
+    """
+    按列检查 (N, 3) 赔率数组, 返回每行是否合格的布尔数组 (与 check_odds 相同)
+    lb: 立博赔率 (可为 None); has_lb: 哪些行有立博赔率 (默认不含 NaN 的行)
+    """
+    import numpy as np
+
+    books = [am, wl, hg]
+    ok = np.ones(len(am), dtype=bool)
+    if lb is not None:
+        if has_lb is None:
+            has_lb = ~np.isnan(lb).any(axis=1)
+        # 没有立博赔率的行用一组能通过范围和抽水检查的赔率占位
+        books.append(np.where(has_lb[:, None], lb, 3.0))
+    probs = []
+    for odds in books:
+        ok &= ((odds > MIN_ODDS) & (odds <= MAX_ODDS)).all(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            inverse = [1.0 / odds[:, k] for k in range(3)]
+            overround = inverse[0] + inverse[1] + inverse[2]
+            ok &= (overround >= MIN_OVERROUND) & (overround <= MAX_OVERROUND)
+            probs.append([p / overround for p in inverse])
+    for i in range(len(probs)):
+        for j in range(i + 1, len(probs)):
+            pa, pb = probs[i], probs[j]
+            with np.errstate(invalid="ignore"):
+                divergence = 0.5 * (np.abs(pa[0] - pb[0]) + np.abs(pa[1] - pb[1]) + np.abs(pa[2] - pb[2]))
+            too_far = divergence > MAX_DIVERGENCE
+            if j == 3:
+                # 占位的立博赔率不参与比较
+                too_far &= has_lb
+            ok &= ~too_far
+    return ok
+
+
+def _columns(records):
+    """整块转换为数组, 有格式错误时抛出异常 (由调用方退回逐行解析)"""
+    import numpy as np
+
+    odds = []
+    for bookmaker in ("am", "wl", "hg"):
+        values = np.array([record[bookmaker] for record in records], dtype=np.float64)
+        if values.shape != (len(records), 3):
+            raise ValueError("赔率项数不对")
+        odds.append(values)
+    lb_values = [record.get("lb") for record in records]
+    has_lb = np.array([values is not None for values in lb_values], dtype=bool)
+    missing = (math.nan,) * 3
+    lb = np.array([values if values is not None else missing for values in lb_values], dtype=np.float64)
+    if lb.shape != (len(records), 3):
+        raise ValueError("赔率项数不对")
+    return odds[0], odds[1], odds[2], lb, has_lb
+
+
+def _market_columns(records):
+    """整块盘口转换为 {盘口: ((N, 3) 数组, 哪些行有该盘口)}, 有格式错误时抛出异常"""
+    import numpy as np
+
+    by_record = [record.get("markets") or {} for record in records]
+    names = set()
+    for markets in by_record:
+        names.update(markets)
+    if not names <= set(MARKET_COLUMNS):
+        raise ValueError("未知的盘口")
+    missing = (math.nan,) * 3
+    columns = {}
+    for column in sorted(names, key=MARKET_COLUMNS.index):
+        present = np.array([markets.get(column) is not None for markets in by_record], dtype=bool)
+        values = np.array([markets.get(column) or missing for markets in by_record], dtype=np.float64)
+        if values.shape != (len(records), 3):
+            raise ValueError("盘口项数不对")
+        columns[column] = (values, present)
+    return columns
+
+
+def validate_records(records, leagues):
+    """
+    校验一块原始记录
+    返回 (合格行, 赔率, 不合格记录):
+        合格行为 ingest.parse_record 格式的元组列表 (match_id, league_code, am, wl, hg, lb, kickoff)
+        赔率为合格行的 (am, wl, hg, lb, markets) 数组, lb 中没有立博赔率的行为 NaN,
+        markets 为 {盘口: (N, 3) 数组} (只含这一块中出现的盘口, 没有该盘口的行为 NaN)
+        不合格记录为 [(原始记录, 原因), ...]
+    """
+    import numpy as np
+    from ingest import parse_record
+
+    rejected = []
+    try:
+        if any("_error" in record for record in records):
+            raise ValueError("记录格式错误")
+        am, wl, hg, lb, has_lb = _columns(records)
+        markets = _market_columns(records)
+    except (ValueError, TypeError, KeyError, AttributeError):
+        # 逐行解析, 找出格式错误的行
+        rows = []
+        kept = []
+        for record in records:
+            try:
+                rows.append(parse_record(record, leagues))
+                kept.append(record)
+            except (ValueError, TypeError) as e:
+                rejected.append((record, str(e)))
+        missing = [math.nan] * 3
+        odds = tuple(np.array([row[k] for row in rows], dtype=np.float64).reshape(-1, 3) for k in (2, 3, 4))
+        lb = np.array([row[5] if row[5] is not None else missing for row in rows], dtype=np.float64).reshape(-1, 3)
+        # 通过 parse_record 的记录盘口格式已无问题
+        markets = {column: values for column, (values, _) in _market_columns(kept).items()}
+        return rows, odds + (lb, markets), rejected
+
+    match_ids = [record.get("match_id") for record in records]
+    codes = [str(record.get("league", "")).strip() for record in records]
+    ok = odds_ok(am, wl, hg, lb, has_lb)
+    if markets:
+        ok &= markets_ok(markets, len(records))
+    ok &= np.array([match_id not in (None, "") and code in leagues for match_id, code in zip(match_ids, codes)],
+                   dtype=bool)
+    kickoffs = []
+    for i, record in enumerate(records):
+        try:
+            kickoffs.append(parse_kickoff(record.get("kickoff") or None))
+        except ValueError:
+            kickoffs.append(None)
+            ok[i] = False
+    if not ok.all():
+        for i in np.flatnonzero(~ok).tolist():
+            try:
+                parse_record(records[i], leagues)
+            except (ValueError, TypeError) as e:
+                rejected.append((records[i], str(e)))
+            else:
+                raise RuntimeError(f"按列检查与逐场检查的结果不一致: {records[i]!r}")
+        keep = np.flatnonzero(ok)
+        am, wl, hg, lb, has_lb = am[keep], wl[keep], hg[keep], lb[keep], has_lb[keep]
+        markets = {column: (values[keep], present[keep]) for column, (values, present) in markets.items()}
+        records = [records[i] for i in keep.tolist()]
+        match_ids = [match_ids[i] for i in keep.tolist()]
+        codes = [codes[i] for i in keep.tolist()]
+        kickoffs = [kickoffs[i] for i in keep.tolist()]
+    lb_lists = [values if flag else None for values, flag in zip(lb.tolist(), has_lb.tolist())]
+    rows = list(zip([str(match_id) for match_id in match_ids], codes, am.tolist(), wl.tolist(), hg.tolist(),
+                    lb_lists, kickoffs))
+    return rows, (am, wl, hg, lb, {column: values for column, (values, _) in markets.items()}), rejected
+
+
+class RejectFile:
+    """拒绝文件: 每行 {"reason": 原因, "record": 原始记录} (JSONL), 可直接作为 on_reject 回调"""
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._file = open(path, "w", encoding="utf-8", buffering=1 << 16)
+
+    def __call__(self, record, reason):
+        self._file.write(json.dumps({"reason": reason, "record": record}, ensure_ascii=False, default=str))
+        self._file.write("\n")
+        self.count += 1
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()